@@ -1,6 +1,6 @@
 "use client";
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { 
   ArrowRight, 
   TrendingUp, 
@@ -179,6 +179,23 @@ export default function PortfolioPage() {
     cost_basis: 0
   });
 
+  // Show assets priced with live quotes (one request for the whole portfolio), or as stored if that fails
+  // Only the latest call may apply its valuation; an older one finishing late would bring back stale rows
+  const valuationRequest = useRef(0);
+  const showAssets = async (assets: PortfolioAsset[]) => {
+    const request = ++valuationRequest.current;
+    setPortfolioAssets(assets);
+    if (assets.length === 0) return;
+    try {
+      const { assets: valuedAssets, totals } = await PortfolioService.valuateAssets(assets);
+      if (request !== valuationRequest.current) return;
+      setPortfolioAssets(valuedAssets);
+      setPortfolioSummary(prev => prev ? PortfolioService.applyValuationTotals(prev, totals) : prev);
+    } catch (error) {
+      console.error('Error valuating portfolio:', error);
+    }
+  };
+
   // Fetch data from database
   useEffect(() => {
     const fetchPortfolioData = async () => {
@@ -191,11 +208,11 @@ export default function PortfolioPage() {
         const data = await PortfolioService.getPortfolioData(sampleUserId);
         
         if (data.user) setUser(data.user);
-        if (data.assets) setPortfolioAssets(data.assets);
         if (data.performance) setPerformanceData(data.performance);
         if (data.allocation) setAllocationData(data.allocation);
         if (data.activities) setUserActivities(data.activities);
         if (data.summary) setPortfolioSummary(data.summary);
+        if (data.assets) await showAssets(data.assets);
         
       } catch (error) {
         console.error('Error fetching portfolio data:', error);
@@ -240,7 +257,7 @@ export default function PortfolioPage() {
       if (assetId) {
         // Refresh assets
         const updatedAssets = await PortfolioService.getPortfolioAssets(user.id);
-        setPortfolioAssets(updatedAssets);
+        await showAssets(updatedAssets);
         
         // Reset form
         setNewAsset({
@@ -284,7 +301,7 @@ export default function PortfolioPage() {
       if (success) {
         // Refresh assets
         const updatedAssets = await PortfolioService.getPortfolioAssets(user!.id);
-        setPortfolioAssets(updatedAssets);
+        await showAssets(updatedAssets);
         setEditingAsset(null);
       }
     } catch (error) {
@@ -304,8 +321,9 @@ export default function PortfolioPage() {
       const success = await PortfolioService.deletePortfolioAsset(assetId);
       
       if (success) {
-        // Remove from local state
-        setPortfolioAssets(prev => prev.filter(a => a.id !== assetId));
+        // Refresh assets; allocations and totals change with it
+        const updatedAssets = await PortfolioService.getPortfolioAssets(user.id);
+        await showAssets(updatedAssets);
         
         // Add activity
         await PortfolioService.addUserActivity({
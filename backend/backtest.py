@@ -0,0 +1,234 @@
+"""
+Vectorized indicator-rule backtests
+
+Strategies are long/flat rules on the indicators /stock-details reports:
+- `ma_cross`: long while the fast MA (default 50) is above the slow MA (default 200)
+- `rsi`: buy when RSI(14) drops below `lower` (30), sell when it rises above `upper` (70)
+- `macd`: long while MACD is above its signal line
+
+Signals are computed on each symbol's own bars and acted on at that bar's close, so a position
+earns from the next bar on (no look-ahead). Symbols are processed as (symbols x bars) matrices
+in chunks spread over a process pool. The pool's processes come from a forkserver (spawn where
+that is unavailable), never a fork of the threaded server process. The portfolio is equal-weight across the symbols trading
+on each date, rebalanced daily.
+
+    python backtest.py    # timing check on synthetic data
+"""
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from indicators import macd, rolling_mean, rsi, stack_closes
+
+STRATEGIES = {
+    'ma_cross': {'fast': 50, 'slow': 200},
+    'rsi': {'lower': 30.0, 'upper': 70.0},
+    'macd': {},
+}
+TRADING_DAYS = 252
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class BacktestError(ValueError):
+    """Unknown strategy or invalid parameters"""
+
+
+def strategy_params(strategy, overrides):
+    """Defaults for `strategy` updated with numeric `overrides` (e.g. query parameters)"""
+    if strategy not in STRATEGIES:
+        raise BacktestError(f"Unknown strategy '{strategy}'; use one of {', '.join(STRATEGIES)}")
+    params = dict(STRATEGIES[strategy])
+    for name, default in params.items():
+        raw = overrides.get(name)
+        if raw is None or raw == '':
+            continue
+        try:
+            params[name] = type(default)(raw)
+        except ValueError:
+            raise BacktestError(f'{name} must be a number') from None
+    if strategy == 'ma_cross' and not 1 <= params['fast'] < params['slow']:
+        raise BacktestError('ma_cross needs 1 <= fast < slow')
+    if strategy == 'rsi' and not 0 <= params['lower'] < params['upper'] <= 100:
+        raise BacktestError('rsi needs 0 <= lower < upper <= 100')
+    params['feeBps'] = float(overrides.get('fee_bps') or 0.0)
+    return params
+
+
+def positions(close, strategy, params):
+    """1 where the rule wants to be long at each bar's close, else 0 (NaN prices are flat)"""
+    with np.errstate(invalid='ignore'):
+        if strategy == 'ma_cross':
+            signal = rolling_mean(close, params['fast']) > rolling_mean(close, params['slow'])
+        elif strategy == 'macd':
+            macd_line, signal_line = macd(close)
+            signal = macd_line > signal_line
+        else:
+            values = rsi(close)
+            # Entry below `lower` and exit above `upper`; in between the last decision holds
+            state = np.where(values < params['lower'], 1.0, np.where(values > params['upper'], 0.0, np.nan))
+            signal = _forward_fill(state) == 1.0
+    return np.where(np.isnan(close), 0.0, signal.astype(float))
+
+
+def _forward_fill(matrix):
+    """Carry the last non-NaN value along each row (leading NaNs stay NaN)"""
+    columns = np.arange(matrix.shape[1])
+    last = np.where(~np.isnan(matrix), columns, 0)
+    np.maximum.accumulate(last, axis=1, out=last)
+    filled = np.take_along_axis(matrix, last, axis=1)
+    return filled
+
+
+def run_chunk(closes, strategy, params):
+    """
+    Backtest a list of 1-D close arrays together
+    Returns per symbol (strategy returns, held positions, trades) where trades are
+    (entry bar, exit bar or None, return) tuples with bar offsets into that symbol's array.
+    """
+    matrix = stack_closes(closes)
+    width = matrix.shape[1]
+    if width == 0:
+        return [(np.zeros(0), np.zeros(0), []) for _ in closes]
+    pos = positions(matrix, strategy, params)
+    # A position taken at bar t's close earns bar t+1's return
+    held = np.concatenate([np.zeros((len(closes), 1)), pos[:, :-1]], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = matrix[:, 1:] / matrix[:, :-1] - 1
+    returns = np.concatenate([np.zeros((len(closes), 1)), returns], axis=1)
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+    turnover = np.abs(np.diff(held, axis=1, prepend=0.0))
+    strategy_returns = held * returns - turnover * params.get('feeBps', 0.0) / 10_000
+
+    # Trades from position changes: +1 entries, -1 exits (acted on at the previous bar's close)
+    changes = np.diff(held, axis=1, prepend=0.0)
+    entry_rows, entry_cols = np.nonzero(changes > 0)
+    exit_rows, exit_cols = np.nonzero(changes < 0)
+    growth = np.cumprod(1 + strategy_returns, axis=1)
+
+    results = []
+    for row, values in enumerate(closes):
+        offset = width - len(values)
+        entries = entry_cols[entry_rows == row]
+        exits = exit_cols[exit_rows == row]
+        trades = []
+        for k, entry in enumerate(entries):
+            exit_ = exits[k] if k < len(exits) else None
+            end = exit_ if exit_ is not None else width - 1
+            # Compounded strategy return over the holding bars, including entry and exit fees
+            start_growth = growth[row, entry - 1]
+            trade_return = growth[row, end] / start_growth - 1 if start_growth else 0.0
+            trades.append((int(entry - 1 - offset), None if exit_ is None else int(exit_ - 1 - offset), float(trade_return)))
+        results.append((strategy_returns[row, offset:], held[row, offset:], trades))
+    return results
+
+
+def summary_stats(returns, held=None, trades=None):
+    """Total/annualized return, volatility, Sharpe, max drawdown, exposure and win rate of a daily return series"""
+    n = len(returns)
+    if n == 0:
+        return {'bars': 0}
+    equity = np.cumprod(1 + returns)
+    total = equity[-1] - 1
+    years = n / TRADING_DAYS
+    std = returns.std()
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    stats = {
+        'bars': n,
+        'totalReturn': round(float(total) * 100, 2),
+        'cagr': round(float((equity[-1] ** (1 / years) - 1) * 100), 2) if years > 0 and equity[-1] > 0 else None,
+        'annualVolatility': round(float(std * math.sqrt(TRADING_DAYS) * 100), 2),
+        'sharpe': round(float(returns.mean() / std * math.sqrt(TRADING_DAYS)), 2) if std > 0 else None,
+        'maxDrawdown': round(float(drawdown.min()) * 100, 2),
+    }
+    if held is not None:
+        stats['exposure'] = round(float(held.mean()) * 100, 2)
+    if trades is not None:
+        closed = [t for t in trades if t[1] is not None]
+        stats['trades'] = len(trades)
+        stats['winRate'] = round(100 * sum(1 for t in closed if t[2] > 0) / len(closed), 2) if closed else None
+    return stats
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a process that runs request threads can copy locks other threads hold
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the process pool, if one was started; the next backtest starts a new one"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+def run_backtest(series, strategy, params, workers=None, chunk_size=50):
+    """
+    Backtest every symbol in `series` ({symbol: (day numbers, closes)}) and the equal-weight portfolio
+    Chunks of `chunk_size` symbols run on a process pool of `workers` (0 or 1 runs in-process).
+    Returns ({symbol: (returns, held, trades)}, portfolio days, portfolio returns).
+    """
+    symbols = list(series)
+    closes = [series[s][1] for s in symbols]
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    chunks = [list(range(i, min(i + chunk_size, len(symbols)))) for i in range(0, len(symbols), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        pool = _get_pool(workers)
+        futures = [pool.submit(run_chunk, [closes[i] for i in chunk], strategy, params) for chunk in chunks]
+        outputs = [future.result() for future in futures]
+    else:
+        outputs = [run_chunk([closes[i] for i in chunk], strategy, params) for chunk in chunks]
+    results = {}
+    for chunk, output in zip(chunks, outputs):
+        for i, result in zip(chunk, output):
+            results[symbols[i]] = result
+
+    # Equal weight across the symbols with a bar on each date
+    if not symbols:
+        return results, np.zeros(0, dtype=np.int64), np.zeros(0)
+    days = np.unique(np.concatenate([series[s][0] for s in symbols]))
+    total = np.zeros(len(days))
+    count = np.zeros(len(days))
+    for symbol in symbols:
+        columns = np.searchsorted(days, series[symbol][0])
+        np.add.at(total, columns, results[symbol][0])
+        np.add.at(count, columns, 1)
+    portfolio = np.divide(total, count, out=np.zeros(len(days)), where=count > 0)
+    return results, days, portfolio
+
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    from synthetic import generate_bars
+
+    end = pd.Timestamp.now(tz='UTC')
+    frames = {f'SYM{i:03d}': generate_bars(f'SYM{i:03d}', '1d', end - pd.DateOffset(years=10), end) for i in range(300)}
+    series = {
+        symbol: (frame.index.tz_localize(None).to_numpy().astype('datetime64[D]').astype(np.int64), frame['Close'].to_numpy())
+        for symbol, frame in frames.items()
+    }
+    for strategy in STRATEGIES:
+        started = time.perf_counter()
+        results, days, portfolio = run_backtest(series, strategy, strategy_params(strategy, {}))
+        elapsed = time.perf_counter() - started
+        stats = summary_stats(portfolio)
+        print(f"{strategy:>9}: {len(series)} symbols x {len(days)} bars in {elapsed:.2f}s, "
+              f"portfolio return {stats['totalReturn']}%, sharpe {stats['sharpe']}")
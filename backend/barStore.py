@@ -0,0 +1,379 @@
+"""
+On-disk OHLCV bar store
+
+Bars are kept per (symbol, interval) as a NumPy structured array (`<root>/<interval>/<SYMBOL>.npy`)
+sorted by a UTC epoch-nanosecond `ts` column, plus a small JSON sidecar with the exchange
+timezone and how much history has been fetched. Reads memory-map the file and slice the
+time range with a binary search; writes merge new bars in and replace the file atomically.
+
+`BarStore.get` serves a (symbol, period, interval) request from disk and only asks the
+upstream for what is missing: history older than what was fetched so far, and the tail since
+the last stored bar (which also refreshes a still-forming bar).
+
+Yahoo back-adjusts earlier prices after a split or dividend, so stored bars can go stale without
+any new bar changing. The tail refetch therefore starts a few completed bars early. When every
+overlapping close has moved by the same ratio, the stored bars before the overlap are rescaled by
+it (volumes too, for a split), keeping history Yahoo no longer serves. Closes that differ without
+a common ratio are ordinary revisions; the refetched bars simply replace them.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+FRAME_COLUMNS = (('open', 'Open'), ('high', 'High'), ('low', 'Low'), ('close', 'Close'), ('volume', 'Volume'))
+
+INTERVAL_SECONDS = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '90m': 5400, '1h': 3600,
+    '1d': 86400, '5d': 5 * 86400, '1wk': 7 * 86400, '1mo': 30 * 86400, '3mo': 91 * 86400,
+}
+
+# Completed bars the tail refetch overlaps to detect a re-adjustment
+ADJUST_CHECK_BARS = 5
+# A common ratio this far from 1 is a split (volumes are adjusted too), not a dividend
+SPLIT_RATIO = 1.2
+# Half a cent: Yahoo rounds adjusted prices, so rescaled closes only match to about that
+PRICE_ROUNDING = 0.005
+
+_PERIOD_RE = re.compile(r'^(\d+)(d|wk|mo|y)$')
+
+
+def interval_seconds(interval):
+    return INTERVAL_SECONDS.get(interval, 86400)
+
+
+def is_intraday(interval):
+    return interval_seconds(interval) < 86400
+
+
+def period_start(period, now=None):
+    """
+    Earliest timestamp a `period` can reach back to, or None for `max`
+    Day periods count trading sessions, so the estimate leaves room for weekends and holidays.
+    """
+    now = now or pd.Timestamp.now(tz='UTC')
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=now.year, month=1, day=1, tz='UTC')
+    match = _PERIOD_RE.match(period or '')
+    if not match:
+        raise ValueError(f'Unsupported period: {period}')
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == 'd':
+        return now - pd.Timedelta(days=count * 7 // 5 + 4)
+    if unit == 'wk':
+        return now - pd.Timedelta(weeks=count)
+    if unit == 'mo':
+        return now - pd.DateOffset(months=count)
+    return now - pd.DateOffset(years=count)
+
+
+def slice_period(frame, period, now=None):
+    """Trim a frame to the bars Yahoo would return for `period`"""
+    if frame.empty or period == 'max':
+        return frame
+    match = _PERIOD_RE.match(period or '')
+    if match and match.group(2) == 'd':
+        # `Nd` means the last N sessions, not N calendar days
+        sessions = frame.index.normalize()
+        keep = sessions.unique()[-int(match.group(1)):]
+        return frame[sessions >= keep[0]]
+    start = period_start(period, now)
+    return frame[frame.index >= start]
+
+
+def _filename(symbol):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', symbol.upper())
+
+
+def frame_to_bars(frame):
+    """Convert a yfinance OHLCV frame to the structured bar array"""
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    index = frame.index if frame.index.tz is not None else frame.index.tz_localize('UTC')
+    bars['ts'] = index.as_unit('ns').asi8
+    for field, column in FRAME_COLUMNS:
+        bars[field] = frame[column].to_numpy(dtype=float) if column in frame else np.nan
+    return bars
+
+
+def bars_to_frame(bars, tz):
+    """Convert a structured bar array back to a yfinance-shaped frame in exchange time"""
+    index = pd.DatetimeIndex(pd.to_datetime(np.asarray(bars['ts']), unit='ns', utc=True))
+    if tz:
+        index = index.tz_convert(tz)
+    return pd.DataFrame({column: np.asarray(bars[field]) for field, column in FRAME_COLUMNS}, index=index)
+
+
+class BarStore:
+    """
+    Persistent per-(symbol, interval) bar series
+    `tail_refresh` bounds how often the upstream is asked for new bars of one series.
+    """
+
+    def __init__(self, root, tail_refresh=60.0, adjust_tolerance=1e-4):
+        self.root = root
+        self.tail_refresh = tail_refresh
+        self.adjust_tolerance = adjust_tolerance
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.upstream_fetches = 0
+        self.disk_hits = 0
+        self.stale_reads = 0
+        self.readjustments = 0
+
+    def _lock(self, symbol, interval):
+        key = (symbol.upper(), interval)
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _paths(self, symbol, interval):
+        directory = os.path.join(self.root, interval)
+        name = _filename(symbol)
+        return os.path.join(directory, name + '.npy'), os.path.join(directory, name + '.json')
+
+    def meta(self, symbol, interval):
+        """Sidecar metadata for a series, or None if nothing is stored"""
+        _, meta_path = self._paths(symbol, interval)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read_bars(self, symbol, interval, start=None, end=None):
+        """Memory-mapped bars with start <= ts < end (UTC epoch ns); None if the series does not exist"""
+        bars_path, _ = self._paths(symbol, interval)
+        try:
+            bars = np.load(bars_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        lo = 0 if start is None else int(np.searchsorted(bars['ts'], start, side='left'))
+        hi = len(bars) if end is None else int(np.searchsorted(bars['ts'], end, side='left'))
+        return bars[lo:hi]
+
+    def read(self, symbol, interval, start=None, end=None):
+        """Stored bars in [start, end) as a yfinance-shaped frame, or None if the series does not exist"""
+        meta = self.meta(symbol, interval)
+        bars = self.read_bars(symbol, interval, _to_ns(start), _to_ns(end))
+        if meta is None or bars is None:
+            return None
+        return bars_to_frame(bars, meta.get('tz'))
+
+    def merge(self, symbol, interval, frame, covered_start=None):
+        """
+        Merge freshly fetched bars into the stored series; new bars replace stored ones at the same timestamp
+        `covered_start` (UTC epoch ns, or 0 for "all history") records how far back the upstream has been asked.
+        """
+        with self._lock(symbol, interval):
+            self._merge_locked(symbol, interval, frame, covered_start)
+
+    def _merge_locked(self, symbol, interval, frame, covered_start):
+        bars_path, meta_path = self._paths(symbol, interval)
+        os.makedirs(os.path.dirname(bars_path), exist_ok=True)
+        meta = self.meta(symbol, interval) or {}
+        existing = self.read_bars(symbol, interval)
+
+        new = frame_to_bars(frame) if frame is not None and not frame.empty else np.empty(0, dtype=BAR_DTYPE)
+        if existing is not None and len(existing):
+            combined = np.concatenate([new, np.asarray(existing)])
+            # np.unique keeps the first occurrence, so fresh bars win over stored ones
+            _, first = np.unique(combined['ts'], return_index=True)
+            merged = combined[first]
+        else:
+            merged = np.sort(new, order='ts')
+
+        tmp_path = bars_path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, merged)
+        os.replace(tmp_path, bars_path)
+
+        tz = getattr(frame.index, 'tz', None) if frame is not None else None
+        if tz is not None:
+            meta['tz'] = str(tz)
+        if covered_start is not None:
+            previous = meta.get('coveredStart')
+            meta['coveredStart'] = covered_start if previous is None else min(previous, covered_start)
+        meta['count'] = int(len(merged))
+        meta['checkedAt'] = time.time()
+        tmp_meta = meta_path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_meta, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+
+    def is_fresh(self, symbol, interval, period):
+        """True when the stored series covers `period` and its tail was checked within `tail_refresh`"""
+        meta = self.meta(symbol, interval)
+        if meta is None:
+            return False
+        return self._covers(meta, period) and time.time() - meta.get('checkedAt', 0) < self.tail_refresh
+
+    def read_fresh(self, symbol, interval, period):
+        """Bars for `period` if they can be served without any upstream call, otherwise None"""
+        if not self.is_fresh(symbol, interval, period):
+            return None
+        frame = self.read(symbol, interval, start=period_start(period))
+        if frame is None:
+            return None
+        self.disk_hits += 1
+        return slice_period(frame, period)
+
+    def _covers(self, meta, period):
+        covered = meta.get('coveredStart')
+        if covered is None:
+            return False
+        start = period_start(period)
+        return covered == 0 if start is None else covered <= start.value
+
+    def read_stale(self, symbol, interval, period):
+        """
+        (bars for `period`, seconds since the series was last checked upstream) from whatever is
+        stored, however old; None if nothing is stored for the period
+        """
+        meta = self.meta(symbol, interval)
+        if meta is None:
+            return None
+        try:
+            frame = self.read(symbol, interval, start=period_start(period))
+        except ValueError:
+            return None
+        if frame is None or frame.empty:
+            return None
+        self.stale_reads += 1
+        return slice_period(frame, period), time.time() - meta.get('checkedAt', 0)
+
+    def get(self, symbol, period, interval, fetch, strict=False, tail_refresh=None):
+        """
+        Bars for `period` served from disk, fetching only what is missing upstream
+        `fetch(**kwargs)` calls the upstream history API with either `period=` or `start=`/`end=`.
+        If a gap-filling fetch fails, whatever is on disk is still served, unless `strict` is set:
+        then the error is raised and the caller decides how to fall back (see `read_stale`).
+        `tail_refresh` overrides the store's own bound on how recently the tail may have been checked.
+        """
+        with self._lock(symbol, interval):
+            meta = self.meta(symbol, interval)
+            start = period_start(period)
+            covered_start = 0 if start is None else start.value
+
+            if meta is None or not meta.get('count'):
+                self.upstream_fetches += 1
+                self._merge_locked(symbol, interval, fetch(period=period), covered_start)
+            else:
+                self.disk_hits += 1
+                try:
+                    self._fill_gaps(symbol, interval, meta, start, covered_start, fetch,
+                                    self.tail_refresh if tail_refresh is None else tail_refresh)
+                except Exception as e:
+                    if strict:
+                        raise
+                    print(f"Gap fill failed for {symbol} {interval}, serving stored bars: {str(e)}")
+
+            frame = self.read(symbol, interval, start=start)
+        return slice_period(frame, period)
+
+    def _fill_gaps(self, symbol, interval, meta, start, covered_start, fetch, tail_refresh):
+        bars = self.read_bars(symbol, interval)
+
+        # New bars since the last stored one; the last bar itself is refetched since it may still be forming,
+        # and a few completed bars before it are refetched to check that stored prices are still current
+        if time.time() - meta.get('checkedAt', 0) >= tail_refresh:
+            self.upstream_fetches += 1
+            tail_start = pd.Timestamp(int(bars['ts'][max(0, len(bars) - 1 - ADJUST_CHECK_BARS)]), tz='UTC')
+            if not is_intraday(interval):
+                tail_start = tail_start.normalize()
+            tail = fetch(start=tail_start.to_pydatetime())
+            ratio = self._adjustment(bars, tail)
+            if ratio is not None:
+                self.readjustments += 1
+                self._rescale_locked(symbol, interval, frame_to_bars(tail)['ts'].min(), ratio)
+            self._merge_locked(symbol, interval, tail, None)
+            bars = self.read_bars(symbol, interval)
+
+        # Older history than the upstream has been asked for so far
+        stored_from = meta.get('coveredStart')
+        if stored_from is None or covered_start < stored_from:
+            self.upstream_fetches += 1
+            if start is None:
+                older = fetch(period='max')
+            else:
+                first = pd.Timestamp(int(bars['ts'][0]), tz='UTC')
+                older = fetch(start=start.to_pydatetime(), end=first.to_pydatetime())
+            self._merge_locked(symbol, interval, older, covered_start)
+
+    def _adjustment(self, bars, frame):
+        """
+        The ratio every completed stored close that `frame` also holds has moved by, or None
+        None as well when the closes still match, or moved by different amounts (revised bars, not a
+        re-adjustment of the whole history).
+        """
+        if frame is None or frame.empty or len(bars) < 2:
+            return None
+        fetched = frame_to_bars(frame)
+        # Every stored bar but the last, which may still have been forming when it was stored
+        completed = bars[:-1]
+        positions = np.searchsorted(completed['ts'], fetched['ts'])
+        overlap = positions < len(completed)
+        overlap[overlap] = completed['ts'][positions[overlap]] == fetched['ts'][overlap]
+        new = fetched['close'][overlap]
+        old = np.asarray(completed['close'][positions[overlap]])
+        usable = np.isfinite(new) & np.isfinite(old) & (new > 0) & (old > 0)
+        new, old = new[usable], old[usable]
+        # One bar moving on its own is a revision; a re-adjustment moves all of them
+        if len(new) < 2:
+            return None
+        ratio = float(np.median(new / old))
+        if abs(ratio - 1.0) <= self.adjust_tolerance:
+            return None
+        if not np.allclose(new, old * ratio, rtol=self.adjust_tolerance, atol=PRICE_ROUNDING):
+            return None
+        return ratio
+
+    def _rescale_locked(self, symbol, interval, before, ratio):
+        """Multiply stored prices before `before` (UTC epoch ns) by `ratio`, and divide volumes for a split"""
+        bars_path, _ = self._paths(symbol, interval)
+        bars = np.array(self.read_bars(symbol, interval))
+        older = bars['ts'] < before
+        for field in ('open', 'high', 'low', 'close'):
+            bars[field][older] *= ratio
+        if max(ratio, 1.0 / ratio) >= SPLIT_RATIO:
+            bars['volume'][older] /= ratio
+        tmp_path = bars_path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, bars)
+        os.replace(tmp_path, bars_path)
+
+    def stats(self):
+        return {
+            'root': self.root,
+            'upstreamFetches': self.upstream_fetches,
+            'diskHits': self.disk_hits,
+            'staleReads': self.stale_reads,
+            'readjustments': self.readjustments,
+        }
+
+
+def _to_ns(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    value = pd.Timestamp(value)
+    if value.tz is None:
+        value = value.tz_localize('UTC')
+    return value.value
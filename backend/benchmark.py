@@ -0,0 +1,353 @@
+"""
+Offline load benchmark for the stock data API
+
+Runs the Flask app against the replay provider (no network), drives each endpoint at the
+given concurrency levels and reports throughput and p50/p95/p99 latency:
+
+    cd backend
+    python benchmark.py
+    python benchmark.py --concurrency 1,8,32,128 --requests 500 --latency 0.05 --output bench.json
+
+Caches and the bar store are reset before every run so results are repeatable; pass --warm
+to measure with state carried over between runs instead.
+
+Upstream faults can be injected to see how the circuit breaker and stale-data fallbacks hold up:
+
+    python benchmark.py --warm --fault-error-rate 0.3 --fault-hang-rate 0.05
+
+With --workers, each count runs that many app processes (like gunicorn workers sharing one bar
+store), every one of them asked for every symbol, once with process-local caches only and once
+with the shared cache tier, and reports the upstream calls made across all processes:
+
+    python benchmark.py --workers 1,4,16
+    python benchmark.py --workers 1,4,16 --shared-cache redis://localhost:6379/0
+
+With --startup, fresh processes are booted without and with a warm snapshot (SNAPSHOT_PATH) and the
+boot time and first /stock-details response are reported; the exit status is 1 when booting takes
+longer than STARTUP_BUDGET:
+
+    python benchmark.py --startup
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = {
+    'stock-details': '/stock-details?symbol={symbol}',
+    'historical-data': '/historical-data?symbol={symbol}&period=1y&interval=1d',
+    'chart-with-chat': '/chart-with-chat?symbol={symbol}&interval=30m',
+    'health': '/health',
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated client concurrency levels')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and level')
+    parser.add_argument('--symbols', type=int, default=20, help='Distinct symbols to cycle through')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated upstream latency in seconds')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='Comma-separated endpoints to drive')
+    parser.add_argument('--seed', type=int, default=0, help='Replay data seed')
+    parser.add_argument('--warm', action='store_true', help='Keep caches and stored bars between runs')
+    parser.add_argument('--fault-error-rate', type=float, default=0.0, help='Share of upstream calls that fail')
+    parser.add_argument('--fault-throttle-rate', type=float, default=0.0, help='Share of upstream calls rejected with 429')
+    parser.add_argument('--fault-hang-rate', type=float, default=0.0, help='Share of upstream calls that hang past the timeout')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Upstream calls per second (0: no limit)')
+    parser.add_argument('--workers', help='Comma-separated worker process counts; compares upstream calls with and without the shared cache')
+    parser.add_argument('--shared-cache', help='SHARED_CACHE for --workers runs (default: a scratch directory)')
+    parser.add_argument('--startup', action='store_true', help='Measure cold boot and first response, without and with a snapshot')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, store_dir):
+    """Point the app at the replay provider and a scratch bar store; must run before importing liveData"""
+    os.environ['MARKET_DATA_PROVIDER'] = 'replay'
+    os.environ['REPLAY_LATENCY'] = str(args.latency)
+    os.environ['REPLAY_SEED'] = str(args.seed)
+    os.environ['BAR_STORE_DIR'] = store_dir
+    os.environ.pop('RECORD_DIR', None)
+    os.environ['UPSTREAM_RATE_LIMIT'] = str(args.rate_limit)
+    os.environ['FAULT_ERROR_RATE'] = str(args.fault_error_rate)
+    os.environ['FAULT_THROTTLE_RATE'] = str(args.fault_throttle_rate)
+    os.environ['FAULT_HANG_RATE'] = str(args.fault_hang_rate)
+    # Hangs outlast the upstream timeout, so each one shows up as a timeout
+    os.environ['FAULT_HANG_SECONDS'] = str(float(os.environ.get('UPSTREAM_TIMEOUT', 10)) + 1)
+
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def reset_state(live, store_dir):
+    live.info_cache.invalidate()
+    live.history_cache.invalidate()
+    live.indicator_cache.invalidate()
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.makedirs(store_dir, exist_ok=True)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def fetch(url):
+    """Return (latency seconds, ok, is mock data, is stale)"""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            body = response.read()
+            ok = response.status == 200
+            is_stale = response.headers.get('Warning', '').startswith('110')
+    except (urllib.error.URLError, OSError):
+        return time.perf_counter() - started, False, False, False
+    elapsed = time.perf_counter() - started
+    try:
+        is_mock = bool(json.loads(body).get('isMockData'))
+    except ValueError:
+        is_mock = False
+    return elapsed, ok, is_mock, is_stale
+
+
+def run_level(base_url, endpoint, concurrency, requests, symbols):
+    template = ENDPOINTS[endpoint]
+    urls = [base_url + template.format(symbol=symbols[i % len(symbols)]) for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, urls))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': sum(1 for r in results if not r[1]),
+        'mockResponses': sum(1 for r in results if r[2]),
+        'staleResponses': sum(1 for r in results if r[3]),
+        'throughput': round(requests / wall, 1),
+        'p50Ms': round(percentile(latencies, 50), 2),
+        'p95Ms': round(percentile(latencies, 95), 2),
+        'p99Ms': round(percentile(latencies, 99), 2),
+        'maxMs': round(latencies[-1], 2),
+    }
+
+
+def print_table(results):
+    header = (f"{'endpoint':<18}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              f"{'errors':>8}{'mock':>6}{'stale':>7}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['endpoint']:<18}{r['concurrency']:>6}{r['throughput']:>10}{r['p50Ms']:>10}"
+              f"{r['p95Ms']:>10}{r['p99Ms']:>10}{r['errors']:>8}{r['mockResponses']:>6}{r['staleResponses']:>7}")
+
+
+def worker_process(args, store_dir, shared_cache, endpoints, symbols, barrier, results):
+    """One app process of a --workers run: request every symbol on every endpoint, report upstream calls"""
+    configure_environment(args, store_dir)
+    if shared_cache:
+        os.environ['SHARED_CACHE'] = shared_cache
+    else:
+        os.environ.pop('SHARED_CACHE', None)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import liveData as live
+
+    paths = [ENDPOINTS[endpoint].format(symbol=symbol) for endpoint in endpoints for symbol in symbols]
+    concurrency = int(args.concurrency.split(',')[0])
+
+    def get(path):
+        return live.app.test_client().get(path).status_code == 200
+
+    barrier.wait()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        ok = sum(pool.map(get, paths))
+    results.put({'requests': len(paths), 'errors': len(paths) - ok, 'upstreamCalls': live.upstream_pool.stats()['completed']})
+
+
+def run_workers(args, counts, endpoints, symbols):
+    """Upstream calls across `count` processes, with process-local caches and with the shared tier"""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for count in counts:
+        for shared in (False, True):
+            store_dir = tempfile.mkdtemp(prefix='bench-bars-')
+            shared_dir = tempfile.mkdtemp(prefix='bench-shared-')
+            shared_cache = (args.shared_cache or shared_dir) if shared else None
+            barrier = context.Barrier(count)
+            queue = context.Queue()
+            started = time.perf_counter()
+            processes = [
+                context.Process(target=worker_process, args=(args, store_dir, shared_cache, endpoints, symbols, barrier, queue))
+                for _ in range(count)
+            ]
+            try:
+                for process in processes:
+                    process.start()
+                reports = [queue.get(timeout=600) for _ in processes]
+                for process in processes:
+                    process.join()
+            finally:
+                shutil.rmtree(store_dir, ignore_errors=True)
+                shutil.rmtree(shared_dir, ignore_errors=True)
+            calls = sum(r['upstreamCalls'] for r in reports)
+            results.append({
+                'workers': count,
+                'cache': 'shared' if shared else 'local',
+                'requests': sum(r['requests'] for r in reports),
+                'errors': sum(r['errors'] for r in reports),
+                'upstreamCalls': calls,
+                'callsPerSymbol': round(calls / len(symbols), 2),
+                'wallSeconds': round(time.perf_counter() - started, 2),
+            })
+    return results
+
+
+def print_workers_table(results):
+    header = f"{'workers':>8}{'cache':>8}{'requests':>10}{'errors':>8}{'upstream':>10}{'per symbol':>12}{'wall s':>8}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['workers']:>8}{r['cache']:>8}{r['requests']:>10}{r['errors']:>8}{r['upstreamCalls']:>10}"
+              f"{r['callsPerSymbol']:>12}{r['wallSeconds']:>8}")
+
+
+def startup_process(args, store_dir, snapshot_path, symbols, save, results):
+    """Boot the app in this (fresh) process and time the first response; with `save`, fill the caches and snapshot them"""
+    configure_environment(args, store_dir)
+    if snapshot_path:
+        os.environ['SNAPSHOT_PATH'] = snapshot_path
+    else:
+        os.environ.pop('SNAPSHOT_PATH', None)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    started = time.perf_counter()
+    import liveData as live
+    booted = time.perf_counter()
+    client = live.app.test_client()
+    status = client.get(ENDPOINTS['stock-details'].format(symbol=symbols[0])).status_code
+    first = time.perf_counter()
+    if save:
+        for symbol in symbols:
+            for endpoint in ('stock-details', 'historical-data'):
+                client.get(ENDPOINTS[endpoint].format(symbol=symbol))
+        live.save_snapshot()
+    results.put({
+        'importMs': round((booted - started) * 1000, 1),
+        'phasesMs': {name: round(seconds * 1000, 1) for name, seconds in live.startup_phases.items()},
+        'firstResponseMs': round((first - booted) * 1000, 1),
+        'status': status,
+        'upstreamCalls': live.upstream_pool.stats()['completed'],
+        'restoredEntries': live.restored_entries,
+        'budgetMs': live.STARTUP_BUDGET * 1000,
+    })
+
+
+def run_startup(args, symbols):
+    """Boot fresh processes without and with a snapshot written by a warmed-up process"""
+    context = multiprocessing.get_context('spawn')
+    store_dir = tempfile.mkdtemp(prefix='bench-bars-')
+    snapshot_path = os.path.join(tempfile.mkdtemp(prefix='bench-snapshot-'), 'snapshot.pkl')
+    results = []
+    try:
+        for mode, path, save in (('seed', snapshot_path, True), ('cold', None, False), ('snapshot', snapshot_path, False)):
+            queue = context.Queue()
+            process = context.Process(target=startup_process, args=(args, store_dir, path, symbols, save, queue))
+            process.start()
+            report = queue.get(timeout=600)
+            process.join()
+            if mode != 'seed':
+                results.append(dict(report, mode=mode))
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(snapshot_path), ignore_errors=True)
+    return results
+
+
+def print_startup_table(results):
+    header = f"{'mode':<10}{'boot ms':>9}{'imports ms':>12}{'snapshot ms':>13}{'first resp ms':>15}{'upstream':>10}{'restored':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        phases = r['phasesMs']
+        print(f"{r['mode']:<10}{phases['total']:>9}{phases['imports']:>12}{phases.get('snapshot', 0.0):>13}"
+              f"{r['firstResponseMs']:>15}{r['upstreamCalls']:>10}{r['restoredEntries']:>10}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    levels = [int(level) for level in args.concurrency.split(',') if level]
+    endpoints = [name for name in args.endpoints.split(',') if name]
+    unknown = [name for name in endpoints if name not in ENDPOINTS]
+    if unknown:
+        sys.exit(f"Unknown endpoints: {', '.join(unknown)} (choose from {', '.join(ENDPOINTS)})")
+
+    if args.startup:
+        symbols = [f'SYM{i:03d}' for i in range(args.symbols)]
+        results = run_startup(args, symbols)
+        print_startup_table(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        over = [r for r in results if r['phasesMs']['total'] > r['budgetMs']]
+        for r in over:
+            print(f"{r['mode']}: boot took {r['phasesMs']['total']} ms, over the {r['budgetMs']:.0f} ms budget (STARTUP_BUDGET)")
+        sys.exit(1 if over else 0)
+
+    if args.workers:
+        symbols = [f'SYM{i:03d}' for i in range(args.symbols)]
+        endpoints = [name for name in endpoints if name != 'health']
+        print(f"Replay latency {args.latency * 1000:.0f} ms, {args.symbols} symbols, endpoints: {', '.join(endpoints)}")
+        results = run_workers(args, [int(n) for n in args.workers.split(',') if n], endpoints, symbols)
+        print_workers_table(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        return
+
+    store_dir = tempfile.mkdtemp(prefix='bench-bars-')
+    configure_environment(args, store_dir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import liveData as live
+
+    server, base_url = start_server(live.app)
+    symbols = [f'SYM{i:03d}' for i in range(args.symbols)]
+    print(f"Replay latency {args.latency * 1000:.0f} ms, {args.symbols} symbols, {args.requests} requests per run")
+
+    results = []
+    try:
+        for endpoint in endpoints:
+            for concurrency in levels:
+                if not args.warm:
+                    reset_state(live, store_dir)
+                results.append(run_level(base_url, endpoint, concurrency, args.requests, symbols))
+    finally:
+        server.shutdown()
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Server-side downsampling of long OHLCV series
+
+A chart only has 1-2k pixels across, so `/historical-data?max_points=N` reduces a series to at
+most N bars before it is serialized:
+- `ohlc` (default): consecutive bars are merged into N equal-count candles (first open, highest
+  high, lowest low, last close, summed volume), so no high or low is lost.
+- `lttb`: Largest-Triangle-Three-Buckets on the close, which keeps the bars that carry the
+  visual shape of a line chart; each kept bar's volume becomes the total of the bars it stands for.
+
+Volume totals are preserved by both methods. Bucket statistics are computed with `reduceat`
+over whole arrays; LTTB walks its buckets in order (each step depends on the previous pick)
+but evaluates every candidate in a bucket at once.
+"""
+import numpy as np
+import pandas as pd
+from flask import jsonify
+
+METHODS = ('ohlc', 'lttb')
+MIN_POINTS = 3
+
+
+def requested_downsampling(args):
+    """Return (max_points, method, error_response) for the `max_points`/`downsample` query parameters"""
+    raw = args.get('max_points')
+    method = args.get('downsample', 'ohlc').lower()
+    if method not in METHODS:
+        return None, None, (jsonify({'error': f"Unsupported downsample method '{method}'; use one of {', '.join(METHODS)}"}), 400)
+    if raw is None or raw == '':
+        return None, method, None
+    try:
+        max_points = int(raw)
+    except ValueError:
+        return None, None, (jsonify({'error': 'max_points must be an integer'}), 400)
+    if max_points < MIN_POINTS:
+        return None, None, (jsonify({'error': f'max_points must be at least {MIN_POINTS}'}), 400)
+    return max_points, method, None
+
+
+def bucket_starts(n, buckets):
+    """Start offsets of `buckets` contiguous, near-equal runs covering n items"""
+    return (np.arange(buckets, dtype=np.int64) * n) // buckets
+
+
+def ohlc_buckets(open_, high, low, close, volume, max_points):
+    """Merge consecutive bars into at most `max_points` candles; returns (starts, open, high, low, close, volume)"""
+    n = len(close)
+    starts = bucket_starts(n, min(n, max_points))
+    ends = np.concatenate([starts[1:], [n]]) - 1
+    return (
+        starts,
+        open_[starts],
+        # fmax/fmin skip NaN unless a whole bucket is missing
+        np.fmax.reduceat(high, starts),
+        np.fmin.reduceat(low, starts),
+        close[ends],
+        np.add.reduceat(np.nan_to_num(volume), starts),
+    )
+
+
+def lttb_indices(y, max_points):
+    """
+    Indices of the bars kept by Largest-Triangle-Three-Buckets, and the start offsets of the
+    runs of bars each kept bar represents
+    The first and last bars are always kept; x is the bar position.
+    """
+    n = len(y)
+    if n <= max_points:
+        indices = np.arange(n)
+        return indices, indices
+    y = np.asarray(y, dtype=float)
+    x = np.arange(n, dtype=float)
+
+    # Interior bars [1, n-1) split into max_points - 2 buckets
+    edges = 1 + bucket_starts(n - 2, max_points - 2)
+    edges = np.concatenate([edges, [n - 1]])
+    counts = np.diff(edges)
+    valid = ~np.isnan(y)
+    y_filled = np.where(valid, y, 0.0)
+    y_sums = np.add.reduceat(y_filled, edges[:-1])
+    y_counts = np.add.reduceat(valid.astype(float), edges[:-1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y_means = y_sums / y_counts
+    x_means = edges[:-1] + (counts - 1) / 2.0
+    # The bucket after the last one is the final bar
+    next_x = np.concatenate([x_means[1:], [x[-1]]])
+    next_y = np.concatenate([y_means[1:], [y[-1]]])
+
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = x[a], y[a]
+        bx, by = next_x[bucket], next_y[bucket]
+        if np.isnan(ay) or np.isnan(by):
+            # Missing prices: fall back to the middle bar of the bucket
+            a = lo + (hi - lo) // 2
+        else:
+            area = np.abs((ax - x[lo:hi]) * (by - ay) - (ax - bx) * (y[lo:hi] - ay))
+            area[np.isnan(area)] = -1.0
+            a = lo + int(np.argmax(area))
+        indices[bucket + 1] = a
+
+    # Each kept bar stands for its whole bucket: [0], [edges...], [n-1]
+    starts = np.concatenate([[0], edges])
+    return indices, starts
+
+
+def downsample_arrays(columns, max_points, method='ohlc'):
+    """
+    Downsample a dict of equal-length arrays with open/high/low/close/volume entries
+    Other entries (dates, timestamps) take the value of each output bar's first (ohlc) or kept (lttb) bar.
+    Returns (columns, positions) where positions index the source bar behind each output bar.
+    """
+    n = len(columns['close'])
+    if n <= max_points:
+        return columns, np.arange(n)
+    out = {}
+    if method == 'lttb':
+        positions, starts = lttb_indices(columns['close'], max_points)
+        volume = np.add.reduceat(np.nan_to_num(columns['volume']), starts)
+        for name, values in columns.items():
+            out[name] = volume if name == 'volume' else values[positions]
+        return out, positions
+
+    positions, open_, high, low, close, volume = ohlc_buckets(
+        columns['open'], columns['high'], columns['low'], columns['close'], columns['volume'], max_points
+    )
+    merged = {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+    for name, values in columns.items():
+        out[name] = merged[name] if name in merged else values[positions]
+    return out, positions
+
+
+def downsample_frame(hist, max_points, method='ohlc'):
+    """Downsample a yfinance-shaped OHLCV frame to at most `max_points` bars (before serializing)"""
+    if len(hist) <= max_points:
+        return hist
+    arrays = {name.lower(): hist[name].to_numpy(dtype=float) for name in ('Open', 'High', 'Low', 'Close', 'Volume')}
+    reduced, positions = downsample_arrays(arrays, max_points, method)
+    return pd.DataFrame({name: reduced[name.lower()] for name in hist.columns if name.lower() in reduced},
+                        index=hist.index[positions])
@@ -0,0 +1,56 @@
+"""
+Production serving configuration for the stock data API
+
+    cd backend
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py liveData:app
+
+Each worker process runs `threads` request threads (gthread worker), so a request waiting on
+Yahoo blocks one thread rather than a whole worker. Upstream calls inside a worker are capped
+by UPSTREAM_CONCURRENCY and bounded by UPSTREAM_TIMEOUT (see upstream.py), so requests beyond
+the cap wait in a bounded queue and fall back quickly instead of starving the workers.
+Streaming clients (/chart-with-chat/stream) each hold one thread for as long as they are connected.
+Set SHARED_CACHE (see sharedCache.py) so the workers share fetched data instead of each one
+fetching every symbol itself.
+
+The app is imported once in the master (preload_app) and the workers are forked from it, so a new
+or restarted worker starts with NumPy/pandas loaded and the SNAPSHOT_PATH state restored instead of
+paying for both itself. Set PRELOAD_APP=0 to import the app in every worker instead.
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('WORKER_THREADS', 64))
+
+# Longer than UPSTREAM_TIMEOUT so slow upstream calls fall back to mock data before the worker is killed
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+preload_app = os.environ.get('PRELOAD_APP', '1') != '0'
+if preload_app:
+    # Threads started in the master would not survive the fork; each worker starts its own
+    os.environ['BACKGROUND_THREADS'] = 'post_fork'
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import liveData
+        liveData.start_background()
+
+
+def worker_exit(server, worker):
+    # Graceful stop or restart: leave the warm state for the next worker (merged with the other workers')
+    import liveData
+    liveData.save_snapshot()
+    # Only workers that ran a backtest imported the engine and may have a process pool to stop
+    backtest = sys.modules.get('backtest')
+    if backtest is not None:
+        backtest.shutdown_pool()
@@ -0,0 +1,98 @@
+"""
+Conditional GET and compression for market-data responses
+
+- ETags are built from a digest of the data behind a response (the `info` dict, the bars) and the
+  query, not from the rendered body, so the per-request `timestamp` field does not change them and a
+  matching `If-None-Match` is answered with 304 before indicators, serialization or compression run.
+  They are weak ETags: the same data may be sent gzip-, brotli- or un-encoded.
+- `Cache-Control` follows the data's freshness: a short max-age while the symbol's exchange is open,
+  a longer one while it is closed, `no-cache` for stale fallback data and `no-store` for mock data.
+- Bodies of at least `min_size` bytes are compressed with brotli (optional `brotli` package) or gzip,
+  whichever the client accepts.
+"""
+import gzip
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+# Mime types worth compressing; Arrow streams and MessagePack are already compact binary
+COMPRESSIBLE = ('application/json', 'text/plain', 'text/html')
+
+
+def data_version(*values):
+    """
+    Digest of the data in `values` (frames, NumPy arrays, dicts, scalars)
+    Frames are hashed from their raw index and values, so this is far cheaper than rendering them.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for value in values:
+        _update(digest, value)
+    return digest.hexdigest()
+
+
+def _update(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(','.join(map(str, value.columns)).encode())
+        index = value.index
+        digest.update(index.asi8.tobytes() if isinstance(index, pd.DatetimeIndex) else repr(index.tolist()).encode())
+        digest.update(np.ascontiguousarray(value.to_numpy(dtype=float)).tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr(value.tolist()).encode() if value.dtype == object else np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(str(key).encode() + b'\0')
+            _update(digest, value[key])
+    else:
+        digest.update(repr(value).encode() + b'\0')
+
+
+def cache_control(max_age, stale=False, mock=False):
+    """The Cache-Control value for a response built from data that is fresh for `max_age` seconds"""
+    if mock:
+        return 'no-store'
+    if stale:
+        # Served from a fallback tier; let clients keep it but revalidate every time
+        return 'no-cache'
+    return f'public, max-age={int(max_age)}'
+
+
+def compress(response, accept_encoding, min_size=1024, level=6):
+    """
+    Compress `response` in place with the best encoding in `accept_encoding` (brotli, then gzip)
+    Streamed, already encoded, small and binary responses are left alone.
+    """
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    if response.status_code != 200 or response.mimetype not in COMPRESSIBLE:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        encoded, encoding = brotli.compress(body, quality=min(level, 11)), 'br'
+    elif 'gzip' in accepted:
+        encoded, encoding = gzip.compress(body, compresslevel=level), 'gzip'
+    else:
+        return response
+    response.set_data(encoded)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _accepted(header):
+    """Codings named in an Accept-Encoding header, without those refused with q=0"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
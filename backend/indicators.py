@@ -0,0 +1,362 @@
+"""
+Technical indicators over NumPy arrays
+
+Outputs match the pandas formulas originally used by /stock-details:
+- MA50 / MA200: simple rolling means (NaN until the window is full)
+- RSI(14): rolling means of gains and losses (first bar counts as a zero move)
+- MACD: EMA12 - EMA26 with a 9-period signal line, all EMAs with adjust=False
+
+Batch mode works on a 2-D (symbols x bars) matrix in one pass; shorter histories are
+left-padded with NaN by `stack_closes`. Incremental mode (`IndicatorState`) updates the
+latest values in O(1) per new bar.
+
+Run `python indicators.py` to check parity against the pandas formulas and time them against each other.
+"""
+from collections import deque
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+MA_SHORT = 50
+MA_LONG = 200
+RSI_PERIOD = 14
+EMA_FAST = 12
+EMA_SLOW = 26
+EMA_SIGNAL = 9
+
+INDICATOR_NAMES = ('ma50', 'ma200', 'rsi', 'macd', 'signal')
+
+
+def stack_closes(series_list):
+    """Right-align 1-D price arrays into a (len(series_list) x max_len) matrix padded with NaN on the left"""
+    width = max((len(s) for s in series_list), default=0)
+    matrix = np.full((len(series_list), width), np.nan)
+    for row, values in enumerate(series_list):
+        if len(values):
+            matrix[row, width - len(values):] = values
+    return matrix
+
+
+def rolling_mean(values, window):
+    """Rolling mean along the last axis; NaN where the window is incomplete or contains NaN"""
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    n = values.shape[-1]
+    if n < window:
+        return out
+    nan_mask = np.isnan(values)
+    filled = np.where(nan_mask, 0.0, values)
+    zeros = np.zeros(values.shape[:-1] + (1,))
+    csum = np.concatenate([zeros, np.cumsum(filled, axis=-1)], axis=-1)
+    ccount = np.concatenate([zeros, np.cumsum(nan_mask, axis=-1)], axis=-1)
+    sums = csum[..., window:] - csum[..., :-window]
+    nans = ccount[..., window:] - ccount[..., :-window]
+    out[..., window - 1:] = np.where(nans > 0, np.nan, sums / window)
+    return out
+
+
+def ema(values, span):
+    """
+    Exponential moving average along the last axis (pandas `ewm(span, adjust=False)`)
+    Each row is seeded with its first non-NaN value; NaN inputs after that carry the previous value.
+    The recursion runs in pandas' compiled `ewm`, one column per row of `values`.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        return pd.Series(values).ewm(span=span, adjust=False, ignore_na=True).mean().to_numpy()
+    matrix = values.reshape(-1, values.shape[-1])
+    out = pd.DataFrame(matrix.T).ewm(span=span, adjust=False, ignore_na=True).mean().to_numpy().T
+    return out.reshape(values.shape)
+
+
+def rsi(close, period=RSI_PERIOD):
+    """Relative Strength Index along the last axis using rolling means of gains and losses"""
+    close = np.asarray(close, dtype=float)
+    delta = np.full(close.shape, np.nan)
+    delta[..., 1:] = np.diff(close, axis=-1)
+    # Matches `delta.where(delta > 0, 0)`: the undefined first move counts as zero
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), period)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), period)
+    # Rows padded with NaN must stay NaN until they have `period` real moves
+    started = rolling_mean(np.where(np.isnan(close), np.nan, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = gain / loss
+        out = 100.0 - (100.0 / (1.0 + rs))
+    return np.where(np.isnan(started), np.nan, out)
+
+
+def macd(close):
+    """Return (macd, signal) along the last axis"""
+    line = ema(close, EMA_FAST) - ema(close, EMA_SLOW)
+    return line, ema(line, EMA_SIGNAL)
+
+
+def compute_indicators(close):
+    """Full indicator series for a 1-D price array or a 2-D (symbols x bars) matrix"""
+    close = np.asarray(close, dtype=float)
+    macd_line, signal = macd(close)
+    return {
+        'ma50': rolling_mean(close, MA_SHORT),
+        'ma200': rolling_mean(close, MA_LONG),
+        'rsi': rsi(close),
+        'macd': macd_line,
+        'signal': signal,
+    }
+
+
+def latest_indicators(close, names=None):
+    """
+    Latest indicator values only
+    For a 1-D array returns a dict of floats (None where not yet defined);
+    for a 2-D matrix returns a dict of 1-D arrays, one value per row.
+    Rolling windows are evaluated on the tail only; the EMAs still need the full series.
+    `names` limits the work to some of ma50, ma200, rsi, macd and signal (default: all).
+    """
+    close = np.asarray(close, dtype=float)
+    names = INDICATOR_NAMES if names is None else tuple(n for n in INDICATOR_NAMES if n in names)
+    if close.shape[-1] == 0:
+        if close.ndim == 1:
+            return {name: None for name in names}
+        return {name: np.full(close.shape[:-1], np.nan) for name in names}
+    values = {}
+    if 'ma50' in names:
+        values['ma50'] = rolling_mean(close[..., -MA_SHORT:], MA_SHORT)[..., -1]
+    if 'ma200' in names:
+        values['ma200'] = rolling_mean(close[..., -MA_LONG:], MA_LONG)[..., -1]
+    if 'rsi' in names:
+        values['rsi'] = _rsi_tail(close)
+    if 'macd' in names or 'signal' in names:
+        macd_line, signal = macd(close)
+        if 'macd' in names:
+            values['macd'] = macd_line[..., -1]
+        if 'signal' in names:
+            values['signal'] = signal[..., -1]
+    if close.ndim == 1:
+        return {k: _to_float(v) for k, v in values.items()}
+    return values
+
+
+def _rsi_tail(close):
+    """RSI at the last bar, computed from the final `RSI_PERIOD + 1` prices"""
+    n = close.shape[-1]
+    # With exactly RSI_PERIOD bars the first (zero) move is still inside the window
+    tail = close[..., -(RSI_PERIOD + 1):] if n > RSI_PERIOD else close
+    return rsi(tail)[..., -1]
+
+
+def _to_float(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class IndicatorState:
+    """
+    Incremental indicator state for one symbol
+    `update(close)` appends a bar in O(1); `update(close, replace=True)` revises the
+    latest (still forming) bar instead of appending a new one.
+    """
+
+    def __init__(self):
+        self._short = deque()
+        self._long = deque()
+        self._gains = deque()
+        self._losses = deque()
+        self._sum_short = 0.0
+        self._sum_long = 0.0
+        self._sum_gain = 0.0
+        self._sum_loss = 0.0
+        self._ema_fast = None
+        self._ema_slow = None
+        self._ema_signal = None
+        self._prev_close = None
+        self._last_close = None
+        self._undo = None
+        self.count = 0
+
+    @classmethod
+    def from_closes(cls, closes):
+        """Build state by replaying a price history"""
+        state = cls()
+        for close in closes:
+            if not math.isnan(close):
+                state.update(float(close))
+        return state
+
+    def update(self, close, replace=False):
+        """Apply a new bar (or revise the latest bar) and return the latest indicator values"""
+        if replace and self._undo is not None:
+            self._rollback()
+        undo = {
+            'emas': (self._ema_fast, self._ema_slow, self._ema_signal),
+            'closes': (self._prev_close, self._last_close),
+            'evicted': [],
+        }
+
+        delta = 0.0 if self._last_close is None else close - self._last_close
+        self._prev_close = self._last_close
+        self._last_close = close
+
+        undo['evicted'].append(self._push(self._short, close, MA_SHORT, '_sum_short'))
+        undo['evicted'].append(self._push(self._long, close, MA_LONG, '_sum_long'))
+        undo['evicted'].append(self._push(self._gains, max(delta, 0.0), RSI_PERIOD, '_sum_gain'))
+        undo['evicted'].append(self._push(self._losses, max(-delta, 0.0), RSI_PERIOD, '_sum_loss'))
+
+        if self._ema_fast is None:
+            self._ema_fast = self._ema_slow = close
+            self._ema_signal = 0.0
+        else:
+            self._ema_fast += (2.0 / (EMA_FAST + 1)) * (close - self._ema_fast)
+            self._ema_slow += (2.0 / (EMA_SLOW + 1)) * (close - self._ema_slow)
+            line = self._ema_fast - self._ema_slow
+            self._ema_signal += (2.0 / (EMA_SIGNAL + 1)) * (line - self._ema_signal)
+
+        self.count += 1
+        self._undo = undo
+        # Re-sum occasionally so floating point drift cannot accumulate on long streams
+        if self.count % 1000 == 0:
+            self._resum()
+        return self.latest()
+
+    def _push(self, window, value, size, total_attr):
+        window.append(value)
+        setattr(self, total_attr, getattr(self, total_attr) + value)
+        if len(window) > size:
+            evicted = window.popleft()
+            setattr(self, total_attr, getattr(self, total_attr) - evicted)
+            return evicted
+        return None
+
+    def _rollback(self):
+        undo = self._undo
+        for window, total_attr, evicted in zip(
+            (self._short, self._long, self._gains, self._losses),
+            ('_sum_short', '_sum_long', '_sum_gain', '_sum_loss'),
+            undo['evicted'],
+        ):
+            value = window.pop()
+            setattr(self, total_attr, getattr(self, total_attr) - value)
+            if evicted is not None:
+                window.appendleft(evicted)
+                setattr(self, total_attr, getattr(self, total_attr) + evicted)
+        self._ema_fast, self._ema_slow, self._ema_signal = undo['emas']
+        self._prev_close, self._last_close = undo['closes']
+        self.count -= 1
+        self._undo = None
+
+    def _resum(self):
+        self._sum_short = math.fsum(self._short)
+        self._sum_long = math.fsum(self._long)
+        self._sum_gain = math.fsum(self._gains)
+        self._sum_loss = math.fsum(self._losses)
+
+    def latest(self):
+        """Latest indicator values as a dict of floats (None where not yet defined)"""
+        if self.count == 0:
+            return {'ma50': None, 'ma200': None, 'rsi': None, 'macd': None, 'signal': None}
+        rsi_value = None
+        if len(self._gains) == RSI_PERIOD:
+            if self._sum_loss > 0:
+                rsi_value = 100.0 - 100.0 / (1.0 + self._sum_gain / self._sum_loss)
+            elif self._sum_gain > 0:
+                rsi_value = 100.0
+        return {
+            'ma50': self._sum_short / MA_SHORT if len(self._short) == MA_SHORT else None,
+            'ma200': self._sum_long / MA_LONG if len(self._long) == MA_LONG else None,
+            'rsi': rsi_value,
+            'macd': self._ema_fast - self._ema_slow,
+            'signal': self._ema_signal,
+        }
+
+
+def _pandas_reference(close):
+    """The original /stock-details formulas, kept for the parity check"""
+    series = pd.Series(close)
+    delta = series.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=RSI_PERIOD).mean()
+    loss = -delta.where(delta < 0, 0).rolling(window=RSI_PERIOD).mean()
+    macd_line = series.ewm(span=EMA_FAST, adjust=False).mean() - series.ewm(span=EMA_SLOW, adjust=False).mean()
+    return {
+        'ma50': series.rolling(window=MA_SHORT).mean().to_numpy(),
+        'ma200': series.rolling(window=MA_LONG).mean().to_numpy(),
+        'rsi': (100 - (100 / (1 + gain / loss))).to_numpy(),
+        'macd': macd_line.to_numpy(),
+        'signal': macd_line.ewm(span=EMA_SIGNAL, adjust=False).mean().to_numpy(),
+    }
+
+
+def check_parity(n_symbols=20, max_bars=600, seed=7, rtol=1e-9, atol=1e-9):
+    """Compare batch, latest-only and incremental outputs with the pandas formulas; returns a list of failures"""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, max_bars, n_symbols)
+    lengths[:3] = [1, RSI_PERIOD, MA_LONG]
+    series_list = [100 * np.exp(np.cumsum(rng.normal(0, 0.02, n))) for n in lengths]
+    # Flat stretch exercises the zero-loss branch of RSI
+    series_list[3] = np.concatenate([series_list[3], np.full(20, series_list[3][-1])])
+    batch = compute_indicators(stack_closes(series_list))
+    batch_latest = latest_indicators(stack_closes(series_list))
+
+    failures = []
+    for row, close in enumerate(series_list):
+        expected = _pandas_reference(close)
+        width = batch['ma50'].shape[1]
+        single = latest_indicators(close)
+        state = IndicatorState()
+        for value in close[:-1]:
+            state.update(value)
+        state.update(close[-1] * 1.05)
+        incremental = state.update(close[-1], replace=True)
+        for name, values in expected.items():
+            got = batch[name][row, width - len(close):]
+            if not np.allclose(got, values, rtol=rtol, atol=atol, equal_nan=True):
+                failures.append(f'batch {name} row {row}')
+            want = values[-1]
+            for mode, value in (('latest', single[name]), ('batch-latest', batch_latest[name][row]),
+                                ('incremental', incremental[name])):
+                value = np.nan if value is None else value
+                if not np.allclose(value, want, rtol=1e-7, atol=1e-7, equal_nan=True):
+                    failures.append(f'{mode} {name} row {row}: {value} != {want}')
+    return failures
+
+
+def check_speed(shapes=((2500,), (10000,), (200, 2500)), repeat=3, seed=7, max_ratio=1.0):
+    """
+    Time `latest_indicators` against the per-series pandas formulas it replaced
+    Returns (report lines, failures); a shape fails when it is more than `max_ratio` times as slow.
+    """
+    rng = np.random.default_rng(seed)
+    lines, failures = [], []
+    for shape in shapes:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=-1))
+        rows = np.atleast_2d(close)
+        ours = _best_time(lambda: latest_indicators(close), repeat)
+        reference = _best_time(lambda: [_pandas_reference(row) for row in rows], repeat)
+        label = ' x '.join(map(str, shape))
+        lines.append(f'{label:>12} bars: {ours * 1000:8.1f} ms (pandas {reference * 1000:8.1f} ms)')
+        if ours > reference * max_ratio:
+            failures.append(f'latest_indicators on {label} bars is slower than pandas')
+    return lines, failures
+
+
+def _best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+if __name__ == '__main__':
+    problems = check_parity()
+    timings, slow = check_speed()
+    for line in timings:
+        print(line)
+    problems += slow
+    if problems:
+        print('Indicator parity check FAILED:')
+        for problem in problems:
+            print(f'  - {problem}')
+        raise SystemExit(1)
+    print('Indicator parity check passed')
@@ -1,15 +1,327 @@
-from flask import Flask, jsonify, request
+import time
+# Boot is timed from here (see STARTUP_BUDGET); most of it is the imports below
+BOOT_STARTED = time.perf_counter()
+
+from flask import (
+    Flask, Response, copy_current_request_context, g, has_request_context, jsonify, request, stream_with_context
+)
 from flask_cors import CORS
-import yfinance as yf
+from werkzeug.serving import is_running_from_reloader
 import numpy as np
 import pandas as pd
+import json
+import os
+import queue
+import atexit
 import random
-import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from barStore import BarStore, interval_seconds, is_intraday, period_start, slice_period
+from downsample import downsample_arrays, downsample_frame, requested_downsampling
+from httpCache import cache_control, compress, data_version
+from indicators import latest_indicators, stack_closes
+from metrics import Registry
+from portfolio import PortfolioError, parse_holdings, valuate
+from projection import (
+    FieldError, history_fields, history_period, indicators_for, needs_info, parse_fields, project
+)
+from providers import create_provider
+from quoteCache import QuoteCache
+from resample import INTRADAY_BASE, INTRADAY_BASE_PERIOD, base_for, exchange_session, resample, session_for
+from screener import Expression, ScreenerError, load_universe, screen
+from sharedCache import create_shared_store
+from snapshot import restore_state, save_state
+from serializers import (
+    columns_to_records, data_response, frame_columns, requested_format, rows_to_columns
+)
+from streaming import LiveBarHub
+from synthetic import generate_bars, generate_period
+from upstream import AdaptiveRateLimiter, CircuitBreaker, UpstreamPool
+from warmer import WatchlistWarmer, market_open
+
+# Seconds spent in each boot phase, reported on /health and /metrics
+startup_phases = {'imports': time.perf_counter() - BOOT_STARTED}
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Optional tier shared by all worker processes (a tmpfs directory or Redis, see sharedCache.py):
+# one worker fetches a symbol and every worker serves it
+SHARED_LOCK_TIMEOUT = float(os.environ.get('SHARED_CACHE_LOCK_TIMEOUT', 15))
+shared_store = create_shared_store(os.environ.get('SHARED_CACHE'), lock_timeout=SHARED_LOCK_TIMEOUT)
+
+# Upstream caches: `info` changes slowly, price history is refreshed more often.
+# Stale entries are served while a background refresh runs.
+info_cache = QuoteCache(
+    'info',
+    maxsize=int(os.environ.get('INFO_CACHE_SIZE', 512)),
+    ttl=float(os.environ.get('INFO_CACHE_TTL', 300)),
+    stale_ttl=float(os.environ.get('INFO_CACHE_STALE_TTL', 1800)),
+    shared=shared_store,
+    lock_timeout=SHARED_LOCK_TIMEOUT,
+)
+history_cache = QuoteCache(
+    'history',
+    maxsize=int(os.environ.get('HISTORY_CACHE_SIZE', 512)),
+    ttl=float(os.environ.get('HISTORY_CACHE_TTL', 60)),
+    stale_ttl=float(os.environ.get('HISTORY_CACHE_STALE_TTL', 600)),
+    shared=shared_store,
+    lock_timeout=SHARED_LOCK_TIMEOUT,
+)
+# Latest indicator values keyed by a digest of the closes they came from, so they are computed
+# once per bar update rather than once per request (and once per deployment with a shared tier)
+indicator_cache = QuoteCache(
+    'indicators',
+    maxsize=int(os.environ.get('INDICATOR_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('INDICATOR_CACHE_TTL', 3600)),
+    stale_ttl=0,
+    shared=shared_store,
+    lock_timeout=SHARED_LOCK_TIMEOUT,
+)
+
+# Market data source: Yahoo Finance by default, or offline replay (MARKET_DATA_PROVIDER=replay)
+provider = create_provider()
+
+# Every upstream call runs on one bounded pool with a per-call timeout, so a slow
+# Yahoo cannot tie up more than UPSTREAM_CONCURRENCY threads per process.
+# A circuit breaker fails calls fast while the upstream keeps failing, and an adaptive
+# token bucket backs off when it throttles (UPSTREAM_RATE_LIMIT=0 disables the limiter)
+upstream_pool = UpstreamPool(
+    concurrency=int(os.environ.get('UPSTREAM_CONCURRENCY', 16)),
+    timeout=float(os.environ.get('UPSTREAM_TIMEOUT', 10)),
+    max_queue=int(os.environ.get('UPSTREAM_MAX_QUEUE', 256)),
+    breaker=CircuitBreaker(
+        threshold=int(os.environ.get('UPSTREAM_BREAKER_THRESHOLD', 5)),
+        cooldown=float(os.environ.get('UPSTREAM_BREAKER_COOLDOWN', 30)),
+    ),
+    limiter=AdaptiveRateLimiter(
+        max_rate=float(os.environ.get('UPSTREAM_RATE_LIMIT', 20)),
+        min_rate=float(os.environ.get('UPSTREAM_RATE_MIN', 1)),
+        burst=float(os.environ.get('UPSTREAM_RATE_BURST', 40)),
+        max_wait=float(os.environ.get('UPSTREAM_RATE_MAX_WAIT', 2)),
+    ),
+)
+
+# Persistent OHLCV bars so restarts and repeated requests are answered from disk
+bar_store = BarStore(
+    os.environ.get('BAR_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bars')),
+    tail_refresh=float(os.environ.get('BAR_STORE_TAIL_REFRESH', 60)),
+)
+
+# Batch endpoints fan `info` lookups out over a bounded pool
+MAX_BATCH_SYMBOLS = int(os.environ.get('MAX_BATCH_SYMBOLS', 200))
+batch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('BATCH_INFO_WORKERS', 8)))
+
+# Screener universes: `symbols=` lists or named files in UNIVERSE_DIR
+UNIVERSE_DIR = os.environ.get('UNIVERSE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'universes'))
+MAX_SCREENER_SYMBOLS = int(os.environ.get('MAX_SCREENER_SYMBOLS', 2000))
+
+# Backtests run symbol chunks on a process pool
+MAX_BACKTEST_SYMBOLS = int(os.environ.get('MAX_BACKTEST_SYMBOLS', 500))
+BACKTEST_WORKERS = int(os.environ.get('BACKTEST_WORKERS', os.cpu_count() or 1))
+
+# Longest /chart-with-chat start/end range (calendar days), and how far back the upstream serves
+# intraday bars other than 1m (1m bars only reach back INTRADAY_BASE_PERIOD)
+CHART_MAX_RANGE_DAYS = int(os.environ.get('CHART_MAX_RANGE_DAYS', 92))
+INTRADAY_UPSTREAM_DAYS = 60
+
+# Placeholder history for /stock-details requests whose fields need no bars
+EMPTY_HISTORY = pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+
+# Browser/CDN max-age for market data while the symbol's exchange is open and while it is closed,
+# and the smallest body worth compressing (see httpCache.py)
+HTTP_MAX_AGE_OPEN = int(os.environ.get('HTTP_MAX_AGE_OPEN', 15))
+HTTP_MAX_AGE_CLOSED = int(os.environ.get('HTTP_MAX_AGE_CLOSED', 300))
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+# Seed of the synthetic series behind mock responses
+MOCK_DATA_SEED = int(os.environ.get('MOCK_DATA_SEED', 0))
+
+# Prometheus metrics served on /metrics
+metrics = Registry()
+request_latency = metrics.histogram(
+    'stock_api_request_seconds', 'Request latency by endpoint and status', ('endpoint', 'status'))
+stage_latency = metrics.histogram(
+    'stock_api_stage_seconds', 'Time spent in each stage of a request', ('endpoint', 'stage'))
+upstream_latency = metrics.histogram(
+    'stock_api_upstream_seconds', 'Upstream call latency by operation', ('operation',))
+upstream_calls = metrics.counter(
+    'stock_api_upstream_calls_total', 'Upstream calls by endpoint and operation', ('endpoint', 'operation'))
+upstream_errors = metrics.counter(
+    'stock_api_upstream_errors_total', 'Failed upstream calls by endpoint, operation and error type',
+    ('endpoint', 'operation', 'error'))
+resampled_bars = metrics.counter(
+    'stock_api_resampled_total', 'History loads derived locally from a base interval', ('interval',))
+mock_responses = metrics.counter(
+    'stock_api_mock_responses_total', 'Responses served from mock data, by endpoint and reason', ('endpoint', 'reason'))
+fallback_data = metrics.counter(
+    'stock_api_fallback_total', 'Stale data served after an upstream failure, by endpoint and tier', ('endpoint', 'tier'))
+not_modified_responses = metrics.counter(
+    'stock_api_not_modified_total', 'Conditional requests answered with 304 Not Modified', ('endpoint',))
+
+# Consecutive upstream failures after which /health reports the upstream as unreachable
+HEALTH_FAILURE_THRESHOLD = int(os.environ.get('HEALTH_FAILURE_THRESHOLD', 3))
+
+def current_endpoint():
+    """Flask endpoint of the current request, or `background` for cache refreshes and pollers"""
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'unknown'
+
+def stage(name):
+    """Time a block of the current request under stock_api_stage_seconds"""
+    return stage_latency.time(current_endpoint(), name)
+
+def call_upstream(operation, fn, *args, **kwargs):
+    """Run `fn` on the upstream pool, counting the call and its outcome for the current endpoint"""
+    endpoint = current_endpoint()
+    upstream_calls.inc(endpoint, operation)
+    started = time.perf_counter()
+    try:
+        return upstream_pool.call(fn, *args, **kwargs)
+    except Exception as e:
+        upstream_errors.inc(endpoint, operation, type(e).__name__)
+        raise
+    finally:
+        upstream_latency.observe(time.perf_counter() - started, operation)
+
+def record_stale_fallback(tier, age, message=None):
+    """
+    Count data served from a fallback tier (`stale_cache` or `stored_bars`) after an upstream failure
+    The response is flagged stale with the age of the oldest data used (see `freshness`).
+    """
+    if message:
+        print(message)
+    fallback_data.inc(current_endpoint(), tier)
+    if has_request_context():
+        # Kept on the request itself rather than `g`, so lookups on the batch pool are seen too
+        request.environ['stock_api.data_age'] = max(request.environ.get('stock_api.data_age', 0.0), age)
+
+def freshness():
+    """`stale`/`dataAge` payload fields when the current request was answered with stale data"""
+    age = request.environ.get('stock_api.data_age') if has_request_context() else None
+    return {} if age is None else {'stale': True, 'dataAge': round(age)}
+
+def record_mock_fallback(reason, message=None):
+    """Count a response answered with mock data, logging `message` when there is one"""
+    if message:
+        print(message)
+    mock_responses.inc(current_endpoint(), reason)
+    if has_request_context():
+        request.environ['stock_api.mock'] = True
+
+def not_modified(symbol, *data):
+    """
+    Tag the current response with an ETag for `data` (the info/bars behind it) and a Cache-Control
+    Returns a 304 response when the client's If-None-Match already holds that version, so the
+    rest of the request (indicators, serialization) is skipped; otherwise None.
+    """
+    stale = request.environ.get('stock_api.data_age') is not None
+    etag = data_version(request.path, sorted(request.args.items(multi=True)), stale, *data)
+    request.environ['stock_api.etag'] = etag
+    request.environ['stock_api.max_age'] = HTTP_MAX_AGE_OPEN if market_open(session_for(symbol)) else HTTP_MAX_AGE_CLOSED
+    if request.if_none_match.contains_weak(etag):
+        not_modified_responses.inc(current_endpoint())
+        return app.response_class(status=304)
+    return None
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    age = request.environ.get('stock_api.data_age')
+    if age is not None:
+        response.headers['Age'] = str(int(age))
+        response.headers['Warning'] = '110 - "Response is Stale"'
+    mock = request.environ.get('stock_api.mock', False)
+    etag = request.environ.get('stock_api.etag')
+    if mock:
+        response.headers['Cache-Control'] = cache_control(0, mock=True)
+    elif etag is not None and response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = cache_control(request.environ['stock_api.max_age'], stale=age is not None)
+    compress(response, request.headers.get('Accept-Encoding'), COMPRESS_MIN_SIZE, COMPRESS_LEVEL)
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_latency.observe(time.perf_counter() - started, current_endpoint(), str(response.status_code))
+    return response
+
+def fetch_info(symbol):
+    """
+    Return the provider's `info` for `symbol`, shared across concurrent requests
+    If the upstream fails, the last cached `info` is served however old (flagged stale).
+    """
+    try:
+        return info_cache.get_or_fetch(symbol, lambda: call_upstream('info', provider.info, symbol))
+    except Exception as e:
+        stale = info_cache.get_stale(symbol)
+        if stale is None:
+            raise
+        info, age = stale
+        record_stale_fallback('stale_cache', age, f"Error fetching info for {symbol}, serving cached info {age:.0f}s old: {str(e)}")
+        return info
+
+def fetch_history(symbol, period, interval='1d'):
+    """
+    Return history for `symbol` over `period`, shared across concurrent requests
+    Bars come from the on-disk store; only the missing tail or older history is fetched upstream.
+    Intervals that can be derived from a base series (1m for intraday, 1d for weekly and longer)
+    are resampled locally, so a new interval for a tracked symbol costs no upstream call.
+    If the upstream fails, the newest stale copy held locally is served (see `stale_history`).
+    """
+    try:
+        return cached_history(symbol, period, interval)
+    except Exception as e:
+        stale = stale_history(symbol, period, interval)
+        if stale is None:
+            raise
+        hist, tier, age = stale
+        record_stale_fallback(tier, age, f"Error fetching history for {symbol}, serving {tier} {age:.0f}s old: {str(e)}")
+        return hist
+
+def cached_history(symbol, period, interval):
+    return history_cache.get_or_fetch((symbol, period, interval), lambda: load_history(symbol, period, interval))
+
+def load_history(symbol, period, interval, tail_refresh=None):
+    base = base_for(interval, period, exchange_session(symbol))
+    if base is not None:
+        base_interval, base_period = base
+        resampled_bars.inc(interval)
+        base_bars = slice_period(cached_history(symbol, base_period, base_interval), period)
+        return resample(base_bars, interval, session_for(symbol))
+    # Strict: a failed gap fill raises instead of quietly caching stale bars as fresh
+    return bar_store.get(
+        symbol, period, interval,
+        lambda **kwargs: call_upstream('history', provider.history, symbol, interval=interval, **kwargs),
+        strict=True, tail_refresh=tail_refresh
+    )
+
+def stale_history(symbol, period, interval):
+    """
+    (history, tier, age in seconds) from the newest copy held locally however old, or None
+    Tiers are `stale_cache` (an expired history_cache entry) and `stored_bars` (the bar store);
+    derived intervals are resampled from a stale base series.
+    """
+    candidates = []
+    cached = history_cache.get_stale((symbol, period, interval))
+    if cached is not None:
+        candidates.append((cached[0], 'stale_cache', cached[1]))
+    base = base_for(interval, period, exchange_session(symbol))
+    if base is not None:
+        stale_base = stale_history(symbol, base[1], base[0])
+        if stale_base is not None:
+            base_bars, tier, age = stale_base
+            candidates.append((resample(slice_period(base_bars, period), interval, session_for(symbol)), tier, age))
+    else:
+        stored = bar_store.read_stale(symbol, interval, period)
+        if stored is not None:
+            candidates.append((stored[0], 'stored_bars', stored[1]))
+    return min(candidates, key=lambda candidate: candidate[2]) if candidates else None
+
 @app.route('/stock-details', methods=['GET'])
 def get_stock_details():
     """
@@ -17,146 +329,181 @@ def get_stock_details():
     Query params:
     - symbol: Stock symbol (e.g., AAPL, MSFT)
     - period: Data period (default: 1y)
+    - fields: Optional comma-separated payload keys (e.g., price,dayChangePercent,rsi); only the
+      upstream calls and indicators those fields need are made (see projection.py)
     """
     symbol = request.args.get('symbol', 'AAPL')  # Default to AAPL if no symbol provided
     period = request.args.get('period', '1y')     # Default to 1 year of data
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Watchlist symbols are answered from the precomputed payload while it is current
+    if period == WARM_DETAILS_PERIOD:
+        warm = warmer.get(('details', symbol.upper())) if warmer else None
+        if warm is not None:
+            # Echo the symbol as requested, like the cold path, whatever case the watchlist used
+            warm = dict(warm, symbol=symbol)
+            cached = not_modified(symbol, {k: v for k, v in warm.items() if k != 'timestamp'})
+            if cached is not None:
+                return cached
+            with stage('serialize'):
+                return jsonify(project(warm, fields))
     
     try:
-        # Fetch stock data using yfinance
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        # Fetch stock data from the market data provider (cached per symbol)
+        info = None
+        if needs_info(fields):
+            with stage('info'):
+                info = fetch_info(symbol)
+        
+        # Get historical data for technical indicators, only as far back as the requested fields need
+        needed = history_fields(fields, info)
+        hist = EMPTY_HISTORY
+        if needed:
+            with stage('history'):
+                hist = fetch_history(symbol, period if fields is None else history_period(needed, period))
+        
+        cached = not_modified(symbol, info, hist)
+        if cached is not None:
+            return cached
+        details = build_stock_details(symbol, info or {}, hist, fields=fields)
+        details.update(freshness())
+        with stage('serialize'):
+            return jsonify(details)
+    
+    except Exception as e:
+        # If API fails, return mock data with more comprehensive structure
+        record_mock_fallback('error', f"Error fetching data for {symbol}: {str(e)}")
+        return jsonify(project(generate_enhanced_mock_data(symbol), fields))
+
+def build_stock_details(symbol, info, hist, latest=None, fields=None):
+    """
+    Build the /stock-details payload from a Yahoo `info` dict and daily history frame
+    `latest` may carry indicator values already computed for a whole batch.
+    `fields` limits the payload to those keys and computes only the indicators they need.
+    """
+    if not hist.empty:
+        close = hist['Close'].to_numpy(dtype=float)
+        volume = hist['Volume'].to_numpy(dtype=float)
+        n = len(close)
+        
+        # MA50/MA200, RSI and MACD/Signal at the latest bar
+        if latest is None:
+            names = None if fields is None else indicators_for(fields)
+            with stage('indicators'):
+                if names == ():
+                    latest = {}
+                else:
+                    latest = indicator_cache.get_or_fetch(
+                        (symbol, names, data_version(close)), lambda: latest_indicators(close, names))
         
-        # Get historical data for technical indicators
-        hist = stock.history(period=period)
+        # Calculate average volumes
+        avg_vol_10d = volume[-10:].mean() if n >= 10 else None
+        avg_vol_3m = volume[-90:].mean() if n >= 90 else None
         
-        # Calculate moving averages
-        if not hist.empty:
-            hist['MA50'] = hist['Close'].rolling(window=50).mean()
-            hist['MA200'] = hist['Close'].rolling(window=200).mean()
-            
-            # Calculate RSI (Relative Strength Index)
-            delta = hist['Close'].diff()
-            gain = delta.where(delta > 0, 0).rolling(window=14).mean()
-            loss = -delta.where(delta < 0, 0).rolling(window=14).mean()
-            rs = gain / loss
-            hist['RSI'] = 100 - (100 / (1 + rs))
-            
-            # Calculate MACD (Moving Average Convergence Divergence)
-            hist['EMA12'] = hist['Close'].ewm(span=12, adjust=False).mean()
-            hist['EMA26'] = hist['Close'].ewm(span=26, adjust=False).mean()
-            hist['MACD'] = hist['EMA12'] - hist['EMA26']
-            hist['Signal'] = hist['MACD'].ewm(span=9, adjust=False).mean()
-            
-            # Get recent data points
-            latest = hist.iloc[-1] if len(hist) > 0 else None
-            prev_day = hist.iloc[-2] if len(hist) > 1 else None
-            
-            # Calculate average volumes
-            avg_vol_10d = hist['Volume'].tail(10).mean() if len(hist) >= 10 else None
-            avg_vol_3m = hist['Volume'].tail(90).mean() if len(hist) >= 90 else None
-            
-            # Calculate price change rates
-            week_change = ((hist['Close'].iloc[-1] / hist['Close'].iloc[-5] - 1) * 100) if len(hist) >= 5 else None
-            month_change = ((hist['Close'].iloc[-1] / hist['Close'].iloc[-22] - 1) * 100) if len(hist) >= 22 else None
-            
-            # Get support and resistance levels (simplified approximation)
-            recent_lows = hist['Low'].tail(20).nsmallest(3).mean() if len(hist) >= 20 else None
-            recent_highs = hist['High'].tail(20).nlargest(3).mean() if len(hist) >= 20 else None
+        # Calculate price change rates
+        week_change = ((close[-1] / close[-5] - 1) * 100) if n >= 5 else None
+        month_change = ((close[-1] / close[-22] - 1) * 100) if n >= 22 else None
+        
+        # Get support and resistance levels (simplified approximation)
+        recent_lows = recent_highs = None
+        if n >= 20:
+            lows = hist['Low'].to_numpy(dtype=float)[-20:]
+            highs = hist['High'].to_numpy(dtype=float)[-20:]
+            recent_lows = np.sort(lows[~np.isnan(lows)])[:3].mean()
+            recent_highs = np.sort(highs[~np.isnan(highs)])[-3:].mean()
+    else:
+        latest = None
+        avg_vol_10d = avg_vol_3m = week_change = month_change = None
+        recent_lows = recent_highs = None
+    
+    # Extract current price and technical indicators
+    current_price = info.get('regularMarketPrice', None)
+    previous_close = info.get('regularMarketPreviousClose', None)
+    
+    # Calculate day change
+    day_change = None
+    day_change_percent = None
+    if current_price is not None and previous_close is not None:
+        day_change = current_price - previous_close
+        day_change_percent = (day_change / previous_close) * 100 if previous_close else None
+        
+    # Normalize dividend yield (ensure it's a realistic value)
+    dividend_yield = info.get('dividendYield', None)
+    if dividend_yield is not None:
+        # Yahoo Finance sometimes returns the dividend yield as a decimal (e.g., 0.0235 for 2.35%)
+        # and sometimes as a percentage (e.g., 2.35)
+        if dividend_yield > 1.0:
+            # If greater than 1, assume it's a percentage and ensure it's reasonable
+            dividend_yield = min(dividend_yield, 10.0)  # Cap at 10% to prevent unrealistic values
         else:
-            latest = prev_day = None
-            avg_vol_10d = avg_vol_3m = week_change = month_change = None
-            recent_lows = recent_highs = None
+            # If less than 1, assume it's a decimal and convert to percentage
+            dividend_yield = dividend_yield * 100
+    
+    # Build comprehensive stock data
+    relevant_info = {
+        # Basic info
+        'symbol': symbol,
+        'shortName': info.get('shortName', f'{symbol} Stock'),
+        'longName': info.get('longName', f'{symbol} Stock'),
+        'sector': info.get('sector', 'Unknown'),
+        'industry': info.get('industry', 'Unknown'),
         
-        # Extract current price and technical indicators
-        current_price = info.get('regularMarketPrice', None)
-        previous_close = info.get('regularMarketPreviousClose', None)
+        # Price data
+        'regularMarketPrice': current_price,
+        'regularMarketOpen': info.get('regularMarketOpen', None),
+        'regularMarketPreviousClose': previous_close,
+        'regularMarketDayHigh': info.get('regularMarketDayHigh', None),
+        'regularMarketDayLow': info.get('regularMarketDayLow', None),
+        'dayChange': round(day_change, 2) if day_change is not None else None,
+        'dayChangePercent': round(day_change_percent, 2) if day_change_percent is not None else None,
         
-        # Calculate day change
-        day_change = None
-        day_change_percent = None
-        if current_price is not None and previous_close is not None:
-            day_change = current_price - previous_close
-            day_change_percent = (day_change / previous_close) * 100 if previous_close else None
-            
-        # Normalize dividend yield (ensure it's a realistic value)
-        dividend_yield = info.get('dividendYield', None)
-        if dividend_yield is not None:
-            # Yahoo Finance sometimes returns the dividend yield as a decimal (e.g., 0.0235 for 2.35%)
-            # and sometimes as a percentage (e.g., 2.35)
-            if dividend_yield > 1.0:
-                # If greater than 1, assume it's a percentage and ensure it's reasonable
-                dividend_yield = min(dividend_yield, 10.0)  # Cap at 10% to prevent unrealistic values
-            else:
-                # If less than 1, assume it's a decimal and convert to percentage
-                dividend_yield = dividend_yield * 100
+        # Volume data
+        'regularMarketVolume': info.get('regularMarketVolume', None),
+        'averageDailyVolume10Day': info.get('averageDailyVolume10Day', avg_vol_10d),
+        'averageDailyVolume3Month': info.get('averageDailyVolume3Month', avg_vol_3m),
         
-        # Build comprehensive stock data
-        relevant_info = {
-            # Basic info
-            'symbol': symbol,
-            'shortName': info.get('shortName', f'{symbol} Stock'),
-            'longName': info.get('longName', f'{symbol} Stock'),
-            'sector': info.get('sector', 'Unknown'),
-            'industry': info.get('industry', 'Unknown'),
-            
-            # Price data
-            'regularMarketPrice': current_price,
-            'regularMarketOpen': info.get('regularMarketOpen', None),
-            'regularMarketPreviousClose': previous_close,
-            'regularMarketDayHigh': info.get('regularMarketDayHigh', None),
-            'regularMarketDayLow': info.get('regularMarketDayLow', None),
-            'dayChange': round(day_change, 2) if day_change is not None else None,
-            'dayChangePercent': round(day_change_percent, 2) if day_change_percent is not None else None,
-            
-            # Volume data
-            'regularMarketVolume': info.get('regularMarketVolume', None),
-            'averageDailyVolume10Day': info.get('averageDailyVolume10Day', avg_vol_10d),
-            'averageDailyVolume3Month': info.get('averageDailyVolume3Month', avg_vol_3m),
-            
-            # Technical indicators
-            'fiftyDayAverage': info.get('fiftyDayAverage', None if latest is None else latest.get('MA50')),
-            'twoHundredDayAverage': info.get('twoHundredDayAverage', None if latest is None else latest.get('MA200')),
-            'fiftyTwoWeekHigh': info.get('fiftyTwoWeekHigh', None),
-            'fiftyTwoWeekLow': info.get('fiftyTwoWeekLow', None),
-            'supportLevel': recent_lows,
-            'resistanceLevel': recent_highs,
-            'rsi': None if latest is None else round(latest.get('RSI'), 2),
-            'macd': None if latest is None else round(latest.get('MACD'), 3),
-            'macdSignal': None if latest is None else round(latest.get('Signal'), 3),
-            
-            # Performance metrics
-            'weekChange': None if week_change is None else round(week_change, 2),
-            'monthChange': None if month_change is None else round(month_change, 2),
-            
-            # Fundamental data
-            'marketCap': info.get('marketCap', None),
-            'trailingPE': info.get('trailingPE', None),
-            'forwardPE': info.get('forwardPE', None),
-            'priceToBook': info.get('priceToBook', None),
-            'enterpriseValue': info.get('enterpriseValue', None),
-            'dividendRate': info.get('dividendRate', None),
-            'dividendYield': dividend_yield,
-            'payoutRatio': info.get('payoutRatio', None),
-            'beta': info.get('beta', None),
-            'earningsQuarterlyGrowth': info.get('earningsQuarterlyGrowth', None),
-            'revenueQuarterlyGrowth': info.get('revenueQuarterlyGrowth', None),
-            
-            # Additional data
-            'targetMeanPrice': info.get('targetMeanPrice', None),
-            'analystRating': info.get('recommendationMean', None),
-            'timestamp': time.time(),
-            'dataDate': datetime.now().strftime('%Y-%m-%d'),
-        }
+        # Technical indicators
+        'fiftyDayAverage': info.get('fiftyDayAverage', None if latest is None else latest.get('ma50')),
+        'twoHundredDayAverage': info.get('twoHundredDayAverage', None if latest is None else latest.get('ma200')),
+        'fiftyTwoWeekHigh': info.get('fiftyTwoWeekHigh', None),
+        'fiftyTwoWeekLow': info.get('fiftyTwoWeekLow', None),
+        'supportLevel': recent_lows,
+        'resistanceLevel': recent_highs,
+        'rsi': None if latest is None or latest.get('rsi') is None else round(latest['rsi'], 2),
+        'macd': None if latest is None or latest.get('macd') is None else round(latest['macd'], 3),
+        'macdSignal': None if latest is None or latest.get('signal') is None else round(latest['signal'], 3),
+        
+        # Performance metrics
+        'weekChange': None if week_change is None else round(week_change, 2),
+        'monthChange': None if month_change is None else round(month_change, 2),
         
-        # Filter out None values to reduce response size
-        filtered_info = {k: v for k, v in relevant_info.items() if v is not None}
+        # Fundamental data
+        'marketCap': info.get('marketCap', None),
+        'trailingPE': info.get('trailingPE', None),
+        'forwardPE': info.get('forwardPE', None),
+        'priceToBook': info.get('priceToBook', None),
+        'enterpriseValue': info.get('enterpriseValue', None),
+        'dividendRate': info.get('dividendRate', None),
+        'dividendYield': dividend_yield,
+        'payoutRatio': info.get('payoutRatio', None),
+        'beta': info.get('beta', None),
+        'earningsQuarterlyGrowth': info.get('earningsQuarterlyGrowth', None),
+        'revenueQuarterlyGrowth': info.get('revenueQuarterlyGrowth', None),
         
-        return jsonify(filtered_info)
+        # Additional data
+        'targetMeanPrice': info.get('targetMeanPrice', None),
+        'analystRating': info.get('recommendationMean', None),
+        'timestamp': time.time(),
+        'dataDate': datetime.now().strftime('%Y-%m-%d'),
+    }
     
-    except Exception as e:
-        # If API fails, return mock data with more comprehensive structure
-        print(f"Error fetching data for {symbol}: {str(e)}")
-        return jsonify(generate_enhanced_mock_data(symbol))
+    # Filter out None values to reduce response size
+    filtered_info = {k: v for k, v in relevant_info.items() if v is not None}
+    
+    return project(filtered_info, fields)
 
 def generate_enhanced_mock_data(symbol):
     """Generate enhanced mock data with all required fields for comprehensive analysis"""
@@ -226,8 +573,71 @@ def generate_enhanced_mock_data(symbol):
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Basic health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': time.time()})
+    """
+    Health check endpoint
+    Reports upstream reachability from the outcome of recent upstream calls (no probe is made),
+    the circuit breaker and rate limiter state, and the upstream queue depth. Status is `healthy`,
+    `degraded` (upstream failing or circuit open, responses fall back to stale or mock data) or
+    `overloaded` (upstream queue full).
+    """
+    upstream = upstream_pool.stats()
+    breaker = upstream['breaker']
+    if upstream['lastSuccess'] is None and upstream['lastFailure'] is None:
+        reachable = None  # No upstream calls yet
+    else:
+        reachable = upstream['consecutiveFailures'] < HEALTH_FAILURE_THRESHOLD and breaker['state'] == 'closed'
+    
+    status = 'healthy'
+    if reachable is False:
+        status = 'degraded'
+    if upstream['queued'] >= upstream['maxQueue']:
+        status = 'overloaded'
+    
+    return jsonify({
+        'status': status,
+        'provider': provider.name,
+        'upstream': {
+            'reachable': reachable,
+            'consecutiveFailures': upstream['consecutiveFailures'],
+            'lastSuccess': upstream['lastSuccess'],
+            'lastFailure': upstream['lastFailure'],
+            'lastError': upstream['lastError'],
+            'queued': upstream['queued'],
+            'running': upstream['running'],
+            'concurrency': upstream['concurrency'],
+            'maxQueue': upstream['maxQueue'],
+            'circuit': breaker['state'],
+            'circuitOpenFor': breaker['openFor'],
+            'rateLimit': upstream['rateLimit']['rate'],
+        },
+        'startup': {
+            'seconds': round(startup_phases['total'], 3),
+            'budget': STARTUP_BUDGET,
+            'withinBudget': startup_phases['total'] <= STARTUP_BUDGET,
+            'phases': {name: round(seconds, 3) for name, seconds in startup_phases.items() if name != 'total'},
+            'restoredEntries': restored_entries,
+        },
+        'timestamp': time.time()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, stage and upstream metrics plus cache and pool statistics in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters for the upstream caches, bar store, streams and upstream pool"""
+    return jsonify({
+        'info': info_cache.stats(),
+        'history': history_cache.stats(),
+        'indicators': indicator_cache.stats(),
+        'barStore': bar_store.stats(),
+        'streams': live_hub.stats(),
+        'warmer': warmer.stats() if warmer else None,
+        'upstream': upstream_pool.stats(),
+        'timestamp': time.time()
+    })
 
 @app.route('/historical-data', methods=['GET'])
 def get_historical_data():
@@ -237,90 +647,470 @@ def get_historical_data():
     - symbol: Stock symbol (e.g., AAPL, MSFT)
     - period: Data period (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
     - interval: Data interval (1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo)
+    - format: json (default), columnar, msgpack or arrow
+    - max_points: Optional cap on the number of bars returned (downsampled server-side)
+    - downsample: ohlc (default, merges bars into candles) or lttb (keeps shape-defining bars)
     """
     symbol = request.args.get('symbol', 'AAPL')
     period = request.args.get('period', '1mo')
     interval = request.args.get('interval', '1d')
+    fmt, error_response = requested_format(request.args)
+    if error_response:
+        return error_response
+    max_points, method, error_response = requested_downsampling(request.args)
+    if error_response:
+        return error_response
     
     try:
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period=period, interval=interval)
+        with stage('history'):
+            hist = fetch_history(symbol, period, interval)
+        cached = not_modified(symbol, hist)
+        if cached is not None:
+            return cached
         
-        # Format data for charting
-        data = []
-        for date, row in hist.iterrows():
-            data.append({
-                'date': date.strftime('%Y-%m-%d %H:%M:%S'),
-                'open': round(row['Open'], 2) if not pd.isna(row['Open']) else None,
-                'high': round(row['High'], 2) if not pd.isna(row['High']) else None,
-                'low': round(row['Low'], 2) if not pd.isna(row['Low']) else None,
-                'close': round(row['Close'], 2) if not pd.isna(row['Close']) else None,
-                'volume': int(row['Volume']) if not pd.isna(row['Volume']) else None,
-            })
-        
-        return jsonify({
+        payload = {
             'symbol': symbol,
             'period': period,
-            'interval': interval,
-            'data': data
-        })
+            'interval': interval
+        }
+        if max_points is not None and len(hist) > max_points:
+            with stage('downsample'):
+                payload['downsampled'] = {'method': method, 'sourcePoints': len(hist), 'points': min(len(hist), max_points)}
+                hist = downsample_frame(hist, max_points, method)
+        
+        payload.update(freshness())
+        with stage('serialize'):
+            return data_response(payload, frame_columns(hist), fmt)
     
     except Exception as e:
-        print(f"Error fetching historical data for {symbol}: {str(e)}")
+        record_mock_fallback('error', f"Error fetching historical data for {symbol}: {str(e)}")
         # Return mock historical data
-        return jsonify(generate_mock_historical_data(symbol, period, interval))
+        payload = generate_mock_historical_data(symbol, period, interval)
+        if max_points is not None and len(payload['data']) > max_points:
+            payload = dict(payload)
+            columns = rows_to_columns(payload.pop('data'))
+            payload['downsampled'] = {'method': method, 'sourcePoints': len(columns['close']), 'points': max_points}
+            return data_response(payload, downsample_arrays(columns, max_points, method)[0], fmt)
+        return mock_data_response(payload, fmt)
 
-def generate_mock_historical_data(symbol, period, interval):
-    """Generate mock historical data for charting"""
-    base_price = 150.0
-    volatility = 2.0
-    days = 30  # Default to 30 days of data
-    
-    # Adjust number of data points based on period
-    if period == '1d':
-        days = 1
-    elif period == '5d':
-        days = 5
-    elif period == '1mo':
-        days = 30
-    elif period == '3mo':
-        days = 90
-    elif period == '6mo':
-        days = 180
-    elif period == '1y':
-        days = 365
-    
-    # Generate time series
-    end_date = datetime.now()
-    data = []
-    
-    current_price = base_price
-    for i in range(days):
-        date = end_date - timedelta(days=days-i-1)
-        # Random walk with drift
-        price_change = random.normalvariate(0.0001, 0.01) * current_price
-        open_price = current_price
-        close_price = open_price + price_change
-        high_price = max(open_price, close_price) + random.uniform(0, volatility)
-        low_price = min(open_price, close_price) - random.uniform(0, volatility)
-        volume = random.randint(5000000, 15000000)
+def mock_data_response(payload, fmt):
+    """Render a mock payload (rows under `data`) in the requested format"""
+    if fmt == 'json':
+        return jsonify(payload)
+    payload = dict(payload)
+    return data_response(payload, rows_to_columns(payload.pop('data')), fmt)
+
+def parse_symbols(raw):
+    """Split a comma-separated `symbols` parameter, dropping blanks and duplicates"""
+    symbols = []
+    for part in raw.split(','):
+        symbol = part.strip().upper()
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+def download_histories(symbols, period, interval='1d'):
+    """
+    Fetch history for many symbols with one multi-ticker download
+    Fresh entries in `history_cache` or the bar store are reused; the rest are downloaded together.
+    Returns (histories, errors) keyed by symbol.
+    """
+    histories = {}
+    errors = {}
+    missing = []
+    for symbol in symbols:
+        hist = history_cache.peek((symbol, period, interval))
+        if hist is None:
+            hist = bar_store.read_fresh(symbol, interval, period)
+        if hist is None:
+            missing.append(symbol)
+        else:
+            histories[symbol] = hist
+    
+    if missing:
+        try:
+            # A multi-ticker download fans out over its own threads; keep those under the cap too
+            frame = call_upstream(
+                'download', provider.download, missing, period=period, interval=interval,
+                threads=min(len(missing), upstream_pool.concurrency), timeout=upstream_pool.timeout * 3
+            )
+        except Exception as e:
+            print(f"Error downloading batch history for {missing}: {str(e)}")
+            for symbol in missing:
+                stale = stale_history(symbol, period, interval)
+                if stale is None:
+                    errors[symbol] = str(e)
+                    continue
+                histories[symbol], tier, age = stale
+                record_stale_fallback(tier, age)
+            return histories, errors
+        
+        for symbol in missing:
+            if frame is None or frame.empty or symbol not in frame.columns.get_level_values(0):
+                errors[symbol] = 'No price data returned'
+                continue
+            hist = frame[symbol].dropna(how='all')
+            if hist.empty:
+                errors[symbol] = 'No price data returned'
+                continue
+            if hist.index.tz is None:
+                # Multi-ticker downloads may come back as exchange wall-clock times without a timezone;
+                # stored naively they would land at UTC midnight, beside the same bars from `history`
+                hist = hist.tz_localize(session_for(symbol).tz)
+            start = period_start(period)
+            bar_store.merge(symbol, interval, hist, covered_start=0 if start is None else start.value)
+            history_cache.put((symbol, period, interval), hist)
+            histories[symbol] = hist
+    
+    return histories, errors
+
+def fetch_infos(symbols):
+    """Fetch `info` for many symbols on the bounded batch pool; returns (infos, errors)"""
+    infos = {}
+    errors = {}
+    # Carry the request context into the pool so upstream calls are counted against this endpoint;
+    # each task needs its own copy, since one context cannot be pushed on two threads at once
+    def task():
+        return copy_current_request_context(fetch_info) if has_request_context() else fetch_info
+    futures = {symbol: batch_executor.submit(task(), symbol) for symbol in symbols}
+    for symbol, future in futures.items():
+        try:
+            infos[symbol] = future.result()
+        except Exception as e:
+            print(f"Error fetching info for {symbol}: {str(e)}")
+            errors[symbol] = str(e)
+    return infos, errors
+
+def batch_symbols_or_error():
+    """Parse and validate the `symbols` parameter of a batch request"""
+    symbols = parse_symbols(request.args.get('symbols', ''))
+    if not symbols:
+        return None, (jsonify({'error': 'symbols parameter is required'}), 400)
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return None, (jsonify({'error': f'At most {MAX_BATCH_SYMBOLS} symbols per request'}), 400)
+    return symbols, None
+
+@app.route('/stock-details/batch', methods=['GET'])
+def get_stock_details_batch():
+    """
+    Fetches stock details for many symbols in one request
+    Query params:
+    - symbols: Comma-separated stock symbols (e.g., AAPL,MSFT,RELIANCE.NS)
+    - period: Data period (default: 1y)
+    Symbols that fail are returned with an `error` field instead of mock data.
+    """
+    symbols, error_response = batch_symbols_or_error()
+    if error_response:
+        return error_response
+    period = request.args.get('period', '1y')
+    
+    with stage('history'):
+        histories, errors = download_histories(symbols, period)
+    with stage('info'):
+        infos, info_errors = fetch_infos([s for s in symbols if s not in errors])
+    errors.update(info_errors)
+    
+    # Indicators for every symbol in one pass over a (symbols x bars) matrix
+    ready = [s for s in symbols if s not in errors]
+    rows = {symbol: row for row, symbol in enumerate(ready)}
+    with stage('indicators'):
+        batch_latest = latest_indicators(stack_closes([histories[s]['Close'].to_numpy(dtype=float) for s in ready]))
+    
+    results = {}
+    for symbol in symbols:
+        if symbol in errors:
+            results[symbol] = {'symbol': symbol, 'error': errors[symbol]}
+            continue
+        try:
+            row = rows[symbol]
+            latest = {name: (None if np.isnan(values[row]) else float(values[row])) for name, values in batch_latest.items()}
+            results[symbol] = build_stock_details(symbol, infos[symbol], histories[symbol], latest)
+        except Exception as e:
+            print(f"Error building stock details for {symbol}: {str(e)}")
+            results[symbol] = {'symbol': symbol, 'error': str(e)}
+    
+    with stage('serialize'):
+        return jsonify({
+            'period': period,
+            'results': results,
+            'errorCount': sum(1 for item in results.values() if 'error' in item),
+            **freshness(),
+            'timestamp': time.time()
+        })
+
+def fetch_quotes(symbols):
+    """
+    Latest price, previous close, beta, name and sector for many symbols
+    Prices come from the cached `info`; symbols whose `info` has no price fall back to the last
+    two daily closes from the batch history path. Returns {symbol: quote}, with an `error` entry
+    for symbols that could not be priced.
+    """
+    infos, errors = fetch_infos(symbols)
+    quotes = {}
+    for symbol in symbols:
+        info = infos.get(symbol) or {}
+        quotes[symbol] = {
+            'price': info.get('regularMarketPrice'),
+            'previousClose': info.get('regularMarketPreviousClose'),
+            'beta': info.get('beta'),
+            'name': info.get('shortName'),
+            'sector': info.get('sector'),
+        }
+    
+    unpriced = [s for s in symbols if quotes[s]['price'] is None]
+    if unpriced:
+        histories, history_errors = download_histories(unpriced, '5d')
+        for symbol in unpriced:
+            hist = histories.get(symbol)
+            if hist is None or hist.empty:
+                quotes[symbol]['error'] = history_errors.get(symbol) or errors.get(symbol) or 'No price available'
+                continue
+            close = hist['Close'].dropna().to_numpy(dtype=float)
+            if len(close) == 0:
+                quotes[symbol]['error'] = 'No price available'
+                continue
+            quotes[symbol]['price'] = float(close[-1])
+            if quotes[symbol]['previousClose'] is None and len(close) > 1:
+                quotes[symbol]['previousClose'] = float(close[-2])
+    return quotes
+
+@app.route('/portfolio/valuate', methods=['POST'])
+def valuate_portfolio():
+    """
+    Values a list of holdings in one request
+    JSON body:
+    - holdings: [{symbol, quantity, costBasis}, ...] (`shares`/`cost_basis` also accepted);
+      costBasis is the total cost of the position and is optional
+    Returns per-position market value, P&L, day change and allocation, portfolio totals with a
+    value-weighted beta, and sector weights. Positions that cannot be priced carry an `error` field.
+    """
+    try:
+        holdings = parse_holdings(request.get_json(silent=True))
+    except PortfolioError as e:
+        return jsonify({'error': str(e)}), 400
+    symbols = list(dict.fromkeys(symbol for symbol, _, _ in holdings))
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_BATCH_SYMBOLS} symbols per request'}), 400
+    
+    with stage('info'):
+        quotes = fetch_quotes(symbols)
+    with stage('valuate'):
+        positions, totals, sectors = valuate(holdings, quotes)
+    
+    with stage('serialize'):
+        return jsonify({
+            'totals': totals,
+            'positions': positions,
+            'sectors': sectors,
+            'errorCount': sum(1 for item in positions if 'error' in item),
+            **freshness(),
+            'timestamp': time.time()
+        })
+
+def universe_symbols_or_error(limit):
+    """Symbols from the `universe` (file in UNIVERSE_DIR) or `symbols` parameter, capped at `limit`"""
+    universe = request.args.get('universe')
+    try:
+        symbols = load_universe(universe, UNIVERSE_DIR) if universe else parse_symbols(request.args.get('symbols', ''))
+    except ScreenerError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    if not symbols:
+        return None, (jsonify({'error': 'symbols or universe parameter is required'}), 400)
+    if len(symbols) > limit:
+        return None, (jsonify({'error': f'At most {limit} symbols per request'}), 400)
+    return symbols, None
+
+@app.route('/screener', methods=['GET'])
+def get_screener():
+    """
+    Screens a symbol universe with a filter expression and returns ranked matches
+    Query params:
+    - filter: Expression over screener fields (e.g., rsi < 30 and within(price, supportLevel, 2))
+    - symbols: Comma-separated stock symbols, or
+    - universe: Name of a universe file in UNIVERSE_DIR (e.g., nifty500)
+    - sort: Field or expression to rank matches by (default: rsi)
+    - order: asc (default) or desc
+    - limit: Maximum number of matches (default: 50)
+    - period: History used for the indicators (default: 1y)
+    """
+    source = request.args.get('filter', '').strip()
+    if not source:
+        return jsonify({'error': 'filter parameter is required'}), 400
+    period = request.args.get('period', '1y')
+    order = request.args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'order must be asc or desc'}), 400
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    try:
+        expression = Expression(source)
+        sort = Expression(request.args.get('sort', 'rsi'))
+    except ScreenerError as e:
+        return jsonify({'error': str(e)}), 400
+    universe = request.args.get('universe')
+    symbols, error_response = universe_symbols_or_error(MAX_SCREENER_SYMBOLS)
+    if error_response:
+        return error_response
+    
+    with stage('history'):
+        histories, errors = download_histories(symbols, period)
+    with stage('indicators'):
+        matches, scanned = screen(symbols, histories, expression, sort, descending=order == 'desc', limit=max(limit, 0))
+    
+    with stage('serialize'):
+        return jsonify({
+            'filter': source,
+            'universe': universe,
+            'period': period,
+            'sort': sort.source,
+            'order': order,
+            'scanned': scanned,
+            'matchCount': len(matches),
+            'matches': matches,
+            'errors': errors,
+            'errorCount': len(errors),
+            **freshness(),
+            'timestamp': time.time()
+        })
+
+@app.route('/backtest', methods=['GET'])
+def get_backtest():
+    """
+    Backtests an indicator rule over one or many symbols
+    Query params:
+    - symbols: Comma-separated stock symbols, or
+    - universe: Name of a universe file in UNIVERSE_DIR
+    - strategy: ma_cross (default), rsi or macd
+    - period: History to test over (default: 10y)
+    - fast, slow: Moving averages for ma_cross (default: 50, 200)
+    - lower, upper: RSI entry and exit levels for rsi (default: 30, 70)
+    - fee_bps: Cost per position change in basis points (default: 0)
+    - trades: Include each symbol's trade list (default: true)
+    Symbols that fail are returned with an `error` field.
+    """
+    # Deferred: the backtest engine pulls in multiprocessing, which most workers never need
+    from backtest import BacktestError, run_backtest, strategy_params, summary_stats
+    
+    period = request.args.get('period', '10y')
+    strategy = request.args.get('strategy', 'ma_cross')
+    include_trades = request.args.get('trades', 'true').lower() != 'false'
+    try:
+        params = strategy_params(strategy, request.args)
+    except BacktestError as e:
+        return jsonify({'error': str(e)}), 400
+    symbols, error_response = universe_symbols_or_error(MAX_BACKTEST_SYMBOLS)
+    if error_response:
+        return error_response
+    
+    with stage('history'):
+        histories, errors = download_histories(symbols, period)
+    
+    series = {}
+    for symbol in symbols:
+        hist = histories.get(symbol)
+        if symbol in errors:
+            continue
+        if hist is None or hist.empty:
+            errors[symbol] = 'No price data returned'
+            continue
+        # Multi-ticker downloads share one timezone; date each bar in its own exchange's time
+        index = hist.index
+        wall = index.tz_convert(session_for(symbol).tz).tz_localize(None) if index.tz is not None else index
+        series[symbol] = (wall.to_numpy().astype('datetime64[D]').astype(np.int64), hist['Close'].to_numpy(dtype=float))
+    
+    with stage('backtest'):
+        outcomes, days, portfolio = run_backtest(series, strategy, params, workers=BACKTEST_WORKERS)
+    
+    with stage('serialize'):
+        results = {}
+        for symbol in symbols:
+            if symbol in errors:
+                results[symbol] = {'symbol': symbol, 'error': errors[symbol]}
+                continue
+            returns, held, trades = outcomes[symbol]
+            item = {'symbol': symbol, 'stats': summary_stats(returns, held, trades)}
+            if include_trades:
+                symbol_days, closes = series[symbol]
+                dates = np.datetime_as_string(symbol_days.astype('datetime64[D]'))
+                item['trades'] = [{
+                    'entryDate': str(dates[entry]),
+                    'entryPrice': round(float(closes[entry]), 2),
+                    'exitDate': None if exit_ is None else str(dates[exit_]),
+                    'exitPrice': None if exit_ is None else round(float(closes[exit_]), 2),
+                    'return': round(trade_return * 100, 2),
+                } for entry, exit_, trade_return in trades]
+            results[symbol] = item
         
-        data.append({
-            'date': date.strftime('%Y-%m-%d %H:%M:%S'),
-            'open': round(open_price, 2),
-            'high': round(high_price, 2),
-            'low': round(low_price, 2),
-            'close': round(close_price, 2),
-            'volume': volume,
+        equity = np.cumprod(1 + portfolio)
+        return jsonify({
+            'strategy': strategy,
+            'params': params,
+            'period': period,
+            'portfolio': {
+                'stats': summary_stats(portfolio),
+                'equityCurve': [
+                    {'date': date, 'equity': value}
+                    for date, value in zip(np.datetime_as_string(days.astype('datetime64[D]')).tolist(), np.round(equity, 4).tolist())
+                ],
+            },
+            'results': results,
+            'errorCount': len(errors),
+            **freshness(),
+            'timestamp': time.time()
         })
+
+@app.route('/historical-data/batch', methods=['GET'])
+def get_historical_data_batch():
+    """
+    Fetches historical data for many symbols in one request
+    Query params:
+    - symbols: Comma-separated stock symbols (e.g., AAPL,MSFT,RELIANCE.NS)
+    - period: Data period (default: 1mo)
+    - interval: Data interval (default: 1d)
+    Symbols that fail are returned with an `error` field instead of mock data.
+    """
+    symbols, error_response = batch_symbols_or_error()
+    if error_response:
+        return error_response
+    period = request.args.get('period', '1mo')
+    interval = request.args.get('interval', '1d')
+    
+    with stage('history'):
+        histories, errors = download_histories(symbols, period, interval)
+    
+    with stage('serialize'):
+        results = {}
+        for symbol in symbols:
+            if symbol in errors:
+                results[symbol] = {'symbol': symbol, 'error': errors[symbol]}
+            else:
+                results[symbol] = {'symbol': symbol, 'data': columns_to_records(frame_columns(histories[symbol]))}
         
-        current_price = close_price
+        return jsonify({
+            'period': period,
+            'interval': interval,
+            'results': results,
+            'errorCount': len(errors),
+            **freshness(),
+            'timestamp': time.time()
+        })
+
+def generate_mock_historical_data(symbol, period, interval):
+    """Generate mock historical data for charting, reproducible per symbol (see `synthetic`)"""
+    try:
+        hist = generate_period(symbol, period, interval, seed=MOCK_DATA_SEED)
+    except ValueError:
+        # Unsupported period: fall back to a month of data
+        hist = generate_period(symbol, '1mo', interval, seed=MOCK_DATA_SEED)
     
     return {
         'symbol': symbol,
         'period': period,
         'interval': interval,
-        'data': data,
+        'data': columns_to_records(frame_columns(hist)),
         'isMockData': True
     }
 
@@ -331,11 +1121,23 @@ def get_chart_with_chat_data():
     Query params:
     - symbol: Stock symbol (e.g., AAPL, MSFT, BANKNIFTY, NIFTY)
     - date: Optional date in YYYY-MM-DD format (defaults to today)
+    - start, end: Optional YYYY-MM-DD range (inclusive, exchange dates) spanning many sessions,
+      instead of `date`; `end` defaults to today. Up to CHART_MAX_RANGE_DAYS days.
     - interval: Data interval (default: 30m for 30-minute intervals)
+    - format: json (default), columnar, msgpack or arrow
+    Past sessions are served from intraday bars accumulated in the bar store, so they do not
+    depend on how far back the upstream serves intraday data.
     """
     symbol = request.args.get('symbol', 'AAPL')
     date_str = request.args.get('date')
     interval = request.args.get('interval', '30m')
+    fmt, error_response = requested_format(request.args)
+    if error_response:
+        return error_response
+    if request.args.get('start') or request.args.get('end'):
+        if not is_intraday(interval):
+            return jsonify({'error': f"interval must be intraday (e.g., 1m, 5m, 30m, 1h), not '{interval}'"}), 400
+        return chart_range_response(symbol, interval, fmt)
     
     # If date is provided, use it, otherwise use today
     if date_str:
@@ -346,136 +1148,370 @@ def get_chart_with_chat_data():
     else:
         target_date = datetime.now()
     
-    # For intraday data, we need to use a recent date (within last 7 days for valid Yahoo data)
-    # If the requested date is too old, we'll generate mock data
-    use_mock = (datetime.now() - target_date).days > 7
+    if target_date.date() != datetime.now().date() and is_intraday(interval):
+        return chart_session_response(symbol, interval, target_date, fmt)
+    
+    warm = warmer.get(('chart', symbol.upper(), interval)) if warmer else None
+    if warm is not None:
+        payload, columns = warm
+        cached = not_modified(symbol, columns)
+        if cached is not None:
+            return cached
+        with stage('serialize'):
+            return data_response(dict(payload, symbol=symbol, date=target_date.strftime('%Y-%m-%d')), columns, fmt)
     
     try:
-        if use_mock:
-            # For old dates or special indexes like BANKNIFTY, NIFTY, generate mock data
-            return jsonify(generate_intraday_mock_data(symbol, target_date, interval))
-        
-        # Get stock data from Yahoo Finance
-        stock = yf.Ticker(symbol)
-        
-        # For intraday data, use period of 1d and the specified interval
-        # Yahoo only provides intraday data for the last 7 days
-        hist = stock.history(period="1d", interval=interval)
+        # For intraday data, use period of 1d and the specified interval (resampled from 1m bars)
+        with stage('history'):
+            hist = fetch_history(symbol, '1d', interval)
         
         # If no data received, generate mock data
         if hist.empty:
-            return jsonify(generate_intraday_mock_data(symbol, target_date, interval))
+            record_mock_fallback('no_data')
+            return mock_data_response(generate_intraday_mock_data(symbol, target_date, interval), fmt)
+        cached = not_modified(symbol, hist)
+        if cached is not None:
+            return cached
         
         # Format data for charting with time-aware intervals
-        data = []
-        for date, row in hist.iterrows():
-            data.append({
-                'time': date.strftime('%H:%M'),
-                'timestamp': int(date.timestamp() * 1000),
-                'open': round(row['Open'], 2) if not pd.isna(row['Open']) else None,
-                'high': round(row['High'], 2) if not pd.isna(row['High']) else None,
-                'low': round(row['Low'], 2) if not pd.isna(row['Low']) else None,
-                'close': round(row['Close'], 2) if not pd.isna(row['Close']) else None,
-                'volume': int(row['Volume']) if not pd.isna(row['Volume']) else None,
-                'gain': row['Close'] > row['Open'] if not pd.isna(row['Close']) and not pd.isna(row['Open']) else None,
-            })
+        with stage('columns'):
+            columns = frame_columns(hist, intraday=True)
         
         # Calculate insights
-        insights = calculate_insights(data)
+        with stage('insights'):
+            insights = calculate_column_insights(columns)
         
-        return jsonify({
+        with stage('serialize'):
+            return data_response({
+                'symbol': symbol,
+                'date': target_date.strftime('%Y-%m-%d'),
+                'interval': interval,
+                'insights': insights,
+                'isMockData': False,
+                **freshness()
+            }, columns, fmt)
+    
+    except Exception as e:
+        record_mock_fallback('error', f"Error fetching chart-with-chat data for {symbol}: {str(e)}")
+        # Return mock data
+        return mock_data_response(generate_intraday_mock_data(symbol, target_date, interval), fmt)
+
+def chart_session_response(symbol, interval, target_date, fmt):
+    """/chart-with-chat for one past session (weekends show the previous one), from stored bars"""
+    session = session_for(symbol)
+    day = pd.offsets.BDay().rollback(pd.Timestamp(target_date.date()))
+    try:
+        with stage('history'):
+            hist = intraday_range(symbol, interval, day.tz_localize(session.tz), (day + pd.Timedelta(days=1)).tz_localize(session.tz))
+    except Exception as e:
+        record_mock_fallback('error', f"Error reading stored intraday bars for {symbol}: {str(e)}")
+        hist = EMPTY_HISTORY
+    if hist.empty:
+        # Nothing stored for that session and it is out of the upstream's reach
+        record_mock_fallback('old_date')
+        return mock_data_response(generate_intraday_mock_data(symbol, target_date, interval), fmt)
+    cached = not_modified(symbol, hist)
+    if cached is not None:
+        return cached
+    
+    with stage('columns'):
+        columns = frame_columns(hist, intraday=True)
+    with stage('insights'):
+        insights = calculate_column_insights(columns)
+    with stage('serialize'):
+        return data_response({
             'symbol': symbol,
             'date': target_date.strftime('%Y-%m-%d'),
             'interval': interval,
-            'data': data,
             'insights': insights,
-            'isMockData': False
-        })
+            'isMockData': False,
+            **freshness()
+        }, columns, fmt)
+
+def chart_range_response(symbol, interval, fmt):
+    """/chart-with-chat over a start/end range: bars of every session with per-session and overall insights"""
+    session = session_for(symbol)
+    try:
+        first = pd.Timestamp(datetime.strptime(request.args.get('start') or request.args['end'], '%Y-%m-%d'))
+        last = pd.Timestamp(datetime.strptime(request.args['end'], '%Y-%m-%d')) if request.args.get('end') else pd.Timestamp(datetime.now().date())
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+    if last < first:
+        return jsonify({'error': 'end must not be before start'}), 400
+    if (last - first).days >= CHART_MAX_RANGE_DAYS:
+        return jsonify({'error': f'At most {CHART_MAX_RANGE_DAYS} days per request'}), 400
+    start = first.tz_localize(session.tz)
+    end = (last + pd.Timedelta(days=1)).tz_localize(session.tz)
     
+    is_mock = False
+    try:
+        with stage('history'):
+            hist = intraday_range(symbol, interval, start, end)
     except Exception as e:
-        print(f"Error fetching chart-with-chat data for {symbol}: {str(e)}")
-        # Return mock data
-        return jsonify(generate_intraday_mock_data(symbol, target_date, interval))
-
-def generate_intraday_mock_data(symbol, date, interval='30m'):
-    """Generate mock intraday data for chart-with-chat"""
-    # Set base price based on the symbol
-    if symbol in ['BANKNIFTY', 'NIFTY.NS', 'BANKNIFTY.NS']:
-        base_price = 52000 if 'BANK' in symbol else 25000
-        volatility = 150 if 'BANK' in symbol else 70
+        print(f"Error reading stored intraday bars for {symbol}: {str(e)}")
+        hist = EMPTY_HISTORY
+    if hist.empty:
+        record_mock_fallback('no_data')
+        hist = generate_bars(symbol, interval, start=start, end=end, seed=MOCK_DATA_SEED)
+        is_mock = True
     else:
-        base_price = 150.0
-        volatility = 2.0
+        cached = not_modified(symbol, hist)
+        if cached is not None:
+            return cached
     
-    # Number of intervals for a trading day (approximately 6.5 hours)
-    intervals = 13  # 30-minute intervals
-    
-    # Start time for the trading day (9:15 AM)
-    start_time = datetime.combine(date.date(), datetime.strptime('09:15', '%H:%M').time())
+    with stage('columns'):
+        columns = frame_columns(hist, intraday=True)
+        index = hist.index
+        days = np.datetime_as_string((index.tz_localize(None) if index.tz is not None else index).to_numpy().astype('datetime64[D]'))
+        columns = {'date': days.astype(object), **columns}
+    with stage('insights'):
+        insights = calculate_column_insights(columns)
+        sessions = session_insights(columns)
+    with stage('serialize'):
+        return data_response({
+            'symbol': symbol,
+            'start': first.strftime('%Y-%m-%d'),
+            'end': last.strftime('%Y-%m-%d'),
+            'interval': interval,
+            'insights': insights,
+            'sessions': sessions,
+            'isMockData': is_mock,
+            **freshness()
+        }, columns, fmt)
+
+def intraday_range(symbol, interval, start, end):
+    """
+    `interval` bars with start <= time < end (exchange-local timestamps), sliced from the bar store
+    Sessions still within the upstream's intraday window are brought up to date first; older
+    sessions are answered only from what has been stored. Where stored 1m bars exist for a session
+    the bars are resampled from them, otherwise stored bars of the interval itself are used.
+    """
+    now = pd.Timestamp.now(tz='UTC')
+    derivable = base_for(interval, INTRADAY_BASE_PERIOD, exchange_session(symbol), now) is not None
+    try:
+        if end > period_start(INTRADAY_BASE_PERIOD, now):
+            # The recent sessions come through the (cached) 1m base, like /chart-with-chat for today
+            fetch_history(symbol, INTRADAY_BASE_PERIOD, INTRADAY_BASE if derivable else interval)
+        meta = bar_store.meta(symbol, interval) or {}
+        covered = meta.get('coveredStart')
+        if interval != INTRADAY_BASE and start > now - pd.Timedelta(days=INTRADAY_UPSTREAM_DAYS) and (covered is None or covered > start.value):
+            fetch_history(symbol, f'{INTRADAY_UPSTREAM_DAYS}d', interval)
+    except Exception as e:
+        print(f"Error refreshing intraday bars for {symbol}, using stored bars: {str(e)}")
     
-    data = []
-    current_price = base_price
+    frames = []
+    derived_days = np.empty(0, dtype='datetime64[D]')
+    if derivable:
+        base = bar_store.read(symbol, INTRADAY_BASE, start=start, end=end)
+        if base is not None and not base.empty:
+            base = base.tz_convert(start.tz)
+            frames.append(resample(base, interval, session_for(symbol)))
+            derived_days = np.unique(base.index.tz_localize(None).to_numpy().astype('datetime64[D]'))
+    native = bar_store.read(symbol, interval, start=start, end=end)
+    if native is not None and not native.empty:
+        native = native.tz_convert(start.tz)
+        native_days = native.index.tz_localize(None).to_numpy().astype('datetime64[D]')
+        frames.append(native[~np.isin(native_days, derived_days)])
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return EMPTY_HISTORY
+    return pd.concat(frames).sort_index() if len(frames) > 1 else frames[0]
+
+def session_insights(columns):
+    """calculate_column_insights for each session (run of equal `date` values) in a range"""
+    days = columns['date']
+    if len(days) == 0:
+        return []
+    starts = np.flatnonzero(np.concatenate([[True], days[1:] != days[:-1]]))
+    ends = np.concatenate([starts[1:], [len(days)]])
+    return [{
+        'date': days[lo],
+        'bars': int(hi - lo),
+        'insights': calculate_column_insights({name: values[lo:hi] for name, values in columns.items()}),
+    } for lo, hi in zip(starts, ends)]
+
+def fetch_live_rows(symbol, interval):
+    """
+    Current session bars as /chart-with-chat rows, checked upstream on every poll unless a request
+    checked them within the last half poll interval. Refreshes the same `history_cache` entries (and bar store series) /chart-with-chat reads, so
+    requests get what pollers fetched; falls back to stale bars when the upstream fails.
+    """
+    try:
+        hist = refresh_history(symbol, '1d', interval, tail_refresh=live_hub.poll_interval / 2)
+    except Exception as e:
+        stale = stale_history(symbol, '1d', interval)
+        if stale is None:
+            raise
+        hist, tier, age = stale
+        record_stale_fallback(tier, age, f"Error polling live bars for {symbol}, serving {tier} {age:.0f}s old: {str(e)}")
+    return columns_to_records(frame_columns(hist, intraday=True))
+
+# One shared upstream poller per (symbol, interval), fanned out to every stream subscriber
+live_hub = LiveBarHub(
+    fetch_live_rows,
+    lambda rows: calculate_insights(rows),
+    poll_interval=float(os.environ.get('STREAM_POLL_INTERVAL', 15)),
+)
+STREAM_KEEPALIVE = float(os.environ.get('STREAM_KEEPALIVE', 15))
+
+def _cache_stat_samples(key):
+    for cache in (info_cache, history_cache, indicator_cache):
+        yield {'cache': cache.name}, cache.stats()[key]
+
+def _upstream_stat_samples(key):
+    yield {}, upstream_pool.stats()[key]
+
+# Counters kept by the caches, bar store, upstream pool and stream hub, read at scrape time
+for _key, _name, _help in (
+    ('hits', 'hits', 'Fresh cache hits'),
+    ('staleHits', 'stale_hits', 'Stale entries served while refreshing'),
+    ('misses', 'misses', 'Cache misses that fetched upstream'),
+    ('coalesced', 'coalesced', 'Lookups that joined an in-flight fetch'),
+    ('evictions', 'evictions', 'LRU evictions'),
+    ('refreshes', 'refreshes', 'Background refreshes'),
+    ('errors', 'errors', 'Failed fetches'),
+    ('fallbacks', 'fallbacks', 'Expired entries looked up as a fallback after an upstream failure'),
+    ('sharedHits', 'shared_hits', 'Misses answered from the cross-process shared tier'),
+    ('sharedWaits', 'shared_waits', 'Misses answered by another process\'s fetch after waiting for its lock'),
+    ('sharedErrors', 'shared_errors', 'Failed shared tier operations'),
+):
+    metrics.collector(f'stock_api_cache_{_name}_total', _help, lambda key=_key: _cache_stat_samples(key), kind='counter')
+metrics.collector('stock_api_cache_entries', 'Entries held per cache', lambda: _cache_stat_samples('size'))
+for _key, _name, _help, _kind in (
+    ('queued', 'queued', 'Upstream calls waiting for a pool thread', 'gauge'),
+    ('running', 'running', 'Upstream calls in flight', 'gauge'),
+    ('timeouts', 'timeouts_total', 'Upstream calls that timed out', 'counter'),
+    ('cancelled', 'cancelled_total', 'Timed-out upstream calls cancelled before starting', 'counter'),
+    ('rejected', 'rejected_total', 'Upstream calls rejected because the queue was full', 'counter'),
+    ('consecutiveFailures', 'consecutive_failures', 'Upstream failures since the last success', 'gauge'),
+):
+    metrics.collector(f'stock_api_upstream_pool_{_name}', _help, lambda key=_key: _upstream_stat_samples(key), kind=_kind)
+_BREAKER_STATES = {'closed': 0, 'half-open': 1, 'open': 2}
+metrics.collector('stock_api_upstream_circuit_state', 'Upstream circuit breaker state (0 closed, 1 half-open, 2 open)',
+                  lambda: [({}, _BREAKER_STATES[upstream_pool.breaker.stats()['state']])])
+metrics.collector('stock_api_upstream_circuit_opens_total', 'Times the upstream circuit opened',
+                  lambda: [({}, upstream_pool.breaker.stats()['opens'])], kind='counter')
+metrics.collector('stock_api_upstream_short_circuited_total', 'Upstream calls failed fast while the circuit was open',
+                  lambda: [({}, upstream_pool.breaker.stats()['shortCircuited'])], kind='counter')
+metrics.collector('stock_api_upstream_rate_limit', 'Current upstream rate limit (calls per second)',
+                  lambda: [({}, upstream_pool.limiter.stats()['rate'])])
+metrics.collector('stock_api_upstream_throttled_total', 'Upstream throttling responses that lowered the rate limit',
+                  lambda: [({}, upstream_pool.limiter.stats()['throttled'])], kind='counter')
+metrics.collector('stock_api_bar_store_stale_reads_total', 'Stored bars served as a fallback after an upstream failure',
+                  lambda: [({}, bar_store.stats()['staleReads'])], kind='counter')
+metrics.collector('stock_api_bar_store_disk_hits_total', 'Bar store reads answered from disk',
+                  lambda: [({}, bar_store.stats()['diskHits'])], kind='counter')
+metrics.collector('stock_api_bar_store_upstream_fetches_total', 'Bar store gap fills fetched upstream',
+                  lambda: [({}, bar_store.stats()['upstreamFetches'])], kind='counter')
+metrics.collector('stock_api_bar_store_readjustments_total', 'Stored series rescaled after a split or dividend adjustment',
+                  lambda: [({}, bar_store.stats()['readjustments'])], kind='counter')
+metrics.collector('stock_api_stream_subscribers', 'Connected live bar stream subscribers',
+                  lambda: [({}, live_hub.stats()['subscribers'])])
+
+def refresh_history(symbol, period, interval, tail_refresh=None):
+    """
+    Reload history now, base series first, even if the cached copy is still fresh
+    `tail_refresh` (seconds) also bounds how old the bar store's last upstream check may be.
+    """
+    base = base_for(interval, period, exchange_session(symbol))
+    if base is not None:
+        refresh_history(symbol, base[1], base[0], tail_refresh)
+    return history_cache.refresh((symbol, period, interval), lambda: load_history(symbol, period, interval, tail_refresh))
+
+def warm_stock_details(symbol):
+    """Rebuild the /stock-details payload of a watchlist symbol from freshly fetched data"""
+    info = info_cache.refresh(symbol, lambda: call_upstream('info', provider.info, symbol))
+    hist = refresh_history(symbol, WARM_DETAILS_PERIOD, '1d')
+    return build_stock_details(symbol, info, hist)
+
+def warm_chart(symbol, interval):
+    """Rebuild the /chart-with-chat payload (payload, columns) of a watchlist symbol"""
+    hist = refresh_history(symbol, '1d', interval)
+    if hist.empty:
+        raise ValueError('No intraday bars returned')
+    columns = frame_columns(hist, intraday=True)
+    return {
+        'symbol': symbol,
+        'interval': interval,
+        'insights': calculate_column_insights(columns),
+        'isMockData': False
+    }, columns
+
+def watchlist_symbols():
+    """WARM_SYMBOLS (comma-separated) plus the symbols of the WARM_UNIVERSE file"""
+    symbols = parse_symbols(os.environ.get('WARM_SYMBOLS', ''))
+    if os.environ.get('WARM_UNIVERSE'):
+        symbols += [s for s in load_universe(os.environ['WARM_UNIVERSE'], UNIVERSE_DIR) if s not in symbols]
+    return symbols
+
+# Watchlist symbols kept precomputed in the background (disabled when the watchlist is empty)
+WARM_DETAILS_PERIOD = '1y'
+warmer = None
+if watchlist_symbols():
+    warmer = WatchlistWarmer(
+        watchlist_symbols(), warm_stock_details, warm_chart,
+        chart_intervals=[i.strip() for i in os.environ.get('WARM_CHART_INTERVALS', '30m').split(',') if i.strip()],
+        intraday_refresh=float(os.environ.get('WARM_INTRADAY_REFRESH', 60)),
+        details_refresh=float(os.environ.get('WARM_DETAILS_REFRESH', 300)),
+        close_delay=float(os.environ.get('WARM_CLOSE_DELAY', 900)),
+        workers=int(os.environ.get('WARM_WORKERS', 4)),
+    )
+    metrics.collector('stock_api_warm_hits_total', 'Requests answered from a precomputed watchlist payload',
+                      lambda: [({}, warmer.stats()['hits'])], kind='counter')
+    metrics.collector('stock_api_warm_builds_total', 'Watchlist payload rebuilds',
+                      lambda: [({}, warmer.stats()['builds'])], kind='counter')
+    metrics.collector('stock_api_warm_errors_total', 'Failed watchlist payload rebuilds',
+                      lambda: [({}, warmer.stats()['errors'])], kind='counter')
+    metrics.collector('stock_api_warm_ready', 'Watchlist payloads ready to serve',
+                      lambda: [({}, warmer.stats()['ready'])])
+
+@app.route('/chart-with-chat/stream', methods=['GET'])
+def stream_chart_with_chat():
+    """
+    Streams live intraday bars for the chart-with-chat route as Server-Sent Events
+    Query params:
+    - symbol: Stock symbol (e.g., AAPL, MSFT, BANKNIFTY, NIFTY)
+    - interval: Data interval (default: 30m)
+    The first `snapshot` event carries the whole session; later `bars` events carry only
+    new or updated bars and the insight fields that changed.
+    """
+    symbol = request.args.get('symbol', 'AAPL')
+    interval = request.args.get('interval', '30m')
+    subscription = live_hub.subscribe(symbol, interval)
     
-    for i in range(intervals):
-        # Calculate the time for this interval
-        interval_time = start_time + timedelta(minutes=30 * i)
-        
-        # More realistic OHLC calculation with trending bias
-        open_price = current_price
-        
-        # Add trend bias (markets tend to have some directional bias)
-        trend_bias = 0.5
-        if i > 0:
-            # If previous candle was bullish, more likely to continue up
-            trend_bias = 0.6 if data[i-1]['close'] > data[i-1]['open'] else 0.4
-        
-        # Determine if price moves up or down based on trend bias
-        movement_up = random.random() < trend_bias
-        
-        # Calculate high and low with realistic volatility
-        high_delta = random.random() * volatility * (1.2 if movement_up else 0.8)
-        low_delta = random.random() * volatility * (0.8 if movement_up else 1.2)
-        
-        high_price = open_price + high_delta
-        low_price = max(open_price - low_delta, open_price * 0.98)  # Ensure low isn't too far from open
-        
-        # Close price calculation based on trend
-        close_range = high_price - low_price
-        if movement_up:
-            # Upper half for uptrend
-            close_price = low_price + (close_range * (0.5 + random.random() * 0.5))
-        else:
-            # Lower half for downtrend
-            close_price = low_price + (close_range * random.random() * 0.5)
-        
-        # Volume with higher volume on more volatile moves
-        volume_base = random.randint(5000000, 15000000)
-        volume_factor = (abs(close_price - open_price) / open_price) * 10
-        volume = int(volume_base * (1 + volume_factor))
-        
-        data.append({
-            'time': interval_time.strftime('%H:%M'),
-            'timestamp': int(interval_time.timestamp() * 1000),
-            'open': round(open_price, 2),
-            'high': round(high_price, 2),
-            'low': round(low_price, 2),
-            'close': round(close_price, 2),
-            'volume': volume,
-            'gain': close_price > open_price,
-        })
-        
-        # Update the current price for the next interval
-        current_price = close_price
+    def events():
+        try:
+            while True:
+                try:
+                    event = subscription.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing the connection and detects disconnects
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            live_hub.unsubscribe(subscription)
     
-    # Calculate insights
-    insights = calculate_insights(data)
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def generate_intraday_mock_data(symbol, date, interval='30m'):
+    """Generate mock intraday data for chart-with-chat, reproducible per symbol and date (see `synthetic`)"""
+    session = session_for(symbol)
+    # Weekends show the previous session
+    day = pd.offsets.BDay().rollback(pd.Timestamp(date.date())).tz_localize(session.tz)
+    hist = generate_bars(symbol, interval, start=day, end=day + pd.Timedelta(days=1), seed=MOCK_DATA_SEED)
+    columns = frame_columns(hist, intraday=True)
     
     return {
         'symbol': symbol,
         'date': date.strftime('%Y-%m-%d'),
         'interval': interval,
-        'data': data,
-        'insights': insights,
+        'data': columns_to_records(columns),
+        'insights': calculate_column_insights(columns),
         'isMockData': True
     }
 
@@ -483,22 +1519,31 @@ def calculate_insights(data):
     """Calculate trading insights from OHLC data"""
     if not data:
         return {}
+    return calculate_column_insights(rows_to_columns(data))
+
+def calculate_column_insights(columns):
+    """Calculate trading insights from OHLC columns (see `serializers.frame_columns`)"""
+    if not columns or len(columns['close']) == 0:
+        return {}
     
-    # Extract prices for calculations
-    opens = [item['open'] for item in data if item['open'] is not None]
-    closes = [item['close'] for item in data if item['close'] is not None]
-    highs = [item['high'] for item in data if item['high'] is not None]
-    lows = [item['low'] for item in data if item['low'] is not None]
-    volumes = [item['volume'] for item in data if item['volume'] is not None]
+    opens = columns['open']
+    closes = columns['close']
+    highs = columns['high']
+    lows = columns['low']
+    volumes = columns['volume']
+    gain = np.asarray([g is True for g in columns['gain']], dtype=bool) if 'gain' in columns else closes > opens
+    count = len(closes)
     
-    if not opens or not closes or not highs or not lows:
+    valid_opens = opens[~np.isnan(opens)]
+    valid_closes = closes[~np.isnan(closes)]
+    if not len(valid_opens) or not len(valid_closes) or np.isnan(highs).all() or np.isnan(lows).all():
         return {}
     
     # Calculate basic statistics
-    open_price = opens[0]
-    close_price = closes[-1]
-    high_price = max(highs)
-    low_price = min(lows)
+    open_price = valid_opens[0]
+    close_price = valid_closes[-1]
+    high_price = np.nanmax(highs)
+    low_price = np.nanmin(lows)
     price_change = close_price - open_price
     percent_change = (price_change / open_price) * 100
     
@@ -506,18 +1551,18 @@ def calculate_insights(data):
     trend_direction = "bullish" if price_change >= 0 else "bearish"
     
     # Calculate volatility
-    volatility = sum(item['high'] - item['low'] for item in data) / len(data)
+    volatility = np.nansum(highs - lows) / count
     volatility_percent = (volatility / open_price) * 100
     
     # Volume trend
-    half_index = len(data) // 2
-    first_half_volume = sum(item['volume'] for item in data[:half_index])
-    second_half_volume = sum(item['volume'] for item in data[half_index:])
+    half_index = count // 2
+    first_half_volume = np.nansum(volumes[:half_index])
+    second_half_volume = np.nansum(volumes[half_index:])
     volume_trend = "increasing" if second_half_volume > first_half_volume else "decreasing"
     
     # Count bullish vs bearish candles
-    bullish_candles = sum(1 for item in data if item.get('gain', False))
-    bearish_candles = len(data) - bullish_candles
+    bullish_candles = int(gain.sum())
+    bearish_candles = count - bullish_candles
     
     # Support and resistance levels
     price_range = high_price - low_price
@@ -525,39 +1570,102 @@ def calculate_insights(data):
     support_level = low_price + (price_range * 0.25)
     
     # Recent momentum
-    end_index = len(data) - 1
+    end_index = count - 1
     start_index = max(0, end_index - 3)  # Last 3 periods
-    recent_trend = "positive" if data[end_index]['close'] > data[start_index]['close'] else "negative"
+    recent_trend = "positive" if closes[end_index] > closes[start_index] else "negative"
     
     # Relative strength calculation
-    gains = [item['close'] - item['open'] for item in data if item.get('gain', False)]
-    losses = [item['open'] - item['close'] for item in data if not item.get('gain', False)]
+    moves = closes - opens
+    gains = moves[gain & ~np.isnan(moves)]
+    losses = -moves[~gain & ~np.isnan(moves)]
     
-    avg_gain = sum(gains) / len(gains) if gains else 0
-    avg_loss = sum(losses) / len(losses) if losses else 0
+    avg_gain = gains.mean() if len(gains) else 0
+    avg_loss = losses.mean() if len(losses) else 0
     
     relative_strength = avg_gain / avg_loss if avg_loss > 0 else (10 if avg_gain > 0 else 0)
     
+    valid_volumes = volumes[~np.isnan(volumes)]
+    total_volume = int(valid_volumes.sum())
+    
     return {
         'trendDirection': trend_direction,
-        'volatility': round(volatility, 2),
-        'volatilityPercent': round(volatility_percent, 2),
+        'volatility': round(float(volatility), 2),
+        'volatilityPercent': round(float(volatility_percent), 2),
         'volumeTrend': volume_trend,
         'bullishCandles': bullish_candles,
         'bearishCandles': bearish_candles,
-        'resistanceLevel': round(resistance_level, 2),
-        'supportLevel': round(support_level, 2),
+        'resistanceLevel': round(float(resistance_level), 2),
+        'supportLevel': round(float(support_level), 2),
         'recentTrend': recent_trend,
-        'relativeStrength': round(relative_strength, 2),
-        'totalVolume': sum(volumes),
-        'averageVolume': round(sum(volumes) / len(volumes))
+        'relativeStrength': round(float(relative_strength), 2),
+        'totalVolume': total_volume,
+        'averageVolume': round(total_volume / len(valid_volumes)) if len(valid_volumes) else 0
     }
 
+def save_snapshot():
+    """Write the warm cache state to SNAPSHOT_PATH (called on graceful shutdown); a no-op without it"""
+    global snapshot_saved
+    if not SNAPSHOT_PATH or snapshot_saved or os.getpid() != serving_pid:
+        return  # Only the process that served requests holds state worth keeping (not a preloading master)
+    if app.debug and not is_running_from_reloader():
+        return  # The reloader's watcher process; the serving child holds the real state
+    snapshot_saved = True
+    try:
+        count = save_state(SNAPSHOT_PATH, (info_cache, history_cache, indicator_cache), warmer, SNAPSHOT_MAX_AGE)
+        print(f"Saved {count} cached entries to {SNAPSHOT_PATH}")
+    except Exception as e:
+        print(f"Error saving snapshot to {SNAPSHOT_PATH}: {str(e)}")
+
+def start_background():
+    """
+    Start this process's background threads (the watchlist warmer) and mark it as the one serving
+    requests, whose state is snapshotted at exit; threads and that role do not survive a fork
+    """
+    global serving_pid
+    if serving_pid != os.getpid():
+        serving_pid = os.getpid()
+        if SNAPSHOT_PATH:
+            atexit.register(save_snapshot)
+    if warmer is not None and not warmer.is_alive():
+        warmer.start()
+
+# Warm state from the previous run (see snapshot.py), restored before the warmer starts so it
+# does not rebuild payloads that are still current
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH')
+SNAPSHOT_MAX_AGE = float(os.environ.get('SNAPSHOT_MAX_AGE', 3600))
+STARTUP_BUDGET = float(os.environ.get('STARTUP_BUDGET', 2.0))
+snapshot_saved = False
+serving_pid = None
+restored_entries = 0
+startup_phases['init'] = time.perf_counter() - BOOT_STARTED - startup_phases['imports']
+if SNAPSHOT_PATH:
+    _restore_started = time.perf_counter()
+    restored_entries = restore_state(SNAPSHOT_PATH, (info_cache, history_cache, indicator_cache), warmer, SNAPSHOT_MAX_AGE)
+    startup_phases['snapshot'] = time.perf_counter() - _restore_started
+# Under gunicorn with preload_app the app is imported once in the master; each worker then starts
+# its own background threads after the fork (see gunicorn.conf.py)
+if os.environ.get('BACKGROUND_THREADS') != 'post_fork':
+    start_background()
+startup_phases['total'] = time.perf_counter() - BOOT_STARTED
+if startup_phases['total'] > STARTUP_BUDGET:
+    print(f"Startup took {startup_phases['total']:.2f}s, over the {STARTUP_BUDGET:.2f}s budget: "
+          + ', '.join(f'{name} {seconds:.2f}s' for name, seconds in startup_phases.items() if name != 'total'))
+metrics.collector('stock_api_startup_seconds', 'Time spent booting this process, by phase',
+                  lambda: [({'phase': name}, round(seconds, 6)) for name, seconds in startup_phases.items()])
+
 if __name__ == '__main__':
     print("Starting Enhanced Stock Data API on http://localhost:5000")
     print("Available endpoints:")
     print("  - /stock-details?symbol=AAPL")
     print("  - /historical-data?symbol=AAPL&period=1mo&interval=1d")
+    print("  - /stock-details/batch?symbols=AAPL,MSFT")
+    print("  - POST /portfolio/valuate {\"holdings\": [{\"symbol\": \"AAPL\", \"quantity\": 10, \"costBasis\": 1500}]}")
+    print("  - /historical-data/batch?symbols=AAPL,MSFT&period=1mo&interval=1d")
+    print("  - /screener?universe=nifty500&filter=rsi<30&sort=rsi")
+    print("  - /backtest?symbols=AAPL,MSFT&strategy=ma_cross&period=10y")
     print("  - /chart-with-chat?symbol=BANKNIFTY&interval=30m")
+    print("  - /chart-with-chat/stream?symbol=BANKNIFTY&interval=30m (Server-Sent Events)")
     print("  - /health")
+    print("  - /cache-stats")
+    print("  - /metrics")
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
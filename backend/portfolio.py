@@ -0,0 +1,157 @@
+"""
+Bulk portfolio valuation
+
+Holdings are (symbol, quantity, cost basis) rows; the cost basis is the total paid for the
+position, as stored in `portfolio_assets.cost_basis`. Quotes for every distinct symbol are
+looked up once, then market value, P&L, day change, allocation weights and the portfolio beta
+are computed over whole arrays. The same symbol may appear in several rows (separate lots).
+"""
+import math
+
+import numpy as np
+
+
+class PortfolioError(ValueError):
+    """The holdings payload is malformed"""
+
+
+def parse_holdings(payload):
+    """
+    Validate a request body of the form {"holdings": [{"symbol", "quantity", "costBasis"}, ...]}
+    `shares` and `cost_basis` are accepted as in the portfolio tables. Returns a list of
+    (symbol, quantity, cost basis) tuples; the cost basis is None when not given.
+    """
+    holdings = payload.get('holdings') if isinstance(payload, dict) else payload
+    if not isinstance(holdings, list) or not holdings:
+        raise PortfolioError('holdings must be a non-empty list')
+    parsed = []
+    for position, item in enumerate(holdings):
+        if not isinstance(item, dict):
+            raise PortfolioError(f'holdings[{position}] must be an object')
+        symbol = str(item.get('symbol') or '').strip().upper()
+        if not symbol:
+            raise PortfolioError(f'holdings[{position}] needs a symbol')
+        quantity = _number(item.get('quantity', item.get('shares')), f'holdings[{position}].quantity')
+        if quantity is None:
+            raise PortfolioError(f'holdings[{position}] needs a quantity')
+        cost = _number(item.get('costBasis', item.get('cost_basis')), f'holdings[{position}].costBasis')
+        parsed.append((symbol, quantity, cost))
+    return parsed
+
+
+def _number(value, name):
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise PortfolioError(f'{name} must be a number') from None
+    if isinstance(value, bool) or not math.isfinite(number):
+        raise PortfolioError(f'{name} must be a finite number')
+    return number
+
+
+def valuate(holdings, quotes):
+    """
+    Value `holdings` against `quotes` ({symbol: {price, previousClose, beta, name, sector}})
+    Returns (positions, totals, sectors); holdings without a price are left out of every total
+    and come back with an `error`.
+    """
+    count = len(holdings)
+    symbols = [h[0] for h in holdings]
+    quantity = np.array([h[1] for h in holdings], dtype=float)
+    cost = np.array([np.nan if h[2] is None else h[2] for h in holdings], dtype=float)
+
+    def column(field):
+        return np.array([_float(quotes.get(s, {}).get(field)) for s in symbols], dtype=float)
+
+    price = column('price')
+    previous = column('previousClose')
+    beta = column('beta')
+    priced = ~np.isnan(price)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        value = quantity * price
+        day_change = quantity * (price - previous)
+        day_change_percent = (price / previous - 1) * 100
+        pnl = value - cost
+        pnl_percent = pnl / np.abs(cost) * 100
+    day_change_percent[~np.isfinite(day_change_percent)] = np.nan
+    pnl_percent[~np.isfinite(pnl_percent)] = np.nan
+
+    total_value = float(np.sum(value[priced]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = value / total_value if total_value else np.full(count, np.nan)
+
+    # Day change is measured against the value at the previous close of the positions that have one
+    has_previous = priced & ~np.isnan(previous)
+    previous_value = float(np.sum(quantity[has_previous] * previous[has_previous]))
+    total_day_change = float(np.sum(day_change[has_previous]))
+    # P&L only over positions with a known cost
+    has_cost = priced & ~np.isnan(cost)
+    total_cost = float(np.sum(cost[has_cost]))
+    total_pnl = float(np.sum(pnl[has_cost]))
+    # Beta is the value-weighted mean over positions with a beta; coverage is their share of the value
+    has_beta = priced & ~np.isnan(beta)
+    beta_value = float(np.sum(value[has_beta]))
+
+    totals = {
+        'marketValue': round(total_value, 2),
+        'costBasis': round(total_cost, 2) if has_cost.any() else None,
+        'unrealizedPnl': round(total_pnl, 2) if has_cost.any() else None,
+        'unrealizedPnlPercent': round(total_pnl / abs(total_cost) * 100, 2) if total_cost else None,
+        'dayChange': round(total_day_change, 2) if has_previous.any() else None,
+        'dayChangePercent': round(total_day_change / previous_value * 100, 2) if previous_value else None,
+        'beta': round(float(np.sum(value[has_beta] * beta[has_beta])) / beta_value, 3) if beta_value else None,
+        'betaCoverage': round(beta_value / total_value * 100, 2) if total_value else None,
+        'positions': count,
+        'pricedPositions': int(priced.sum()),
+    }
+
+    # Sector weights from one grouped sum over the priced positions
+    sector_names = np.array([quotes.get(s, {}).get('sector') or 'Unknown' for s in symbols], dtype=object)
+    names, groups = np.unique(sector_names[priced].astype(str), return_inverse=True)
+    sector_values = np.bincount(groups, weights=value[priced], minlength=len(names))
+    sectors = sorted((
+        {'sector': str(name), 'marketValue': round(float(v), 2),
+         'allocationPercent': round(float(v) / total_value * 100, 2) if total_value else None}
+        for name, v in zip(names, sector_values)
+    ), key=lambda item: -item['marketValue'])
+
+    positions = []
+    for row, symbol in enumerate(symbols):
+        quote = quotes.get(symbol, {})
+        if not priced[row]:
+            positions.append({'symbol': symbol, 'quantity': float(quantity[row]), 'error': quote.get('error', 'No price available')})
+            continue
+        item = {
+            'symbol': symbol,
+            'name': quote.get('name'),
+            'sector': quote.get('sector'),
+            'quantity': float(quantity[row]),
+            'price': _round(price[row], 2),
+            'previousClose': _round(previous[row], 2),
+            'marketValue': _round(value[row], 2),
+            'costBasis': _round(cost[row], 2),
+            'unrealizedPnl': _round(pnl[row], 2),
+            'unrealizedPnlPercent': _round(pnl_percent[row], 2),
+            'dayChange': _round(day_change[row], 2),
+            'dayChangePercent': _round(day_change_percent[row], 2),
+            'allocationPercent': _round(weight[row] * 100, 2),
+            'beta': _round(beta[row], 3),
+        }
+        positions.append({k: v for k, v in item.items() if v is not None})
+    return positions, totals, sectors
+
+
+def _float(value):
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _round(value, digits):
+    return None if np.isnan(value) else round(float(value), digits)
@@ -0,0 +1,196 @@
+"""
+Field projection for /stock-details
+
+`fields=price,dayChangePercent` limits the response to those keys, and the request only does
+the work they need:
+- `info` is fetched only for fields that come from it
+- history is fetched only for fields computed from bars, and only as many bars as the longest
+  lookback needs (about a year for MA200, a month for RSI), never more than the requested period
+- MACD fields read the whole requested period: the EMAs behind them are seeded from the first bar,
+  so a shorter window would give (slightly) different values than the unprojected response
+- only the indicators behind the requested fields are computed
+
+Some fields come from `info` with a history fallback (e.g. `fiftyDayAverage` falls back to MA50);
+history is then fetched lazily, only if `info` lacks the value.
+
+`python projection.py` checks that every field, requested alone, matches the unprojected payload.
+"""
+from collections import namedtuple
+
+from barStore import period_start
+
+# What a field needs: `info`, bars of history, indicators; `fallback` means bars are only needed when info lacks the key
+Requirement = namedtuple('Requirement', ['info', 'bars', 'indicators', 'fallback'])
+
+_INFO = Requirement(True, 0, (), False)
+_NONE = Requirement(False, 0, (), False)
+
+# Indicators whose latest value depends on every earlier bar (EMA recursions seeded at the first one)
+WHOLE_PERIOD_INDICATORS = ('macd', 'signal')
+
+# Bars before MACD/Signal have a value at all (slow EMA span + signal span)
+MACD_MIN_BARS = 35
+
+DETAIL_FIELDS = {
+    'symbol': _NONE,
+    'shortName': _INFO,
+    'longName': _INFO,
+    'sector': _INFO,
+    'industry': _INFO,
+    'regularMarketPrice': _INFO,
+    'regularMarketOpen': _INFO,
+    'regularMarketPreviousClose': _INFO,
+    'regularMarketDayHigh': _INFO,
+    'regularMarketDayLow': _INFO,
+    'dayChange': _INFO,
+    'dayChangePercent': _INFO,
+    'regularMarketVolume': _INFO,
+    'averageDailyVolume10Day': Requirement(True, 10, (), True),
+    'averageDailyVolume3Month': Requirement(True, 90, (), True),
+    'fiftyDayAverage': Requirement(True, 50, ('ma50',), True),
+    'twoHundredDayAverage': Requirement(True, 200, ('ma200',), True),
+    'fiftyTwoWeekHigh': _INFO,
+    'fiftyTwoWeekLow': _INFO,
+    'supportLevel': Requirement(False, 20, (), False),
+    'resistanceLevel': Requirement(False, 20, (), False),
+    'rsi': Requirement(False, 15, ('rsi',), False),
+    'macd': Requirement(False, MACD_MIN_BARS, ('macd',), False),
+    'macdSignal': Requirement(False, MACD_MIN_BARS, ('macd', 'signal'), False),
+    'weekChange': Requirement(False, 5, (), False),
+    'monthChange': Requirement(False, 22, (), False),
+    'marketCap': _INFO,
+    'trailingPE': _INFO,
+    'forwardPE': _INFO,
+    'priceToBook': _INFO,
+    'enterpriseValue': _INFO,
+    'dividendRate': _INFO,
+    'dividendYield': _INFO,
+    'payoutRatio': _INFO,
+    'beta': _INFO,
+    'earningsQuarterlyGrowth': _INFO,
+    'revenueQuarterlyGrowth': _INFO,
+    'targetMeanPrice': _INFO,
+    'analystRating': _INFO,
+    'timestamp': _NONE,
+    'dataDate': _NONE,
+}
+
+# Short names accepted in `fields=`
+ALIASES = {
+    'price': 'regularMarketPrice',
+    'open': 'regularMarketOpen',
+    'previousClose': 'regularMarketPreviousClose',
+    'dayHigh': 'regularMarketDayHigh',
+    'dayLow': 'regularMarketDayLow',
+    'volume': 'regularMarketVolume',
+    'ma50': 'fiftyDayAverage',
+    'ma200': 'twoHundredDayAverage',
+}
+
+# Standard periods and the trading days they hold, shortest first
+PERIOD_BARS = (('1mo', 21), ('3mo', 63), ('6mo', 126), ('1y', 252), ('2y', 504), ('5y', 1260))
+
+
+class FieldError(ValueError):
+    """Unknown field in `fields=`"""
+
+
+def parse_fields(raw):
+    """The set of payload keys named by a `fields` parameter (aliases resolved), or None for all fields"""
+    if raw is None or not raw.strip():
+        return None
+    fields = set()
+    for part in raw.split(','):
+        name = ALIASES.get(part.strip(), part.strip())
+        if not name:
+            continue
+        if name not in DETAIL_FIELDS:
+            raise FieldError(f"Unknown field '{part.strip()}'")
+        fields.add(name)
+    # Every projected payload keeps the symbol so batch and single responses stay self-describing
+    fields.add('symbol')
+    return fields
+
+
+def needs_info(fields):
+    return fields is None or any(DETAIL_FIELDS[f].info for f in fields)
+
+
+def history_fields(fields, info):
+    """Requested fields that need history, given the `info` already fetched (None when it was skipped)"""
+    if fields is None:
+        return set(name for name, req in DETAIL_FIELDS.items() if req.bars)
+    needed = set()
+    for name in fields:
+        req = DETAIL_FIELDS[name]
+        if not req.bars:
+            continue
+        if req.fallback and info is not None and info.get(name) is not None:
+            continue
+        needed.add(name)
+    return needed
+
+
+def indicators_for(fields):
+    """Indicator names (see `indicators.latest_indicators`) behind `fields`"""
+    return tuple(sorted({i for name in fields for i in DETAIL_FIELDS[name].indicators}))
+
+
+def history_period(fields, requested):
+    """
+    The shortest standard period holding the bars `fields` need, capped at the `requested` period
+    Returns `requested` when it is already shorter, when nothing shorter covers the lookback, or
+    when a field depends on the whole period (MACD), so projected values match the full response.
+    """
+    if any(i in WHOLE_PERIOD_INDICATORS for name in fields for i in DETAIL_FIELDS[name].indicators):
+        return requested
+    bars = max((DETAIL_FIELDS[name].bars for name in fields), default=0)
+    covering = next((period for period, count in PERIOD_BARS if count >= bars), None)
+    if covering is None:
+        return requested
+    requested_start = period_start(requested)
+    if requested_start is not None and requested_start >= period_start(covering):
+        return requested
+    return covering
+
+
+def project(payload, fields):
+    """Keep only the requested keys of a /stock-details payload (all of them when `fields` is None)"""
+    if fields is None:
+        return payload
+    return {k: v for k, v in payload.items() if k in fields}
+
+
+def check_parity(client, symbols=('AAPL', 'MSFT'), periods=('1y', '6mo'), rtol=1e-9):
+    """
+    Request each field alone from /stock-details through a Flask test `client` and compare it with
+    the unprojected payload for the same symbol and period; returns a list of mismatches
+    """
+    failures = []
+    for symbol in symbols:
+        for period in periods:
+            full = client.get(f'/stock-details?symbol={symbol}&period={period}').get_json()
+            for name in DETAIL_FIELDS:
+                if name in ('timestamp', 'dataDate'):
+                    continue
+                got = client.get(f'/stock-details?symbol={symbol}&period={period}&fields={name}').get_json()
+                want, value = full.get(name), got.get(name)
+                if isinstance(want, float) and isinstance(value, float):
+                    same = abs(value - want) <= rtol * max(1.0, abs(want))
+                else:
+                    same = value == want
+                if not same:
+                    failures.append(f'{symbol} {period} {name}: {value!r} != {want!r}')
+    return failures
+
+
+if __name__ == '__main__':
+    from liveData import app  # Only for the check; projection itself stays free of the app
+
+    problems = check_parity(app.test_client())
+    if problems:
+        print('Projection parity check FAILED:')
+        for problem in problems:
+            print(f'  - {problem}')
+        raise SystemExit(1)
+    print('Projection parity check passed')
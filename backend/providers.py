@@ -0,0 +1,283 @@
+"""
+Market data providers
+
+Every upstream access goes through a `MarketDataProvider` so the service can run against:
+- `YFinanceProvider`: live Yahoo Finance data (default)
+- `ReplayProvider`: recorded or synthetic data with configurable latency, for offline runs and benchmarks
+- `RecordingProvider`: wraps another provider and saves what it returns for later replay
+- `FaultInjectingProvider`: wraps another provider and makes a share of calls fail, throttle or hang,
+  to exercise the circuit breaker and fallbacks locally
+
+Select one with MARKET_DATA_PROVIDER=yfinance|replay (see `create_provider`); FAULT_* variables add faults.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from barStore import BarStore, period_start, slice_period
+from synthetic import generate_bars, symbol_seed, synthetic_info
+
+
+class MarketDataProvider:
+    """Interface mirroring the parts of yfinance the service uses"""
+    name = 'base'
+
+    def info(self, symbol):
+        """Quote and fundamentals dict, like `yf.Ticker(symbol).info`"""
+        raise NotImplementedError
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None):
+        """OHLCV frame indexed by exchange-local timestamps, like `yf.Ticker(symbol).history`"""
+        raise NotImplementedError
+
+    def download(self, symbols, period='1mo', interval='1d', threads=True):
+        """Frame with (symbol, field) columns for many symbols, like `yf.download(..., group_by='ticker')`"""
+        frames = {}
+        for symbol in symbols:
+            try:
+                frame = self.history(symbol, period=period, interval=interval)
+            except Exception as e:
+                print(f"Error downloading {symbol} from {self.name}: {str(e)}")
+                continue
+            if not frame.empty:
+                frames[symbol] = frame
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = 'yfinance'
+
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def _yf(self):
+        # yfinance (and the HTTP/HTML stack behind it) is imported on the first upstream call, not at boot
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    import yfinance
+                    self._module = yfinance
+        return self._module
+
+    def info(self, symbol):
+        return self._yf.Ticker(symbol).info
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None):
+        kwargs = {'interval': interval}
+        if start is not None or end is not None:
+            kwargs.update(start=start, end=end)
+        else:
+            kwargs['period'] = period or '1mo'
+        return self._yf.Ticker(symbol).history(**kwargs)
+
+    def download(self, symbols, period='1mo', interval='1d', threads=True):
+        return self._yf.download(
+            symbols, period=period, interval=interval, group_by='ticker',
+            auto_adjust=True, threads=threads, progress=False, ignore_tz=False
+        )
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Offline provider
+    Bars come from a recorded bar store directory when one exists for the series, otherwise from the
+    deterministic synthetic generator (`synthetic.generate_bars`). Each call sleeps `latency` (+/- `jitter`) seconds to stand
+    in for the network.
+    """
+    name = 'replay'
+
+    def __init__(self, directory=None, latency=0.0, jitter=0.0, seed=0):
+        self.directory = directory
+        self.store = BarStore(os.path.join(directory, 'bars')) if directory else None
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        with self._lock:
+            self.calls += 1
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def info(self, symbol):
+        self._wait()
+        if self.directory:
+            try:
+                with open(os.path.join(self.directory, 'info', _filename(symbol) + '.json')) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        daily = self._bars(symbol, '1d', period_start('1y'), None)
+        return synthetic_info(symbol, daily, self._rng(symbol, 'info'))
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None):
+        self._wait()
+        if start is None and end is None:
+            frame = self._bars(symbol, interval, period_start(period or '1mo'), None)
+            return slice_period(frame, period or '1mo')
+        return self._bars(symbol, interval, _timestamp(start), _timestamp(end))
+
+    def download(self, symbols, period='1mo', interval='1d', threads=True):
+        # One simulated round trip for the whole batch, like a multi-ticker download
+        self._wait()
+        start = period_start(period or '1mo')
+        frames = {}
+        for symbol in symbols:
+            frame = slice_period(self._bars(symbol, interval, start, None), period or '1mo')
+            if not frame.empty:
+                # yf.download's default (ignore_tz=True) drops the timezone, leaving exchange wall-clock times
+                frames[symbol] = frame.tz_localize(None)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+    def _bars(self, symbol, interval, start, end):
+        if self.store is not None:
+            recorded = self.store.read(symbol, interval, start=start, end=end)
+            if recorded is not None:
+                return recorded
+        return generate_bars(symbol, interval, start=start, end=end, seed=self.seed)
+
+    def _rng(self, symbol, salt):
+        return np.random.default_rng([self.seed, symbol_seed(symbol), zlib.crc32(salt.encode())])
+
+
+class RecordingProvider(MarketDataProvider):
+    """Passes calls through to `inner` and saves the results under `directory` for `ReplayProvider`"""
+    name = 'recording'
+
+    def __init__(self, inner, directory):
+        self.inner = inner
+        self.directory = directory
+        self.store = BarStore(os.path.join(directory, 'bars'))
+
+    def info(self, symbol):
+        info = self.inner.info(symbol)
+        path = os.path.join(self.directory, 'info', _filename(symbol) + '.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(info, f, default=str)
+        return info
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None):
+        frame = self.inner.history(symbol, period=period, interval=interval, start=start, end=end)
+        if not frame.empty:
+            self.store.merge(symbol, interval, frame)
+        return frame
+
+
+class InjectedFault(ConnectionError):
+    """An error raised on purpose by `FaultInjectingProvider`; stands in for a transport failure"""
+
+
+class FaultInjectingProvider(MarketDataProvider):
+    """
+    Passes calls through to `inner`, except that each call independently:
+    - fails with probability `error_rate`,
+    - is rejected as throttled (HTTP 429) with probability `throttle_rate`,
+    - hangs for `hang_seconds` before answering with probability `hang_rate`.
+    Setting `outage` makes every call fail until it is cleared again (also at runtime).
+    """
+    name = 'faulty'
+
+    def __init__(self, inner, error_rate=0.0, throttle_rate=0.0, hang_rate=0.0, hang_seconds=30.0, outage=False, seed=0):
+        self.inner = inner
+        self.name = f'{inner.name}+faults'
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.outage = outage
+        self.faults = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _maybe_fail(self, operation):
+        with self._lock:
+            roll = self._rng.random()
+            if self.outage:
+                fault = 'outage'
+            elif roll < self.error_rate:
+                fault = 'error'
+            elif roll < self.error_rate + self.throttle_rate:
+                fault = 'throttle'
+            elif roll < self.error_rate + self.throttle_rate + self.hang_rate:
+                fault = 'hang'
+            else:
+                return
+            self.faults += 1
+        if fault == 'hang':
+            time.sleep(self.hang_seconds)
+        elif fault == 'throttle':
+            raise InjectedFault(f'429 Too Many Requests ({operation})')
+        else:
+            raise InjectedFault(f'Injected upstream {fault} ({operation})')
+
+    def info(self, symbol):
+        self._maybe_fail('info')
+        return self.inner.info(symbol)
+
+    def history(self, symbol, period=None, interval='1d', start=None, end=None):
+        self._maybe_fail('history')
+        return self.inner.history(symbol, period=period, interval=interval, start=start, end=end)
+
+    def download(self, symbols, period='1mo', interval='1d', threads=True):
+        self._maybe_fail('download')
+        return self.inner.download(symbols, period=period, interval=interval, threads=threads)
+
+
+def create_provider():
+    """Build the provider selected by MARKET_DATA_PROVIDER (yfinance or replay), optionally recording it or injecting faults"""
+    name = os.environ.get('MARKET_DATA_PROVIDER', 'yfinance').lower()
+    if name == 'replay':
+        provider = ReplayProvider(
+            directory=os.environ.get('REPLAY_DIR') or None,
+            latency=float(os.environ.get('REPLAY_LATENCY', 0.0)),
+            jitter=float(os.environ.get('REPLAY_JITTER', 0.0)),
+            seed=int(os.environ.get('REPLAY_SEED', 0)),
+        )
+    elif name == 'yfinance':
+        provider = YFinanceProvider()
+    else:
+        raise ValueError(f'Unknown MARKET_DATA_PROVIDER: {name}')
+    if os.environ.get('RECORD_DIR'):
+        provider = RecordingProvider(provider, os.environ['RECORD_DIR'])
+    faults = {
+        'error_rate': float(os.environ.get('FAULT_ERROR_RATE', 0.0)),
+        'throttle_rate': float(os.environ.get('FAULT_THROTTLE_RATE', 0.0)),
+        'hang_rate': float(os.environ.get('FAULT_HANG_RATE', 0.0)),
+        'outage': os.environ.get('FAULT_OUTAGE', '').lower() in ('1', 'true', 'yes'),
+    }
+    if any(faults.values()):
+        provider = FaultInjectingProvider(
+            provider,
+            hang_seconds=float(os.environ.get('FAULT_HANG_SECONDS', 30.0)),
+            seed=int(os.environ.get('FAULT_SEED', 0)),
+            **faults
+        )
+    return provider
+
+
+def _filename(symbol):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', symbol.upper())
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
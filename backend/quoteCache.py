@@ -0,0 +1,267 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at')
+
+    def __init__(self, value, fetched_at):
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class _Flight:
+    """An upstream fetch in progress that concurrent callers can wait on"""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    """
+    Bounded in-process cache for upstream market data
+    - Entries younger than `ttl` seconds are served as hits
+    - Entries up to `ttl + stale_ttl` old are served immediately while a
+      background refresh fetches a new value (stale-while-revalidate)
+    - Concurrent misses for the same key share a single upstream fetch
+    - The least recently used entry is evicted once `maxsize` is exceeded
+    - Expired entries stay until evicted, so `get_stale` can still serve them when the upstream is down
+    - With a `shared` store (see sharedCache.py), misses are looked up there before fetching, and
+      one process at a time fetches a key while the others wait for its result
+    """
+
+    def __init__(self, name, maxsize=256, ttl=60.0, stale_ttl=300.0, shared=None, lock_timeout=15.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.lock_timeout = lock_timeout
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.shared_hits = 0
+        self.shared_waits = 0
+        self.shared_errors = 0
+
+    def get_or_fetch(self, key, fetch):
+        """Return the cached value for `key`, calling `fetch()` at most once per key when it is missing"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry.value
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    if key not in self._inflight:
+                        flight = self._inflight[key] = _Flight()
+                        self.refreshes += 1
+                        threading.Thread(
+                            target=self._refresh, args=(key, fetch, flight), daemon=True
+                        ).start()
+                    return entry.value
+
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        return self._run(key, fetch, flight)
+
+    def refresh(self, key, fetch):
+        """Fetch `key` now and store it even if the cached value is still fresh (joins a fetch already in flight)"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.refreshes += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        return self._run(key, fetch, flight)
+
+    def _run(self, key, fetch, flight):
+        age = 0.0
+        try:
+            if self.shared is None:
+                value = fetch()
+            else:
+                value, age = self._fetch_shared(key, fetch)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+                self._inflight.pop(key, None)
+            flight.event.set()
+            raise
+        flight.value = value
+        with self._lock:
+            self._store(key, value, age)
+            self._inflight.pop(key, None)
+        flight.event.set()
+        return value
+
+    def _fetch_shared(self, key, fetch):
+        """(value, age): a fresh shared value, or `fetch()` under the cross-process lock for `key`"""
+        name = f'{self.name}:{key!r}'
+        found = self._shared_call(self.shared.get, name, self.ttl)
+        if found is not None:
+            with self._lock:
+                self.shared_hits += 1
+            return found
+        waiting_since = time.time()
+        handle = self._shared_call(self.shared.acquire, name, self.lock_timeout)
+        try:
+            # Another process may have stored the value while this one waited for the lock
+            found = self._shared_call(self.shared.get, name, time.time() - waiting_since)
+            if found is not None:
+                with self._lock:
+                    self.shared_waits += 1
+                return found
+            value = fetch()
+            self._shared_call(self.shared.set, name, value, self.ttl + self.stale_ttl)
+            return value, 0.0
+        finally:
+            if handle is not None:
+                self._shared_call(self.shared.release, handle)
+
+    def _shared_call(self, method, *args):
+        # The shared tier is an optimization: when it fails, carry on as a process-local cache
+        try:
+            return method(*args)
+        except Exception as e:
+            with self._lock:
+                self.shared_errors += 1
+            print(f"Shared cache error for {self.name}: {str(e)}")
+            return None
+
+    def _refresh(self, key, fetch, flight):
+        try:
+            self._run(key, fetch, flight)
+        except Exception as e:
+            # Keep serving the stale value; the next caller past stale_ttl will retry
+            print(f"Background refresh failed for {self.name} {key}: {str(e)}")
+
+    def _store(self, key, value, age=0.0):
+        self._entries[key] = _Entry(value, time.monotonic() - age)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, key):
+        """Return the value for `key` if it is still fresh, otherwise None; does not trigger a fetch"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.fetched_at >= self.ttl:
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_stale(self, key):
+        """
+        Return (value, age in seconds) for `key` however old the entry is, or None
+        Last-resort fallback when the upstream cannot be reached; does not trigger a fetch.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.fallbacks += 1
+                return entry.value, time.monotonic() - entry.fetched_at
+        # A process that never held the key may still find another's value in the shared tier
+        found = None if self.shared is None else self._shared_call(self.shared.get, f'{self.name}:{key!r}')
+        if found is not None:
+            with self._lock:
+                self.fallbacks += 1
+        return found
+
+    def put(self, key, value):
+        """Store a value fetched outside `get_or_fetch` (e.g. by a batch download)"""
+        with self._lock:
+            self._store(key, value)
+        if self.shared is not None:
+            self._shared_call(self.shared.set, f'{self.name}:{key!r}', value, self.ttl + self.stale_ttl)
+
+    def invalidate(self, key=None):
+        """Drop one key, or every entry when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def export(self):
+        """(key, value, age in seconds) for every entry, least recently used first"""
+        with self._lock:
+            now = time.monotonic()
+            return [(key, entry.value, now - entry.fetched_at) for key, entry in self._entries.items()]
+
+    def restore(self, entries, extra_age=0.0):
+        """Load entries from `export`, aged by `extra_age` more seconds; returns how many were kept"""
+        kept = 0
+        with self._lock:
+            for key, value, age in entries:
+                if key in self._entries:
+                    continue  # Already fetched live; newer than the snapshot
+                self._store(key, value, age + extra_age)
+                kept += 1
+        return min(kept, self.maxsize)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'staleTtl': self.stale_ttl,
+                'hits': self.hits,
+                'staleHits': self.stale_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+                'fallbacks': self.fallbacks,
+                'inflight': len(self._inflight),
+                'shared': self.shared is not None,
+                'sharedHits': self.shared_hits,
+                'sharedWaits': self.shared_waits,
+                'sharedErrors': self.shared_errors,
+                'hitRatio': round((self.hits + self.stale_hits + self.coalesced) / lookups, 4) if lookups else None,
+            }
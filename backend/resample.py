@@ -0,0 +1,166 @@
+"""
+Local multi-timeframe resampling
+
+Coarser bars are derived from a base series already held for the symbol instead of being
+fetched separately: intraday intervals (2m ... 90m/1h) from 1-minute bars, and weekly,
+monthly and quarterly bars from daily bars. Intraday buckets are aligned to the exchange
+session open, looked up by ticker suffix (09:15 IST for `.NS`, 08:00 London for `.L`, 09:30
+New York for US tickers, ...; see `SESSIONS`), so a 30m chart of BANKNIFTY has bars at 09:15,
+09:45, ... exactly like the exchange feed. Intraday intervals of symbols whose session is not
+known are fetched from the upstream as they are rather than derived with a guessed alignment.
+
+Aggregation is first open, highest high, lowest low, last close and summed volume, computed
+with `reduceat` over runs of consecutive bars.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from barStore import interval_seconds, is_intraday, period_start
+
+# `weekends`: the market also trades on Saturdays and Sundays (crypto)
+Session = namedtuple('Session', ['tz', 'open_minutes', 'length_minutes', 'weekends'], defaults=(False,))
+
+NYSE_SESSION = Session('America/New_York', 9 * 60 + 30, 390)
+NSE_SESSION = Session('Asia/Kolkata', 9 * 60 + 15, 375)
+LSE_SESSION = Session('Europe/London', 8 * 60, 510)
+XETRA_SESSION = Session('Europe/Berlin', 9 * 60, 510)
+EURONEXT_SESSION = Session('Europe/Paris', 9 * 60, 510)
+TSE_SESSION = Session('Asia/Tokyo', 9 * 60, 390)
+HKEX_SESSION = Session('Asia/Hong_Kong', 9 * 60 + 30, 390)
+TSX_SESSION = Session('America/Toronto', 9 * 60 + 30, 390)
+ASX_SESSION = Session('Australia/Sydney', 10 * 60, 360)
+CRYPTO_SESSION = Session('UTC', 0, 24 * 60, True)
+
+# Regular session by Yahoo ticker suffix; US tickers have none
+SESSIONS = {
+    '.NS': NSE_SESSION,
+    '.BO': NSE_SESSION,
+    '.L': LSE_SESSION,
+    '.DE': XETRA_SESSION,
+    '.F': XETRA_SESSION,
+    '.PA': EURONEXT_SESSION,
+    '.AS': EURONEXT_SESSION,
+    '.BR': EURONEXT_SESSION,
+    '.T': TSE_SESSION,
+    '.HK': HKEX_SESSION,
+    '.TO': TSX_SESSION,
+    '.AX': ASX_SESSION,
+}
+
+INDEX_SESSIONS = {
+    'NIFTY': NSE_SESSION, 'BANKNIFTY': NSE_SESSION, '^NSEI': NSE_SESSION, '^NSEBANK': NSE_SESSION,
+    '^GSPC': NYSE_SESSION, '^DJI': NYSE_SESSION, '^IXIC': NYSE_SESSION, '^RUT': NYSE_SESSION,
+    '^FTSE': LSE_SESSION, '^GDAXI': XETRA_SESSION, '^FCHI': EURONEXT_SESSION,
+    '^N225': TSE_SESSION, '^HSI': HKEX_SESSION, '^GSPTSE': TSX_SESSION, '^AXJO': ASX_SESSION,
+}
+
+# Quote currencies of Yahoo crypto pairs (BTC-USD, ETH-EUR, ...)
+CRYPTO_QUOTES = ('-USD', '-USDT', '-EUR', '-GBP', '-INR', '-BTC', '-ETH')
+
+# Stand-in for exchanges without an entry: UTC, around the clock, so nothing is assumed closed
+UNKNOWN_SESSION = Session('UTC', 0, 24 * 60, True)
+
+# Weekly and longer bars are aggregated from daily bars by calendar period
+CALENDAR_INTERVALS = {'5d': 'W', '1wk': 'W', '1mo': 'M', '3mo': 'Q'}
+
+# Intraday intervals are derived from 1m bars over the last INTRADAY_BASE_PERIOD; the upstream only
+# serves 1m bars for about a week, so longer intraday ranges are fetched at their own interval
+INTRADAY_BASE = '1m'
+INTRADAY_BASE_PERIOD = '5d'
+
+
+def exchange_session(symbol):
+    """Regular trading session of the exchange a symbol trades on, or None when it is not known"""
+    symbol = symbol.upper()
+    if symbol in INDEX_SESSIONS:
+        return INDEX_SESSIONS[symbol]
+    if symbol.startswith('^') or '=' in symbol:
+        return None  # Other indices, currencies (EURUSD=X) and futures (ES=F)
+    if symbol.endswith(CRYPTO_QUOTES):
+        return CRYPTO_SESSION
+    suffix = symbol.rfind('.')
+    if suffix <= 0:
+        return NYSE_SESSION
+    # Share classes such as BRK.B are US tickers too
+    return SESSIONS.get(symbol[suffix:], NYSE_SESSION if len(symbol) - suffix == 2 and suffix <= 4 else None)
+
+
+def session_for(symbol):
+    """`exchange_session`, with `UNKNOWN_SESSION` standing in for exchanges without an entry"""
+    return exchange_session(symbol) or UNKNOWN_SESSION
+
+
+def base_for(interval, period, session, now=None):
+    """
+    (base interval, base period) to derive `interval` over `period` from, or None when it has
+    to be fetched as is
+    Intraday intervals are only derived when the `session` they align to is known (not None).
+    """
+    if interval in CALENDAR_INTERVALS:
+        return '1d', period
+    if not is_intraday(interval) or interval == INTRADAY_BASE or session is None:
+        return None
+    step = interval_seconds(interval)
+    if step % interval_seconds(INTRADAY_BASE):
+        return None
+    now = now or pd.Timestamp.now(tz='UTC')
+    try:
+        start = period_start(period, now)
+    except ValueError:
+        return None
+    if start is None or start < period_start(INTRADAY_BASE_PERIOD, now):
+        return None
+    return INTRADAY_BASE, INTRADAY_BASE_PERIOD
+
+
+def resample(frame, interval, session=NYSE_SESSION):
+    """Aggregate a finer OHLCV frame (sorted, exchange-local index) into `interval` bars"""
+    if frame.empty:
+        return frame
+    if interval in CALENDAR_INTERVALS:
+        return resample_calendar(frame, CALENDAR_INTERVALS[interval])
+    return resample_intraday(frame, interval_seconds(interval) // 60, session)
+
+
+def resample_intraday(frame, minutes, session=NYSE_SESSION):
+    """Aggregate intraday bars into `minutes`-long buckets counted from each day's session open"""
+    index = frame.index
+    wall = (index.tz_localize(None) if index.tz is not None else index).to_numpy()
+    day = wall.astype('datetime64[D]')
+    minute_of_day = (wall - day).astype('timedelta64[m]').astype(np.int64)
+    # Bars before the open fall into negative buckets of their own
+    bucket = np.floor_divide(minute_of_day - session.open_minutes, minutes)
+    key = day.astype(np.int64) * 100_000 + bucket
+    starts = np.flatnonzero(np.concatenate([[True], key[1:] != key[:-1]]))
+
+    labels = (day[starts] + np.timedelta64(1, 'm') * (session.open_minutes + bucket[starts] * minutes)).astype('datetime64[ns]')
+    labels = pd.DatetimeIndex(labels)
+    if index.tz is not None:
+        labels = labels.tz_localize(index.tz)
+    return _aggregate_runs(frame, starts, labels)
+
+
+def resample_calendar(frame, freq):
+    """Aggregate daily bars into calendar weeks ('W'), months ('M') or quarters ('Q'), labelled by period start"""
+    index = frame.index
+    wall = index.tz_localize(None) if index.tz is not None else index
+    periods = wall.to_period(freq)
+    starts = np.flatnonzero(np.concatenate([[True], periods[1:] != periods[:-1]]))
+    labels = pd.DatetimeIndex(periods[starts].start_time)
+    if index.tz is not None:
+        labels = labels.tz_localize(index.tz)
+    return _aggregate_runs(frame, starts, labels)
+
+
+def _aggregate_runs(frame, starts, labels):
+    ends = np.concatenate([starts[1:], [len(frame)]]) - 1
+    return pd.DataFrame({
+        'Open': frame['Open'].to_numpy(dtype=float)[starts],
+        # fmax/fmin skip NaN unless a whole bucket is missing
+        'High': np.fmax.reduceat(frame['High'].to_numpy(dtype=float), starts),
+        'Low': np.fmin.reduceat(frame['Low'].to_numpy(dtype=float), starts),
+        'Close': frame['Close'].to_numpy(dtype=float)[ends],
+        'Volume': np.add.reduceat(np.nan_to_num(frame['Volume'].to_numpy(dtype=float)), starts),
+    }, index=labels)
@@ -0,0 +1,292 @@
+"""
+Universe screener
+
+Evaluates a filter expression over a whole symbol universe at once. Daily bars for every
+symbol are stacked into a (symbols x bars) matrix, the indicator fields used by /stock-details
+are computed for all rows in one pass, and the expression is evaluated over those columns.
+
+Expressions use field names, numbers, comparisons, arithmetic, `and`/`or`/`not` and a few
+functions, e.g.:
+
+    rsi < 30
+    cross_above(ma50, ma200) and volume > avgVolume10d
+    cross_above(macd, macdSignal) or within(price, supportLevel, 2)
+
+They are parsed with `ast` and only the node types below are accepted, so nothing but the
+listed fields and functions can be reached.
+"""
+import ast
+import os
+
+import numpy as np
+
+from indicators import latest_indicators
+
+# 52-week range and support/resistance windows (bars), as in /stock-details
+YEAR_BARS = 252
+LEVEL_BARS = 20
+
+OHLCV = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+FIELDS = (
+    'price', 'open', 'high', 'low', 'volume', 'previousClose', 'dayChangePercent',
+    'ma50', 'ma200', 'rsi', 'macd', 'macdSignal',
+    'supportLevel', 'resistanceLevel', 'fiftyTwoWeekHigh', 'fiftyTwoWeekLow',
+    'weekChange', 'monthChange', 'avgVolume10d', 'bars',
+)
+
+
+class ScreenerError(ValueError):
+    """The filter or sort expression is invalid"""
+
+
+def load_universe(name, directory):
+    """
+    Symbols of a named universe file `<directory>/<name>.txt`
+    One symbol per line or comma-separated; `#` starts a comment.
+    """
+    if not name.replace('_', '').replace('-', '').isalnum():
+        raise ScreenerError(f"Invalid universe name '{name}'")
+    path = os.path.join(directory, f'{name}.txt')
+    if not os.path.exists(path):
+        available = sorted(f[:-4] for f in os.listdir(directory) if f.endswith('.txt')) if os.path.isdir(directory) else []
+        raise ScreenerError(f"Unknown universe '{name}'" + (f"; available: {', '.join(available)}" if available else ''))
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            for part in line.split('#', 1)[0].split(','):
+                symbol = part.strip().upper()
+                if symbol and symbol not in symbols:
+                    symbols.append(symbol)
+    return symbols
+
+
+def field_matrix(histories):
+    """
+    Screener fields for every symbol, as 1-D arrays aligned with `histories` order
+    Returns (current, previous): the fields at the last bar and at the bar before it.
+    """
+    frames = list(histories)
+    open_, high, low, close, volume = _stack_frames(frames)
+    counts = np.asarray([len(h) for h in frames], dtype=float)
+    return _fields_at(close, high, low, open_, volume, counts, 0), _fields_at(close, high, low, open_, volume, counts - 1, 1)
+
+
+def _stack_frames(frames):
+    """
+    Right-aligned (symbols x bars) Open/High/Low/Close/Volume matrices, NaN-padded on the left
+    like `stack_closes`; each frame is converted with one `to_numpy` call.
+    """
+    width = max((len(h) for h in frames), default=0)
+    cube = np.full((len(OHLCV), len(frames), width), np.nan)
+    for row, h in enumerate(frames):
+        if len(h):
+            # Stored bars already have exactly these columns; skip the (slow) column selection
+            values = h.to_numpy(dtype=float) if tuple(h.columns) == OHLCV else h[list(OHLCV)].to_numpy(dtype=float)
+            cube[:, row, width - len(h):] = values.T
+    return tuple(cube)
+
+
+def _fields_at(close, high, low, open_, volume, counts, back):
+    """Fields as of `back` bars before the end of each row"""
+    if back:
+        close, high, low, open_, volume = (m[:, :-back] for m in (close, high, low, open_, volume))
+    rows, width = close.shape
+    nan = np.full(rows, np.nan)
+    if width == 0:
+        return {name: nan for name in FIELDS}
+    latest = latest_indicators(close)
+
+    def change(bars):
+        # Same lookback as /stock-details: close[-1] vs close[-bars]
+        if width < bars:
+            return nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts >= bars, (close[:, -1] / close[:, -bars] - 1) * 100, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        previous = close[:, -2] if width > 1 else nan
+        fields = {
+            'price': close[:, -1],
+            'open': open_[:, -1],
+            'high': high[:, -1],
+            'low': low[:, -1],
+            'volume': volume[:, -1],
+            'previousClose': previous,
+            'dayChangePercent': (close[:, -1] / previous - 1) * 100,
+            'ma50': latest['ma50'],
+            'ma200': latest['ma200'],
+            'rsi': latest['rsi'],
+            'macd': latest['macd'],
+            'macdSignal': latest['signal'],
+            'supportLevel': _level(low, counts, lowest=True),
+            'resistanceLevel': _level(high, counts, lowest=False),
+            'fiftyTwoWeekHigh': _nan_reduce(np.fmax, high[:, -YEAR_BARS:]),
+            'fiftyTwoWeekLow': _nan_reduce(np.fmin, low[:, -YEAR_BARS:]),
+            'weekChange': change(5),
+            'monthChange': change(22),
+            'avgVolume10d': np.where(counts >= 10, np.nanmean(volume[:, -10:], axis=1), np.nan) if width >= 10 else nan,
+            'bars': counts,
+        }
+    return fields
+
+
+def _level(values, counts, lowest):
+    """Mean of the 3 lowest lows (support) or 3 highest highs (resistance) of the last LEVEL_BARS bars"""
+    rows, width = values.shape
+    if width < LEVEL_BARS:
+        return np.full(rows, np.nan)
+    window = values[:, -LEVEL_BARS:]
+    ordered = np.sort(np.where(np.isnan(window), np.inf if lowest else -np.inf, window), axis=1)
+    picked = ordered[:, :3] if lowest else ordered[:, -3:]
+    picked = np.where(np.isinf(picked), np.nan, picked)
+    with np.errstate(invalid='ignore'):
+        level = np.nanmean(picked, axis=1)
+    return np.where(counts >= LEVEL_BARS, level, np.nan)
+
+
+def _nan_reduce(ufunc, matrix):
+    if matrix.shape[1] == 0:
+        return np.full(matrix.shape[0], np.nan)
+    return ufunc.reduce(matrix, axis=1)
+
+
+class Expression:
+    """A parsed screener expression, evaluated over field arrays"""
+
+    _COMPARE = {
+        ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+        ast.GtE: np.greater_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+    }
+    _ARITHMETIC = {
+        ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide,
+    }
+    FUNCTIONS = ('abs', 'min', 'max', 'within', 'cross_above', 'cross_below')
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            tree = ast.parse(source, mode='eval')
+        except SyntaxError as e:
+            raise ScreenerError(f'Invalid expression: {e.msg}') from None
+        self._check(tree.body)
+        self.tree = tree.body
+
+    def _check(self, node):
+        if isinstance(node, ast.BoolOp) or isinstance(node, ast.Compare):
+            children = node.values if isinstance(node, ast.BoolOp) else [node.left] + node.comparators
+            if isinstance(node, ast.Compare) and not all(type(op) in self._COMPARE for op in node.ops):
+                raise ScreenerError('Unsupported comparison operator')
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, (ast.Not, ast.USub, ast.UAdd)):
+                raise ScreenerError('Unsupported unary operator')
+            children = [node.operand]
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in self._ARITHMETIC:
+                raise ScreenerError('Unsupported arithmetic operator')
+            children = [node.left, node.right]
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in self.FUNCTIONS or node.keywords:
+                raise ScreenerError(f"Unknown function; use one of {', '.join(self.FUNCTIONS)}")
+            expected = {'abs': 1, 'within': 3}.get(node.func.id, 2)
+            if len(node.args) != expected:
+                raise ScreenerError(f'{node.func.id}() takes {expected} arguments')
+            children = node.args
+        elif isinstance(node, ast.Name):
+            if node.id not in FIELDS:
+                raise ScreenerError(f"Unknown field '{node.id}'; use one of {', '.join(FIELDS)}")
+            children = []
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ScreenerError('Only numeric constants are allowed')
+            children = []
+        else:
+            raise ScreenerError(f'Unsupported syntax: {type(node).__name__}')
+        for child in children:
+            self._check(child)
+
+    def evaluate(self, current, previous=None):
+        """Evaluate over field arrays; `previous` holds the fields one bar earlier (for crossings)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._eval(self.tree, current, previous)
+
+    def _eval(self, node, env, previous):
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            return env[node.id]
+        if isinstance(node, ast.BoolOp):
+            values = [_truthy(self._eval(v, env, previous)) for v in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return combine.reduce(values)
+        if isinstance(node, ast.UnaryOp):
+            value = self._eval(node.operand, env, previous)
+            if isinstance(node.op, ast.Not):
+                return ~_truthy(value)
+            return -value if isinstance(node.op, ast.USub) else value
+        if isinstance(node, ast.BinOp):
+            return self._ARITHMETIC[type(node.op)](self._eval(node.left, env, previous), self._eval(node.right, env, previous))
+        if isinstance(node, ast.Compare):
+            left = self._eval(node.left, env, previous)
+            result = True
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self._eval(comparator, env, previous)
+                result = np.logical_and(result, self._COMPARE[type(op)](left, right))
+                left = right
+            return result
+        # ast.Call
+        name = node.func.id
+        if name in ('cross_above', 'cross_below'):
+            if previous is None:
+                raise ScreenerError(f'{name}() needs the previous bar')
+            a, b = (self._eval(arg, env, previous) for arg in node.args)
+            prev_a, prev_b = (self._eval(arg, previous, None) for arg in node.args)
+            if name == 'cross_above':
+                return (prev_a <= prev_b) & (a > b)
+            return (prev_a >= prev_b) & (a < b)
+        args = [self._eval(arg, env, previous) for arg in node.args]
+        if name == 'abs':
+            return np.abs(args[0])
+        if name == 'min':
+            return np.fmin(args[0], args[1])
+        if name == 'max':
+            return np.fmax(args[0], args[1])
+        # within(a, b, pct): a is within pct percent of b
+        return np.abs(args[0] / args[1] - 1) * 100 <= args[2]
+
+
+def _truthy(value):
+    value = np.asarray(value)
+    if value.dtype == bool:
+        return value
+    return np.nan_to_num(value.astype(float)) != 0
+
+
+def screen(symbols, histories, expression, sort=None, descending=False, limit=50):
+    """
+    Evaluate `expression` for every symbol with history and rank the matches by `sort`
+    Returns (matches, scanned) where matches are dicts of the symbol and all its fields.
+    """
+    names = [s for s in symbols if s in histories and not histories[s].empty]
+    if not names:
+        return [], 0
+    current, previous = field_matrix([histories[s] for s in names])
+    mask = np.broadcast_to(_truthy(expression.evaluate(current, previous)), (len(names),))
+    matched = np.flatnonzero(mask)
+
+    if sort is not None:
+        keys = np.broadcast_to(np.asarray(sort.evaluate(current, previous), dtype=float), (len(names),))[matched]
+        # NaN keys rank last in either direction
+        order = np.argsort(np.where(np.isnan(keys), np.inf, -keys if descending else keys), kind='stable')
+        matched = matched[order]
+    matched = matched[:limit]
+
+    matches = []
+    for rank, row in enumerate(matched, start=1):
+        item = {'symbol': names[row], 'rank': rank}
+        for name in FIELDS:
+            value = current[name][row]
+            if not np.isnan(value):
+                item[name] = int(value) if name == 'bars' else round(float(value), 2)
+        matches.append(item)
+    return matches, len(names)
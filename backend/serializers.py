@@ -0,0 +1,151 @@
+"""
+Column-wise serialization of OHLCV frames
+
+Prices are rounded and NaN handling is done once per column instead of once per cell.
+Responses can be rendered as:
+- json:     the original list of row objects (default)
+- columnar: JSON with parallel arrays under `data`
+- msgpack:  the columnar payload packed with MessagePack (optional `msgpack` package)
+- arrow:    an Arrow IPC stream; the rest of the payload travels as schema metadata (optional `pyarrow` package)
+"""
+import json
+
+import numpy as np
+from flask import Response, jsonify
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Optional dependency
+    pa = None
+
+FORMATS = ('json', 'columnar', 'msgpack', 'arrow')
+
+PRICE_COLUMNS = (('open', 'Open'), ('high', 'High'), ('low', 'Low'), ('close', 'Close'))
+
+
+def frame_columns(hist, intraday=False):
+    """
+    Convert an OHLCV frame into a dict of NumPy columns
+    Daily/historical frames get a `date` column; intraday frames get `time`, `timestamp`
+    and `gain` like the /chart-with-chat rows. Prices are rounded to 2 decimals; NaN marks missing values.
+    """
+    index = hist.index
+    # Exchange-local wall clock, formatted in bulk (much faster than DatetimeIndex.strftime)
+    wall = (index.tz_localize(None) if index.tz is not None else index).to_numpy()
+    empty = np.empty(0, dtype=object)
+    columns = {}
+    if intraday:
+        minutes = np.datetime_as_string(wall, unit='m')
+        columns['time'] = np.char.partition(minutes, 'T')[:, 2].astype(object) if len(wall) else empty
+        columns['timestamp'] = index.as_unit('ms').asi8.astype(np.int64)
+    else:
+        seconds = np.datetime_as_string(wall, unit='s')
+        columns['date'] = np.char.replace(seconds, 'T', ' ').astype(object) if len(wall) else empty
+
+    raw = {}
+    for name, source in PRICE_COLUMNS:
+        raw[name] = hist[source].to_numpy(dtype=float)
+        columns[name] = np.round(raw[name], 2)
+    columns['volume'] = hist['Volume'].to_numpy(dtype=float)
+
+    if intraday:
+        # Compare unrounded prices, like the original row loop
+        gain = (raw['close'] > raw['open']).astype(object)
+        gain[np.isnan(raw['close']) | np.isnan(raw['open'])] = None
+        columns['gain'] = gain
+    return columns
+
+
+def rows_to_columns(rows):
+    """Convert a list of row dicts (e.g. mock data) into the column layout used by `frame_columns`"""
+    if not rows:
+        return {}
+    columns = {}
+    for key in rows[0]:
+        values = [row.get(key) for row in rows]
+        if key in ('time', 'date', 'gain'):
+            columns[key] = np.asarray(values, dtype=object)
+        elif key == 'timestamp':
+            columns[key] = np.asarray(values, dtype=np.int64)
+        else:
+            columns[key] = np.asarray([np.nan if v is None else v for v in values], dtype=float)
+    return columns
+
+
+def _to_list(name, values):
+    """Column as a JSON-ready list: NaN becomes None, volumes become ints"""
+    if values.dtype == object or name == 'timestamp':
+        return values.tolist()
+    missing = np.isnan(values)
+    if name == 'volume':
+        out = np.where(missing, 0, values).astype(np.int64).astype(object)
+    else:
+        out = values.astype(object)
+    if missing.any():
+        out[missing] = None
+    return out.tolist()
+
+
+def columns_to_lists(columns):
+    return {name: _to_list(name, values) for name, values in columns.items()}
+
+
+def columns_to_records(columns):
+    """Column dict back to the original list-of-row-objects shape"""
+    lists = columns_to_lists(columns)
+    names = list(lists)
+    return [dict(zip(names, values)) for values in zip(*lists.values())]
+
+
+def requested_format(args):
+    """Return (fmt, error_response) for the `format` query parameter"""
+    fmt = args.get('format', 'json').lower()
+    if fmt not in FORMATS:
+        return None, (jsonify({'error': f"Unsupported format '{fmt}'; use one of {', '.join(FORMATS)}"}), 400)
+    if fmt == 'msgpack' and msgpack is None:
+        return None, (jsonify({'error': 'format=msgpack requires the msgpack package'}), 501)
+    if fmt == 'arrow' and pa is None:
+        return None, (jsonify({'error': 'format=arrow requires the pyarrow package'}), 501)
+    return fmt, None
+
+
+def data_response(payload, columns, fmt='json'):
+    """Render `payload` with `columns` as its `data` field in the requested format"""
+    if fmt == 'json':
+        return jsonify({**payload, 'data': columns_to_records(columns)})
+    if fmt == 'columnar':
+        return jsonify({**payload, 'format': 'columnar', 'data': columns_to_lists(columns)})
+    if fmt == 'msgpack':
+        body = msgpack.packb({**payload, 'format': 'columnar', 'data': columns_to_lists(columns)}, use_bin_type=True)
+        return Response(body, mimetype='application/msgpack')
+    if fmt == 'arrow':
+        return Response(_arrow_stream(payload, columns), mimetype='application/vnd.apache.arrow.stream')
+    raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _arrow_stream(payload, columns):
+    arrays = []
+    names = []
+    for name, values in columns.items():
+        if name == 'timestamp':
+            array = pa.array(values, type=pa.timestamp('ms', tz='UTC'))
+        elif values.dtype == object:
+            array = pa.array(values.tolist())
+        elif name == 'volume':
+            missing = np.isnan(values)
+            array = pa.array(np.where(missing, 0, values).astype(np.int64), mask=missing)
+        else:
+            array = pa.array(values, mask=np.isnan(values))
+        arrays.append(array)
+        names.append(name)
+    table = pa.Table.from_arrays(arrays, names=names)
+    table = table.replace_schema_metadata({'payload': json.dumps(payload, default=str)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
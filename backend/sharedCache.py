@@ -0,0 +1,187 @@
+"""
+Cache tier shared by the worker processes of one deployment
+
+Each gunicorn worker keeps its own `QuoteCache`; without a shared tier every worker fetches the
+same symbols from the upstream independently. With `SHARED_CACHE` set, a worker that misses
+locally looks in the shared store first, and only one worker at a time fetches a given key: the
+others wait on a cross-process lock and then read what it stored.
+
+- `SHARED_CACHE=/dev/shm/stock-api` (or `file:///...`): one file per key in a directory, written
+  atomically, with `fcntl` locks. Put it on tmpfs (`/dev/shm`) for shared-memory speed.
+- `SHARED_CACHE=redis://localhost:6379/0`: Redis or any server speaking its protocol (requires
+  the `redis` package), e.g. for workers spread over several hosts.
+
+Values are pickled, so the store must only be writable by the service itself.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the file store then works without cross-process locks
+    fcntl = None
+
+
+class FileSharedStore:
+    """
+    Shared entries as files under `directory`; the file's mtime holds its expiry time
+    `lock_timeout` is how long a lock file may go unused (or a temporary file unfinished) before
+    `purge` treats it as left behind.
+    """
+
+    def __init__(self, directory, purge_every=500, lock_timeout=15.0):
+        self.directory = directory
+        self.purge_every = purge_every
+        self.lock_timeout = lock_timeout
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, hashlib.sha1(name.encode()).hexdigest() + suffix)
+
+    def get(self, name, max_age=None):
+        """(value, age in seconds) if `name` is stored, unexpired and younger than `max_age`, else None"""
+        path = self._path(name, '.pkl')
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_mtime < time.time():
+                    return None
+                stored_at, value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        age = max(0.0, time.time() - stored_at)
+        if max_age is not None and age >= max_age:
+            return None
+        return value, age
+
+    def set(self, name, value, ttl):
+        path = self._path(name, '.pkl')
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((time.time(), value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            expires = time.time() + ttl
+            os.utime(tmp, (expires, expires))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge()
+
+    def purge(self):
+        """Delete expired entries, lock files of keys no longer stored, and files left by crashed writers"""
+        now = time.time()
+        entries = list(os.scandir(self.directory))
+        for entry in entries:
+            try:
+                if entry.name.endswith('.pkl'):
+                    if entry.stat().st_mtime < now:
+                        os.unlink(entry.path)
+                elif entry.name.endswith('.tmp'):
+                    # A writer sets the expiry as mtime just before the rename, so go by the status change time
+                    if entry.stat().st_ctime < now - self.lock_timeout:
+                        os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+        for entry in entries:
+            if entry.name.endswith('.lock') and not os.path.exists(entry.path[:-len('.lock')] + '.pkl'):
+                try:
+                    if entry.stat().st_mtime < now - self.lock_timeout:
+                        self._remove_lock(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _remove_lock(self, path):
+        # Only unlink a lock nobody holds; a process that opened it just before still locks a valid,
+        # if orphaned, file, which at worst lets one extra fetch run alongside
+        if fcntl is None:
+            os.unlink(path)
+            return
+        with open(path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            os.unlink(path)
+
+    def acquire(self, name, timeout):
+        """Take the fetch lock for `name`, waiting up to `timeout` seconds; returns a handle or None"""
+        if fcntl is None:
+            return None
+        f = open(self._path(name, '.lock'), 'a')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.utime(f.fileno())  # Marks the lock as in use for `purge`
+                return f
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    f.close()
+                    return None
+                time.sleep(0.005)
+
+    def release(self, handle):
+        # Closing the file drops the lock; a worker that dies while holding it releases it the same way
+        handle.close()
+
+
+class RedisSharedStore:
+    """Shared entries in Redis; locks are keys set with NX and an expiry, so a dead holder cannot block others"""
+
+    # Delete the lock only if it is still ours (it may have expired and been taken by another worker)
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url, prefix='stock-api:', lock_ttl=30.0):
+        try:
+            import redis  # Optional dependency, only imported when configured
+        except ImportError:
+            raise RuntimeError('SHARED_CACHE=redis://... requires the redis package') from None
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self._release = self.client.register_script(self._RELEASE)
+
+    def get(self, name, max_age=None):
+        raw = self.client.get(self.prefix + name)
+        if raw is None:
+            return None
+        stored_at, value = pickle.loads(raw)
+        age = max(0.0, time.time() - stored_at)
+        if max_age is not None and age >= max_age:
+            return None
+        return value, age
+
+    def set(self, name, value, ttl):
+        raw = pickle.dumps((time.time(), value), protocol=pickle.HIGHEST_PROTOCOL)
+        self.client.set(self.prefix + name, raw, px=max(1, int(ttl * 1000)))
+
+    def acquire(self, name, timeout):
+        key = f'{self.prefix}lock:{name}'
+        token = os.urandom(16).hex()
+        deadline = time.monotonic() + timeout
+        while not self.client.set(key, token, nx=True, px=int(self.lock_ttl * 1000)):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.01)
+        return key, token
+
+    def release(self, handle):
+        key, token = handle
+        self._release(keys=[key], args=[token])
+
+
+def create_shared_store(url, lock_timeout=15.0):
+    """The store for a `SHARED_CACHE` value, or None when it is empty"""
+    if not url:
+        return None
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSharedStore(url)
+    if url.startswith('file://'):
+        url = url[len('file://'):]
+    return FileSharedStore(url, lock_timeout=lock_timeout)
@@ -0,0 +1,107 @@
+"""
+Warm state snapshot for fast restarts
+
+On graceful shutdown the contents of the in-process caches (`info`, history, indicators) and the
+watchlist warmer's payloads are pickled to one file; on boot they are restored, so a new worker
+answers the symbols its predecessor had cached from memory instead of going upstream first.
+Ages carry over (including the time the service was down), so restored entries expire exactly as
+they would have, and a snapshot older than `max_age` is ignored.
+
+Under gunicorn with `preload_app` the snapshot is restored once in the master before the workers
+fork, so every worker starts warm. Every worker saves into the same file as it exits: under a lock,
+each merges its entries into what the others saved (newest copy of a key wins) rather than
+replacing them. Like the shared cache, the file must only be writable by the service.
+"""
+import os
+import pickle
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; concurrent savers may then drop each other's entries
+    fcntl = None
+
+FORMAT_VERSION = 1
+
+
+def save_state(path, caches, warmer=None, max_age=3600.0):
+    """
+    Merge the caches (and warmer payloads) into the snapshot at `path` and write it atomically
+    Entries another process saved less than `max_age` seconds ago are kept unless this one holds a
+    newer copy of the key. Returns the number of entries written.
+    """
+    state = {
+        'version': FORMAT_VERSION,
+        'savedAt': time.time(),
+        'caches': {cache.name: cache.export() for cache in caches},
+        'warmer': warmer.export() if warmer is not None else {},
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # Released when the file closes
+        previous = _load(path, max_age, quiet=True)
+        if previous is not None:
+            _merge(state, previous)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    return sum(len(entries) for entries in state['caches'].values()) + len(state['warmer'])
+
+
+def _merge(state, previous):
+    """Add the entries of an older snapshot `previous` to `state`, keeping the newer copy of each key"""
+    elapsed = max(0.0, state['savedAt'] - previous['savedAt'])
+    for name, entries in previous['caches'].items():
+        newest = {key: (key, value, age + elapsed) for key, value, age in entries}
+        for key, value, age in state['caches'].get(name, ()):
+            if key not in newest or age <= newest[key][2]:
+                newest[key] = (key, value, age)
+        # `export` order: least recently used (here: oldest) first
+        state['caches'][name] = sorted(newest.values(), key=lambda entry: -entry[2])
+    for key, (payload, built_at) in previous.get('warmer', {}).items():
+        if key not in state['warmer'] or state['warmer'][key][1] < built_at:
+            state['warmer'][key] = (payload, built_at)
+
+
+def _load(path, max_age, quiet=False):
+    """The snapshot saved at `path`, or None if it is missing, unreadable or older than `max_age`"""
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # A truncated or incompatible snapshot only costs a cold start
+        print(f"Ignoring unreadable snapshot {path}: {str(e)}")
+        return None
+    if not isinstance(state, dict) or state.get('version') != FORMAT_VERSION:
+        print(f"Ignoring snapshot {path} with an unknown format")
+        return None
+    downtime = max(0.0, time.time() - state['savedAt'])
+    if downtime > max_age:
+        if not quiet:
+            print(f"Ignoring snapshot {path} saved {downtime:.0f}s ago")
+        return None
+    return state
+
+
+def restore_state(path, caches, warmer=None, max_age=3600.0):
+    """Restore the state saved at `path` into `caches` and `warmer`; returns the number of entries restored"""
+    state = _load(path, max_age)
+    if state is None:
+        return 0
+    downtime = max(0.0, time.time() - state['savedAt'])
+    restored = 0
+    for cache in caches:
+        restored += cache.restore(state['caches'].get(cache.name, ()), downtime)
+    if warmer is not None:
+        restored += warmer.restore(state.get('warmer', {}))
+    return restored
@@ -0,0 +1,226 @@
+"""
+Server-push fan-out of live intraday bars
+
+One `SymbolPoller` thread per (symbol, interval) polls the upstream and pushes only what
+changed to every subscriber: new or updated bars and the insight fields whose values moved.
+MA50/MA200, RSI and MACD over the session's bars are kept in an `IndicatorState`, so a poll that
+appends a bar or revises the forming one updates them in O(1) instead of recomputing the series.
+Upstream load therefore grows with the number of distinct symbols, not with viewers.
+A poller stops once its last subscriber leaves.
+"""
+import math
+import queue
+import threading
+import time
+
+from indicators import IndicatorState
+
+# Decimals for streamed indicator values, as in /stock-details
+INDICATOR_DECIMALS = {'ma50': 2, 'ma200': 2, 'rsi': 2, 'macd': 3, 'signal': 3}
+
+
+class Subscription:
+    """A client's event queue; a subscriber that falls behind is resynced with a snapshot"""
+
+    def __init__(self, poller, maxsize=256):
+        self.poller = poller
+        self.events = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        return self.events.get(timeout=timeout)
+
+    def push(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # Deltas were lost; drop the backlog and start this client over from a snapshot
+            with self.events.mutex:
+                self.events.queue.clear()
+            self.events.put_nowait(self.poller.snapshot())
+
+    def push_locked(self, event):
+        """`push` for a caller already holding the poller's lock (a fresh queue cannot be full)"""
+        self.events.put_nowait(event)
+
+
+class SymbolPoller(threading.Thread):
+    """Polls one (symbol, interval) series and broadcasts deltas to its subscribers"""
+
+    def __init__(self, hub, symbol, interval):
+        super().__init__(name=f'poller-{symbol}-{interval}', daemon=True)
+        self.hub = hub
+        self.symbol = symbol
+        self.interval = interval
+        self.subscribers = set()
+        self.pending = 0
+        self.bars = {}
+        self.insights = {}
+        self.indicators = {}
+        self.polls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._ready = threading.Event()
+        self._state = None
+        self._state_ts = None  # Timestamp of the last bar applied to `_state`
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot_locked()
+
+    def _snapshot_locked(self):
+        return {
+            'type': 'snapshot',
+            'symbol': self.symbol,
+            'interval': self.interval,
+            'data': [self.bars[ts] for ts in sorted(self.bars)],
+            'insights': dict(self.insights),
+            'indicators': dict(self.indicators),
+            'timestamp': time.time(),
+        }
+
+    def join_subscriber(self, subscription):
+        """Queue a snapshot for `subscription`, then register it for deltas, atomically with respect to polls"""
+        with self._lock:
+            subscription.push_locked(self._snapshot_locked())
+            self.subscribers.add(subscription)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._poll()
+            except Exception as e:
+                self.errors += 1
+                print(f"Error polling live bars for {self.symbol}: {str(e)}")
+            self._ready.set()
+            self._stop_event.wait(self.hub.poll_interval)
+
+    def _poll(self):
+        rows = self.hub.fetch_rows(self.symbol, self.interval)
+        self.polls += 1
+        with self._lock:
+            changed = [row for row in rows if self.bars.get(row['timestamp']) != row]
+            if not changed and self.bars:
+                return
+            for row in changed:
+                self.bars[row['timestamp']] = row
+            # A new session replaces yesterday's bars
+            dropped = False
+            if rows:
+                first = rows[0]['timestamp']
+                for ts in [ts for ts in self.bars if ts < first]:
+                    del self.bars[ts]
+                    dropped = True
+            insights = self.hub.insights(rows)
+            insight_changes = {k: v for k, v in insights.items() if self.insights.get(k) != v}
+            self.insights = insights
+            indicators = self._update_indicators(changed, rebuild=dropped)
+            indicator_changes = {k: v for k, v in indicators.items() if self.indicators.get(k) != v}
+            self.indicators = indicators
+            event = {
+                'type': 'bars',
+                'symbol': self.symbol,
+                'interval': self.interval,
+                'bars': changed,
+                'insights': insight_changes,
+                'indicators': indicator_changes,
+                'timestamp': time.time(),
+            }
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def _update_indicators(self, changed, rebuild=False):
+        """
+        Apply `changed` bars to the indicator state and return the rounded latest values
+        Bars after the last one applied are appended and a revision of that bar replaces it; anything
+        else (the first poll, a new session, a revised older bar) rebuilds the state from all bars.
+        """
+        changed = sorted(changed, key=lambda row: row['timestamp'])
+        stale = self._state_ts is not None and any(row['timestamp'] < self._state_ts for row in changed)
+        if self._state is None or rebuild or stale:
+            self._state, self._state_ts = IndicatorState(), None
+            changed = [self.bars[ts] for ts in sorted(self.bars)]
+        for row in changed:
+            close = _close(row)
+            if close is None:
+                continue
+            self._state.update(close, replace=row['timestamp'] == self._state_ts)
+            self._state_ts = row['timestamp']
+        return {
+            name: None if value is None else round(value, INDICATOR_DECIMALS[name])
+            for name, value in self._state.latest().items()
+        }
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def _close(row):
+    close = row.get('close')
+    if close is None or math.isnan(close):
+        return None
+    return float(close)
+
+
+class LiveBarHub:
+    """
+    Registry of shared pollers
+    `fetch_rows(symbol, interval)` returns the current session's bars as /chart-with-chat rows;
+    `insights(rows)` computes the insight dict for them.
+    """
+
+    def __init__(self, fetch_rows, insights, poll_interval=15.0):
+        self.fetch_rows = fetch_rows
+        self.insights = insights
+        self.poll_interval = poll_interval
+        self._pollers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, symbol, interval, first_poll_timeout=10.0):
+        """
+        Join (or start) the poller for a series; the first event queued is a full snapshot
+        The subscriber only receives deltas from polls after that snapshot, so it never sees
+        `bars` before `snapshot`.
+        """
+        with self._lock:
+            poller = self._pollers.get((symbol, interval))
+            if poller is None:
+                poller = self._pollers[(symbol, interval)] = SymbolPoller(self, symbol, interval)
+                poller.start()
+            subscription = Subscription(poller)
+            # Counted as a subscriber while it waits, so `unsubscribe` of another client cannot stop the poller
+            poller.pending += 1
+        poller._ready.wait(first_poll_timeout)
+        with self._lock:
+            poller.pending -= 1
+            poller.join_subscriber(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        poller = subscription.poller
+        with self._lock:
+            with poller._lock:
+                poller.subscribers.discard(subscription)
+                idle = not poller.subscribers and not poller.pending
+            if idle and self._pollers.get((poller.symbol, poller.interval)) is poller:
+                del self._pollers[(poller.symbol, poller.interval)]
+                poller.stop()
+
+    def stats(self):
+        with self._lock:
+            pollers = list(self._pollers.values())
+        return {
+            'pollers': len(pollers),
+            'subscribers': sum(len(p.subscribers) for p in pollers),
+            'series': [
+                {
+                    'symbol': p.symbol,
+                    'interval': p.interval,
+                    'subscribers': len(p.subscribers),
+                    'polls': p.polls,
+                    'errors': p.errors,
+                }
+                for p in pollers
+            ],
+        }
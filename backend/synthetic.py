@@ -0,0 +1,257 @@
+"""
+Deterministic synthetic market data
+
+Vectorized NumPy generator for OHLCV bars of any symbol, interval and period, used by the
+replay provider, the benchmark and the mock fallbacks. Prices follow a geometric Brownian
+motion that mean-reverts slowly around a per-symbol base price, with volatility and volume
+regimes that switch every few weeks. Intraday bars bridge each session from its open to its
+close and carry a U-shaped volume profile.
+
+Every random draw is a hash of (seed, symbol, timestamp) rather than a step of a sequential
+RNG, so output is reproducible and a bar is identical in every window that contains it:
+generating one year and then the last month returns the same last month.
+
+    python synthetic.py    # generation throughput check
+"""
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from barStore import interval_seconds, is_intraday, period_start, slice_period
+from resample import CALENDAR_INTERVALS, resample_calendar, session_for
+
+# Index levels so mocks for well-known indices look plausible; other symbols get a hashed base price
+BASE_PRICES = {
+    'NIFTY': 25000.0, 'NIFTY.NS': 25000.0, '^NSEI': 25000.0,
+    'BANKNIFTY': 52000.0, 'BANKNIFTY.NS': 52000.0, '^NSEBANK': 52000.0,
+}
+
+DAILY_VOLATILITY = 0.015
+ANNUAL_DRIFT = 0.06
+REGIME_DAYS = 21
+MEAN_REVERSION_DAYS = 500
+# Volatility multipliers of the calm, normal and stressed regimes and the share of time in each
+VOLATILITY_REGIMES = (0.6, 1.0, 2.0)
+REGIME_SHARES = (0.25, 0.55, 0.20)
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def symbol_seed(symbol):
+    return zlib.crc32(symbol.upper().encode())
+
+
+def base_price(symbol):
+    return BASE_PRICES.get(symbol.upper(), 50.0 + symbol_seed(symbol) % 450)
+
+
+def hash_uniform(keys, salt):
+    """Uniform [0, 1) values from uint64 keys (splitmix64 finalizer)"""
+    with np.errstate(over='ignore'):
+        z = keys + _GOLDEN * np.uint64(salt)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def hash_normal(keys, salt):
+    """Standard normal values from uint64 keys (Box-Muller over two hashed uniforms)"""
+    u1 = hash_uniform(keys, salt)
+    u2 = hash_uniform(keys, salt + 0x5151)
+    return np.sqrt(-2.0 * np.log1p(-u1)) * np.cos(2.0 * np.pi * u2)
+
+
+def _keys(values, symbol, seed):
+    """Mix per-bar integers (day numbers or timestamps) with the symbol and seed into hash keys"""
+    with np.errstate(over='ignore'):
+        mix = np.uint64(symbol_seed(symbol)) * _GOLDEN + np.uint64(seed)
+        return np.asarray(values).astype(np.uint64) * np.uint64(0xD6E8FEB86659FD93) ^ mix
+
+
+def daily_path(symbol, horizon, seed=0):
+    """
+    Per-day model state for epoch days [0, horizon)
+    Returns (close, sigma, volume) arrays: the close price, that day's volatility and its volume.
+    """
+    days = np.arange(horizon)
+    keys = _keys(days, symbol, seed)
+
+    # Regimes switch every REGIME_DAYS sessions; volume rises with volatility
+    block_keys = _keys(days // REGIME_DAYS, symbol, seed)
+    u = hash_uniform(block_keys, 10)
+    thresholds = np.cumsum(REGIME_SHARES)[:-1]
+    sigma = DAILY_VOLATILITY * np.asarray(VOLATILITY_REGIMES)[np.searchsorted(thresholds, u, side='right')]
+    volume_regime = (sigma / DAILY_VOLATILITY) ** 0.7 * np.exp(0.3 * hash_normal(block_keys, 11))
+
+    # GBM log returns, then remove the slow trend so prices stay in a band around the base price
+    returns = (ANNUAL_DRIFT / 252 - 0.5 * sigma ** 2) + sigma * hash_normal(keys, 1)
+    walk = np.cumsum(returns)
+    window = min(MEAN_REVERSION_DAYS, horizon)
+    csum = np.concatenate([[0.0], np.cumsum(walk)])
+    trend = (csum[window:] - csum[:-window]) / window
+    walk[window - 1:] -= trend
+    walk[:window - 1] -= walk[:window - 1].mean() if window > 1 else 0.0
+    close = base_price(symbol) * np.exp(walk)
+
+    base_volume = 1_000_000 + hash_uniform(np.asarray([symbol_seed(symbol)], dtype=np.uint64), 12)[0] * 9_000_000
+    volume = base_volume * volume_regime * np.exp(0.25 * hash_normal(keys, 2)) * (1 + 10 * np.abs(returns))
+    return close, sigma, volume
+
+
+def _session_days(start, end, tz):
+    """Business days (tz-aware midnights) from the day of `start` through the day of `end`"""
+    return pd.bdate_range(start.tz_convert(tz).normalize(), end.tz_convert(tz).normalize(), tz=tz)
+
+
+def _epoch_days(days):
+    return days.tz_localize(None).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def generate_bars(symbol, interval='1d', start=None, end=None, seed=0):
+    """
+    Synthetic OHLCV frame for `symbol` over [start, end), indexed in exchange-local time
+    `start`/`end` default to 20 years ago and now. Intraday bars fall on weekday regular sessions.
+    """
+    session = session_for(symbol)
+    tz = session.tz
+    end = _utc(end) if end is not None else pd.Timestamp.now(tz='UTC')
+    start = _utc(start) if start is not None else end - pd.DateOffset(years=20)
+    # Day numbers index the daily path, which starts at the epoch (plus one day for the first open)
+    start = max(start, pd.Timestamp('1970-01-02', tz='UTC'))
+    if start >= end:
+        return empty_frame(tz)
+
+    days = _session_days(start, end, tz)
+    if not len(days):
+        return empty_frame(tz)
+    day_numbers = _epoch_days(days)
+    closes, sigmas, volumes = daily_path(symbol, int(day_numbers.max()) + 1, seed)
+
+    if interval in CALENDAR_INTERVALS:
+        frame = _daily_frame(symbol, days, day_numbers, closes, sigmas, volumes, seed)
+        frame = resample_calendar(frame, CALENDAR_INTERVALS[interval])
+    elif is_intraday(interval):
+        frame = _intraday_frame(symbol, interval, session, days, day_numbers, closes, sigmas, volumes, seed)
+    else:
+        frame = _daily_frame(symbol, days, day_numbers, closes, sigmas, volumes, seed)
+    return frame[(frame.index >= start) & (frame.index < end)]
+
+
+def generate_period(symbol, period='1mo', interval='1d', seed=0, now=None):
+    """Synthetic bars covering what the upstream would return for `period`"""
+    now = now or pd.Timestamp.now(tz='UTC')
+    frame = generate_bars(symbol, interval, start=period_start(period, now), end=now, seed=seed)
+    return slice_period(frame, period, now)
+
+
+def generate_universe(symbols, interval='1d', start=None, end=None, seed=0):
+    """Frame with (symbol, field) columns for many symbols, shaped like a multi-ticker download"""
+    frames = {symbol: generate_bars(symbol, interval, start, end, seed) for symbol in symbols}
+    frames = {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1)
+
+
+def _daily_open(symbol, day_numbers, closes, sigmas, seed):
+    """Previous close plus a small overnight gap"""
+    keys = _keys(day_numbers, symbol, seed)
+    return closes[day_numbers - 1] * np.exp(0.2 * sigmas[day_numbers] * hash_normal(keys, 3))
+
+
+def _daily_frame(symbol, days, day_numbers, closes, sigmas, volumes, seed):
+    keys = _keys(day_numbers, symbol, seed)
+    open_ = _daily_open(symbol, day_numbers, closes, sigmas, seed)
+    close = closes[day_numbers]
+    sigma = sigmas[day_numbers]
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * np.exp(0.5 * sigma * np.abs(hash_normal(keys, 4))),
+        'Low': np.minimum(open_, close) * np.exp(-0.5 * sigma * np.abs(hash_normal(keys, 5))),
+        'Close': close,
+        'Volume': np.floor(volumes[day_numbers]),
+    }, index=days)
+
+
+def _intraday_frame(symbol, interval, session, days, day_numbers, closes, sigmas, volumes, seed):
+    step = interval_seconds(interval)
+    # A session that is not a whole number of bars ends with a partial bar, as on the exchange
+    per_day = max(1, -(-session.length_minutes * 60 // step))
+    offsets = (session.open_minutes * 60 + np.arange(per_day) * step).astype('timedelta64[s]')
+    wall = days.tz_localize(None).to_numpy()[:, None] + offsets[None, :]
+    index = pd.DatetimeIndex(wall.ravel()).tz_localize(session.tz)
+    keys = _keys(index.as_unit('ns').asi8, symbol, seed).reshape(len(days), per_day)
+
+    day_open = _daily_open(symbol, day_numbers, closes, sigmas, seed)
+    day_close = closes[day_numbers]
+    bar_sigma = sigmas[day_numbers][:, None] / np.sqrt(per_day)
+
+    # Brownian bridge from the session open to its close
+    path = np.cumsum(bar_sigma * hash_normal(keys, 6), axis=1)
+    fraction = np.arange(1, per_day + 1)[None, :] / per_day
+    path += fraction * (np.log(day_close / day_open)[:, None] - path[:, -1:])
+    close = day_open[:, None] * np.exp(path)
+    open_ = np.concatenate([day_open[:, None], close[:, :-1]], axis=1)
+
+    # U-shaped intraday volume: heavier at the open and the close
+    profile = 1.0 + 1.5 * (2.0 * (np.arange(per_day) + 0.5) / per_day - 1.0) ** 2
+    profile /= profile.sum()
+    moves = np.abs(np.log(close / open_)) / bar_sigma
+    volume = volumes[day_numbers][:, None] * profile[None, :] * np.exp(0.3 * hash_normal(keys, 7)) * (1 + 0.1 * moves)
+
+    return pd.DataFrame({
+        'Open': open_.ravel(),
+        'High': (np.maximum(open_, close) * np.exp(0.5 * bar_sigma * np.abs(hash_normal(keys, 8)))).ravel(),
+        'Low': (np.minimum(open_, close) * np.exp(-0.5 * bar_sigma * np.abs(hash_normal(keys, 9)))).ravel(),
+        'Close': close.ravel(),
+        'Volume': np.floor(volume).ravel(),
+    }, index=index)
+
+
+def synthetic_info(symbol, daily, rng):
+    """An `info` dict consistent with the synthetic daily bars"""
+    last = float(daily['Close'].iloc[-1]) if len(daily) else 100.0
+    previous = float(daily['Close'].iloc[-2]) if len(daily) > 1 else last
+    return {
+        'symbol': symbol,
+        'shortName': f'{symbol} Stock',
+        'longName': f'{symbol} Inc.',
+        'sector': 'Technology',
+        'industry': 'Software',
+        'regularMarketPrice': round(last, 2),
+        'regularMarketOpen': round(float(daily['Open'].iloc[-1]), 2) if len(daily) else last,
+        'regularMarketPreviousClose': round(previous, 2),
+        'regularMarketDayHigh': round(float(daily['High'].iloc[-1]), 2) if len(daily) else last,
+        'regularMarketDayLow': round(float(daily['Low'].iloc[-1]), 2) if len(daily) else last,
+        'regularMarketVolume': int(daily['Volume'].iloc[-1]) if len(daily) else 0,
+        'fiftyTwoWeekHigh': round(float(daily['High'].max()), 2) if len(daily) else last,
+        'fiftyTwoWeekLow': round(float(daily['Low'].min()), 2) if len(daily) else last,
+        'marketCap': int(last * rng.integers(100_000_000, 10_000_000_000)),
+        'trailingPE': round(float(rng.uniform(10, 40)), 2),
+        'beta': round(float(rng.uniform(0.5, 1.8)), 2),
+        'dividendYield': round(float(rng.uniform(0, 0.03)), 4),
+    }
+
+
+def empty_frame(tz):
+    return pd.DataFrame(
+        {column: np.empty(0) for column in ('Open', 'High', 'Low', 'Close', 'Volume')},
+        index=pd.DatetimeIndex([], tz=tz),
+    )
+
+
+def _utc(value):
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
+
+
+if __name__ == '__main__':
+    for interval, years in (('1d', 20), ('30m', 5), ('1m', 5)):
+        started = time.perf_counter()
+        end = pd.Timestamp.now(tz='UTC')
+        frame = generate_bars('AAPL', interval, start=end - pd.DateOffset(years=years), end=end)
+        elapsed = time.perf_counter() - started
+        print(f"{interval:>4} x {years:>2}y: {len(frame):>9,} bars in {elapsed:.3f}s ({len(frame) / elapsed:,.0f} bars/s)")
@@ -0,0 +1,312 @@
+"""
+Bounded execution of blocking upstream (Yahoo Finance) calls
+
+All upstream calls run on one shared pool, so at most `concurrency` of them are in flight
+per process no matter how many requests are waiting. Each caller waits at most `timeout`
+seconds; a call that has not started by then is cancelled so it never reaches the upstream,
+and a call that is already running finishes in the background without holding the request.
+When more than `max_queue` calls are waiting, new ones are rejected immediately instead of
+piling up behind a slow upstream.
+
+The pool also remembers the outcome of recent calls so `/health` can report whether the
+upstream is currently reachable without probing it.
+
+Two guards run before a call is queued:
+- `CircuitBreaker`: after `threshold` consecutive upstream failures (timeouts, transport errors,
+  throttling, HTTP 5xx; not errors about the request such as an unknown symbol) the circuit opens and calls fail
+  immediately with `UpstreamUnavailable` for `cooldown` seconds; then one probe call is let
+  through (half-open) and its outcome closes or re-opens the circuit.
+- `AdaptiveRateLimiter`: a token bucket whose rate is halved when the upstream throttles or
+  times out and grows back additively with each success (AIMD), so the service backs off
+  before Yahoo starts rejecting it. A call that would wait longer than `max_wait` for a token
+  is rejected with `UpstreamBusy`.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class UpstreamTimeout(Exception):
+    """The upstream did not answer within the per-call timeout"""
+
+
+class UpstreamBusy(Exception):
+    """Too many upstream calls are already queued, or the rate limit would make this one wait too long"""
+
+
+class UpstreamUnavailable(Exception):
+    """The circuit is open: the upstream failed repeatedly and is not being called for now"""
+
+
+def is_throttling(error):
+    """True for errors that mean the upstream wants fewer requests (HTTP 429, rate limits, timeouts)"""
+    if isinstance(error, UpstreamTimeout):
+        return True
+    text = f'{type(error).__name__} {error}'.lower()
+    return '429' in text or 'too many requests' in text or 'rate limit' in text or 'ratelimit' in text
+
+
+# "HTTP Error 503", "status code 502", ... in errors that carry no response object
+_SERVER_ERROR_TEXT = re.compile(r'\b(?:http(?: error)?|status(?: code)?)\W{0,2}5\d\d\b')
+
+
+def _status_code(error):
+    response = getattr(error, 'response', None)
+    for source, name in ((response, 'status_code'), (error, 'status_code'), (error, 'code')):
+        status = getattr(source, name, None) if source is not None else None
+        if isinstance(status, int) and 100 <= status < 600:
+            return status
+    return None
+
+
+def is_upstream_failure(error):
+    """
+    True for errors that say the upstream itself is unwell: timeouts, transport errors (refused or
+    reset connections, DNS, TLS), throttling and HTTP 5xx. Errors about the request, such as an
+    unknown symbol (404) or a series with no data, are not and leave the circuit breaker alone.
+    """
+    if isinstance(error, (UpstreamTimeout, ConnectionError, TimeoutError)) or is_throttling(error):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500
+    if _SERVER_ERROR_TEXT.search(str(error).lower()):
+        return True
+    # requests and curl_cffi transport errors derive from OSError
+    return isinstance(error, OSError)
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures; open -> half-open after `cooldown` seconds"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self.short_circuited = 0
+        self._probing = False
+
+    def before_call(self):
+        """Raise UpstreamUnavailable unless a call may go out now"""
+        with self._lock:
+            if self.state == self.CLOSED or self.threshold <= 0:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                # Exactly one probe at a time; everyone else keeps failing fast
+                self._probing = True
+                return
+            self.short_circuited += 1
+            retry = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            raise UpstreamUnavailable(f'Upstream circuit open after {self.failures} failures; retry in {retry:.0f}s')
+
+    def release(self):
+        """Give back a probe slot taken by `before_call` for a call that never reached the upstream"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.threshold > 0 and self.failures >= self.threshold):
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'threshold': self.threshold,
+                'cooldown': self.cooldown,
+                'opens': self.opens,
+                'shortCircuited': self.short_circuited,
+                'openFor': round(time.monotonic() - self.opened_at, 1) if self.state != self.CLOSED else None,
+            }
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket of `burst` tokens refilled at `rate` per second
+    The rate moves between `min_rate` and `max_rate`: halved on throttling, +`increase` per success.
+    A `max_rate` of 0 disables the limiter.
+    """
+
+    def __init__(self, max_rate=20.0, min_rate=1.0, burst=None, increase=None, max_wait=5.0):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self.burst = burst if burst is not None else max(1.0, max_rate)
+        self.increase = increase if increase is not None else max(max_rate / 50.0, 0.01)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self.throttled = 0
+        self.waited = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Take a token, sleeping until one is available; raise UpstreamBusy if that is more than `max_wait`"""
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (1.0 - self._tokens) / self.rate if self._tokens < 1.0 else 0.0
+            if wait > self.max_wait:
+                self.rejected += 1
+                raise UpstreamBusy(f'Upstream rate limited to {self.rate:.1f}/s')
+            # Reserve the token now (the balance may go negative) and wait for it outside the lock
+            self._tokens -= 1.0
+            if wait:
+                self.waited += 1
+        if wait:
+            time.sleep(wait)
+
+    def record_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def record_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'maxRate': self.max_rate,
+                'minRate': self.min_rate,
+                'burst': self.burst,
+                'throttled': self.throttled,
+                'waited': self.waited,
+                'rejected': self.rejected,
+            }
+
+
+class UpstreamPool:
+    def __init__(self, concurrency=16, timeout=10.0, max_queue=256, breaker=None, limiter=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.breaker = breaker or CircuitBreaker(threshold=0)
+        self.limiter = limiter or AdaptiveRateLimiter(max_rate=0)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='upstream')
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool and wait for its result"""
+        self.breaker.before_call()
+        try:
+            self.limiter.acquire()
+            with self._lock:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise UpstreamBusy(f'{self.queued} upstream calls already queued')
+                self.queued += 1
+        except UpstreamBusy:
+            # Rejected locally: says nothing about the upstream, but frees a half-open probe slot
+            self.breaker.release()
+            raise
+        future = self._executor.submit(self._run, fn, args, kwargs)
+        try:
+            result = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            if future.cancel():
+                # Never started: give its queue slot back
+                with self._lock:
+                    self.queued -= 1
+                    self.cancelled += 1
+            error = UpstreamTimeout(f'Upstream call timed out after {self.timeout if timeout is None else timeout}s')
+            self._record_failure(error)
+            raise error
+        except Exception as e:
+            if is_upstream_failure(e):
+                self._record_failure(e)
+            else:
+                # The upstream answered; the request itself was bad (e.g. an unknown symbol)
+                self.breaker.release()
+            raise
+        with self._lock:
+            self.consecutive_failures = 0
+            self.last_success = time.time()
+        self.breaker.record_success()
+        self.limiter.record_success()
+        return result
+
+    def _record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_failure = time.time()
+            self.last_error = f'{type(error).__name__}: {error}'
+        self.breaker.record_failure()
+        if is_throttling(error):
+            self.limiter.record_throttle()
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'concurrency': self.concurrency,
+                'timeout': self.timeout,
+                'maxQueue': self.max_queue,
+                'queued': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'cancelled': self.cancelled,
+                'rejected': self.rejected,
+                'failures': self.failures,
+                'consecutiveFailures': self.consecutive_failures,
+                'lastSuccess': self.last_success,
+                'lastFailure': self.last_failure,
+                'lastError': self.last_error,
+                'breaker': self.breaker.stats(),
+                'rateLimit': self.limiter.stats(),
+            }
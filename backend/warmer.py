@@ -0,0 +1,197 @@
+"""
+Background precomputation of watchlist payloads
+
+The symbols most users look at (NIFTY, BANKNIFTY, a few dozen large caps) are kept ready to
+serve: a `WatchlistWarmer` thread rebuilds their `/stock-details` payload and their
+`/chart-with-chat` payload (bars plus insights) on a market-hours-aware cadence, so the first
+viewer after a cache expiry is answered from memory instead of paying the upstream latency.
+
+- While the symbol's exchange is open, charts are rebuilt every `intraday_refresh` seconds
+  and details every `details_refresh` seconds.
+- After the close, each payload is rebuilt once more `close_delay` seconds after the session
+  ends (when the final bars and the daily candle are settled) and then left alone until the
+  next open.
+
+A payload is only served while it is current: built within two refresh periods during the
+session, or after the last close outside it. Otherwise requests take the normal path.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from resample import session_for
+
+
+def market_open(session, now=None):
+    """True while `session` is trading (weekdays only unless it trades weekends; exchange holidays are not modelled)"""
+    local = (now or pd.Timestamp.now(tz='UTC')).tz_convert(session.tz)
+    minute = local.hour * 60 + local.minute
+    trading_day = session.weekends or local.weekday() < 5
+    return trading_day and session.open_minutes <= minute < session.open_minutes + session.length_minutes
+
+
+def last_close(session, now=None):
+    """The most recent session close at or before `now` (UTC timestamp)"""
+    local = (now or pd.Timestamp.now(tz='UTC')).tz_convert(session.tz)
+    day = local.normalize()
+    close_offset = pd.Timedelta(minutes=session.open_minutes + session.length_minutes)
+    while (day.weekday() >= 5 and not session.weekends) or day + close_offset > local:
+        day -= pd.Timedelta(days=1)
+    return (day + close_offset).tz_convert('UTC')
+
+
+class _Entry:
+    __slots__ = ('payload', 'built_at', 'attempted_at', 'builds', 'errors')
+
+    def __init__(self):
+        self.payload = None
+        self.built_at = None
+        self.attempted_at = None
+        self.builds = 0
+        self.errors = 0
+
+
+class WatchlistWarmer(threading.Thread):
+    """
+    Keeps precomputed payloads for `symbols`
+    `build_details(symbol)` returns a /stock-details payload; `build_chart(symbol, interval)` returns
+    the /chart-with-chat (payload, columns) for each of `chart_intervals`. Builds run on a small pool.
+    """
+
+    def __init__(self, symbols, build_details, build_chart, chart_intervals=('30m',), intraday_refresh=60.0,
+                 details_refresh=300.0, close_delay=900.0, workers=4, tick=5.0):
+        super().__init__(name='watchlist-warmer', daemon=True)
+        self.symbols = [s.upper() for s in symbols]
+        self.build_details = build_details
+        self.build_chart = build_chart
+        self.chart_intervals = tuple(chart_intervals)
+        self.intraday_refresh = intraday_refresh
+        self.details_refresh = details_refresh
+        self.close_delay = close_delay
+        self.tick = tick
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warmer')
+        self._entries = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        for symbol in self.symbols:
+            self._entries[('details', symbol)] = _Entry()
+            for interval in self.chart_intervals:
+                self._entries[('chart', symbol, interval)] = _Entry()
+
+    def _cadence(self, key):
+        return self.details_refresh if key[0] == 'details' else self.intraday_refresh
+
+    def _due(self, key, entry, now):
+        cadence = self._cadence(key)
+        if entry.attempted_at is not None and now.timestamp() - entry.attempted_at < min(cadence, 60.0):
+            return False  # Just tried (and possibly failed); do not hammer the upstream
+        if entry.built_at is None:
+            return True
+        session = session_for(key[1])
+        if market_open(session, now):
+            return now.timestamp() - entry.built_at >= cadence
+        # Once after the close, when the final bars are in
+        settled = last_close(session, now).timestamp() + self.close_delay
+        return entry.built_at < settled <= now.timestamp()
+
+    def _is_current(self, key, entry, now):
+        if entry.built_at is None:
+            return False
+        age = now.timestamp() - entry.built_at
+        session = session_for(key[1])
+        if market_open(session, now):
+            return age <= 2 * self._cadence(key)
+        return age <= 2 * self._cadence(key) or entry.built_at >= last_close(session, now).timestamp()
+
+    def get(self, key):
+        """The precomputed payload for `key` (('details', symbol) or ('chart', symbol, interval)) if current, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload = entry.payload if self._is_current(key, entry, pd.Timestamp.now(tz='UTC')) else None
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return payload
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.run_due()
+            self._stop_event.wait(self.tick)
+
+    def run_due(self, wait=False):
+        """Start a rebuild of every payload that is due; with `wait`, block until they finish"""
+        now = pd.Timestamp.now(tz='UTC')
+        with self._lock:
+            due = [key for key, entry in self._entries.items() if key not in self._running and self._due(key, entry, now)]
+            self._running.update(due)
+        futures = [self._executor.submit(self._build, key) for key in due]
+        if wait:
+            for future in futures:
+                future.result()
+        return len(due)
+
+    def _build(self, key):
+        started = time.time()
+        try:
+            if key[0] == 'details':
+                payload = self.build_details(key[1])
+            else:
+                payload = self.build_chart(key[1], key[2])
+        except Exception as e:
+            print(f"Error warming {' '.join(key)}: {str(e)}")
+            with self._lock:
+                entry = self._entries[key]
+                entry.attempted_at = started
+                entry.errors += 1
+                self._running.discard(key)
+            return
+        with self._lock:
+            entry = self._entries[key]
+            entry.payload = payload
+            entry.built_at = entry.attempted_at = started
+            entry.builds += 1
+            self._running.discard(key)
+
+    def export(self):
+        """{key: (payload, built_at)} for every payload built so far"""
+        with self._lock:
+            return {key: (e.payload, e.built_at) for key, e in self._entries.items() if e.payload is not None}
+
+    def restore(self, payloads):
+        """Load payloads from `export` for keys this warmer still tracks; they are served while current"""
+        restored = 0
+        with self._lock:
+            for key, (payload, built_at) in payloads.items():
+                entry = self._entries.get(key)
+                if entry is None or (entry.built_at is not None and entry.built_at >= built_at):
+                    continue
+                entry.payload = payload
+                entry.built_at = built_at
+                restored += 1
+        return restored
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.items())
+            return {
+                'symbols': len(self.symbols),
+                'payloads': len(entries),
+                'ready': sum(1 for _, e in entries if e.payload is not None),
+                'hits': self.hits,
+                'misses': self.misses,
+                'builds': sum(e.builds for _, e in entries),
+                'errors': sum(e.errors for _, e in entries),
+                'oldestAge': round(max((now - e.built_at for _, e in entries if e.built_at is not None), default=0.0), 1),
+            }
@@ -1,4 +1,5 @@
 import { createClient } from '@supabase/supabase-js';
+import { valuatePortfolio } from './stockDataService';
 
 const supabaseUrl = process.env.NEXT_PUBLIC_SUPABASE_URL!;
 const supabaseAnonKey = process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY!;
@@ -309,6 +310,41 @@ export class PortfolioService {
     };
   }
 
+  // Price all assets with live quotes in one backend round-trip; assets it cannot price keep their stored values
+  static async valuateAssets(assets: PortfolioAsset[]) {
+    const valuation = await valuatePortfolio(
+      assets.map((asset) => ({ symbol: asset.symbol, quantity: asset.shares, costBasis: asset.cost_basis }))
+    );
+
+    // Positions come back in the order of the holdings sent
+    const valuedAssets: PortfolioAsset[] = assets.map((asset, index) => {
+      const position = valuation.positions[index];
+      if (!position || position.error) return asset;
+      return {
+        ...asset,
+        price: position.price,
+        change_percent: position.dayChangePercent ?? asset.change_percent,
+        market_value: position.marketValue,
+        allocation_percent: position.allocationPercent ?? asset.allocation_percent,
+        return_percent: position.unrealizedPnlPercent ?? asset.return_percent
+      };
+    });
+
+    return { assets: valuedAssets, totals: valuation.totals };
+  }
+
+  // Overlay live valuation totals (see valuateAssets) on a stored summary
+  static applyValuationTotals(summary: PortfolioSummary, totals: any): PortfolioSummary {
+    return {
+      ...summary,
+      total_value: totals.marketValue ?? summary.total_value,
+      day_change: totals.dayChange ?? summary.day_change,
+      day_change_percent: totals.dayChangePercent ?? summary.day_change_percent,
+      total_return: totals.unrealizedPnl ?? summary.total_return,
+      total_return_percent: totals.unrealizedPnlPercent ?? summary.total_return_percent
+    };
+  }
+
   // Calculate portfolio metrics from assets
   static calculatePortfolioMetrics(assets: PortfolioAsset[]) {
     const totalValue = assets.reduce((sum, asset) => sum + asset.market_value, 0);
@@ -6,11 +6,13 @@ const API_BASE_URL = 'http://localhost:5000';
 /**
  * Fetches stock details from the Flask backend
  * @param symbol Stock symbol (e.g., AAPL, GOOG)
+ * @param fields Optional payload keys to return (e.g., ['price', 'dayChangePercent']); fewer fields are cheaper
  * @returns Promise with stock data
  */
-export async function fetchStockDetails(symbol: string): Promise<any> {
+export async function fetchStockDetails(symbol: string, fields?: string[]): Promise<any> {
   try {
-    const response = await fetch(`${API_BASE_URL}/stock-details?symbol=${symbol}`, {
+    const projection = fields && fields.length ? `&fields=${fields.join(',')}` : '';
+    const response = await fetch(`${API_BASE_URL}/stock-details?symbol=${symbol}${projection}`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -58,6 +60,88 @@ export async function fetchHistoricalData(symbol: string, period: string = '3mo'
   }
 }
 
+/**
+ * Fetches intraday bars for a range of sessions, with insights per session and for the whole range
+ * @param symbol Stock symbol (e.g., AAPL, BANKNIFTY)
+ * @param start First session date (YYYY-MM-DD)
+ * @param end Last session date (YYYY-MM-DD, defaults to today)
+ * @param interval Bar interval (default: 30m)
+ * @returns Promise with bars (each with its session date), insights and sessions
+ */
+export async function fetchIntradayRange(symbol: string, start: string, end?: string, interval: string = '30m'): Promise<any> {
+  const range = end ? `&start=${start}&end=${end}` : `&start=${start}`;
+  const response = await fetch(`${API_BASE_URL}/chart-with-chat?symbol=${symbol}&interval=${interval}${range}`, {
+    method: 'GET',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+  });
+
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+/**
+ * Values a list of holdings with one request to the Flask backend
+ * @param holdings Positions as { symbol, quantity, costBasis } (costBasis is the total cost, optional)
+ * @returns Promise with per-position values, portfolio totals (P&L, day change, beta) and sector weights
+ */
+export async function valuatePortfolio(
+  holdings: { symbol: string; quantity: number; costBasis?: number }[]
+): Promise<any> {
+  const response = await fetch(`${API_BASE_URL}/portfolio/valuate`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ holdings }),
+  });
+
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+/**
+ * Subscribes to live intraday bars pushed by the Flask backend (Server-Sent Events)
+ * @param symbol Stock symbol (e.g., AAPL, BANKNIFTY)
+ * @param interval Bar interval (default: 30m)
+ * @param onSnapshot Called with the full session, its insights and indicators (MA50/MA200, RSI, MACD/Signal)
+ * on connect (and after a resync)
+ * @param onBars Called with only the new or updated bars and the insight and indicator fields that changed
+ * @returns Function that closes the stream
+ */
+export function subscribeToLiveBars(
+  symbol: string,
+  interval: string = '30m',
+  onSnapshot: (data: any[], insights: any, indicators: any) => void,
+  onBars: (bars: any[], insightChanges: any, indicatorChanges: any) => void
+): () => void {
+  const source = new EventSource(`${API_BASE_URL}/chart-with-chat/stream?symbol=${symbol}&interval=${interval}`);
+
+  source.addEventListener('snapshot', (event) => {
+    const payload = JSON.parse((event as MessageEvent).data);
+    onSnapshot(payload.data, payload.insights, payload.indicators);
+  });
+
+  source.addEventListener('bars', (event) => {
+    const payload = JSON.parse((event as MessageEvent).data);
+    onBars(payload.bars, payload.insights, payload.indicators);
+  });
+
+  source.onerror = (error) => {
+    // EventSource reconnects on its own and the server starts again with a snapshot
+    console.error('Live bar stream error:', error);
+  };
+
+  return () => source.close();
+}
+
 /**
  * Formats raw stock data into LiveChartData format
  * @param data Raw stock data